@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+""" benchmark of DatasetIngestor.check_list on long dataset lists
+
+It creates a dataset list and an ingested dataset list with the given
+number of scans and measures check_list with and without the
+incremental list reading after one scan is appended.
+
+    python benchmarks/check_list.py [-s 50000] [-r 5]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from scingestor.datasetIngestor import DatasetIngestor
+from scingestor.logger import init_logger
+
+
+def check_list_time(config, scans, repeat):
+    """ measures check_list time
+
+    :param config: ingestor configuration
+    :type config: :obj:`dict` <:obj:`str`, `any`>
+    :param scans: number of scans
+    :type scans: :obj:`int`
+    :param repeat: number of appended scans
+    :type repeat: :obj:`int`
+    :returns: time of the first check_list and
+              mean time of check_list after appending a scan in s
+    :rtype: (:obj:`float`, :obj:`float`)
+    """
+    tmpdir = tempfile.mkdtemp()
+    dsfile = os.path.join(tmpdir, "scicat-datasets-99001234.lst")
+    idsfile = os.path.join(tmpdir, "scicat-ingested-datasets-99001234.lst")
+    try:
+        with open(dsfile, "w") as fl:
+            for nr in range(scans):
+                fl.write("scan_%06d\n" % nr)
+        with open(idsfile, "w") as fl:
+            for nr in range(scans):
+                fl.write("scan_%06d 1700000000.1 1700000000.2 0\n" % nr)
+        ingestor = DatasetIngestor(
+            config, tmpdir, dsfile, idsfile,
+            {"beamtimeId": "99001234", "proposalId": "99991173",
+             "beamline": "p00"},
+            os.path.join(tmpdir, "beamtime-metadata-99001234.json"))
+        start = time.time()
+        ingestor.check_list()
+        first = time.time() - start
+        total = 0.
+        for nr in range(repeat):
+            with open(dsfile, "a") as fl:
+                fl.write("scan_%06d\n" % (scans + nr))
+            start = time.time()
+            ingestor.check_list()
+            total += time.time() - start
+            waiting = ingestor.waiting_datasets()
+            assert waiting == ["scan_%06d" % (scans + it)
+                               for it in range(nr + 1)], waiting
+        return first, total / max(repeat, 1)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    """ the main program function
+    """
+    parser = argparse.ArgumentParser(
+        description="DatasetIngestor.check_list benchmark")
+    parser.add_argument(
+        "-s", "--scans", type=int, default=50000,
+        help="number of scans in the dataset lists")
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5,
+        help="number of appended scans")
+    options = parser.parse_args()
+    init_logger("SciCatBenchmark", "error")
+    print("%24s %12s %16s" % ("mode", "first [s]", "appended [s]"))
+    for name, config in [
+            ("full reading", {}),
+            ("incremental reading", {"incremental_list_reading": True})]:
+        first, appended = check_list_time(
+            config, options.scans, options.repeat)
+        print("%24s %12.4f %16.4f" % (name, first, appended))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+""" micro-benchmark of the SafeINotifier event dispatch cost
+
+It watches a growing number of directories and measures how long
+the notifier needs to deliver a burst of events of one directory.
+
+    python benchmarks/notifier_dispatch.py [-w 10 100 1000 5000] [-e 2000]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+import inotifyx
+
+from scingestor.safeINotifier import SafeINotifier
+from scingestor.logger import init_logger
+
+
+def dispatch_time(watches, events):
+    """ measures event dispatch time
+
+    :param watches: number of watched directories
+    :type watches: :obj:`int`
+    :param events: number of events
+    :type events: :obj:`int`
+    :returns: time per event in s
+    :rtype: :obj:`float`
+    """
+    tmpdir = tempfile.mkdtemp()
+    notifier = SafeINotifier()
+    notifier.inotify_timeout = 0.01
+    qids = []
+    try:
+        for nr in range(watches):
+            path = os.path.join(tmpdir, "scan%05d" % nr)
+            os.mkdir(path)
+            wqueue, qid = notifier.add_watch(path, inotifyx.IN_CLOSE_WRITE)
+            qids.append(qid)
+        path = os.path.join(tmpdir, "scan%05d" % (watches - 1))
+        # wait until the watches are appended
+        time.sleep(0.5)
+        with open(os.path.join(path, "start.nxs"), "w"):
+            pass
+        wqueue.get(timeout=10)
+
+        start = time.time()
+        for nr in range(events):
+            # different names as the kernel merges identical events
+            with open(os.path.join(path, "file%05d.nxs" % nr), "w"):
+                pass
+        received = 0
+        try:
+            while received < events:
+                wqueue.get(timeout=10)
+                received += 1
+        except queue.Empty:
+            pass
+        return (time.time() - start) / max(received, 1)
+    finally:
+        for qid in qids:
+            notifier.rm_watch(qid)
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    """ the main program function
+    """
+    parser = argparse.ArgumentParser(
+        description="SafeINotifier dispatch benchmark")
+    parser.add_argument(
+        "-w", "--watches", type=int, nargs="+",
+        default=[10, 100, 1000, 5000],
+        help="numbers of watched directories")
+    parser.add_argument(
+        "-e", "--events", type=int, default=2000,
+        help="number of events in a burst")
+    options = parser.parse_args()
+    init_logger("SciCatBenchmark", "error")
+    print("%10s %16s" % ("watches", "us per event"))
+    try:
+        for watches in options.watches:
+            print("%10s %16.2f" % (
+                watches, dispatch_time(watches, options.events) * 1e6))
+    finally:
+        SafeINotifier().stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+""" benchmark of the SafeINotifier event volume on a detector write burst
+
+It simulates a detector writing files in chunks into a watched scan
+directory and counts the events queued for a scan directory watch
+subscribed with all events and with the minimal mask.
+
+    python benchmarks/notifier_events.py [-f 1000] [-c 16]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+import inotifyx
+
+from scingestor.safeINotifier import SafeINotifier
+from scingestor.logger import init_logger
+
+
+def burst(path, files, chunks):
+    """ writes detector files
+
+    :param path: scan directory
+    :type path: :obj:`str`
+    :param files: number of files
+    :type files: :obj:`int`
+    :param chunks: number of chunks written in each file
+    :type chunks: :obj:`int`
+    """
+    data = b"\0" * 4096
+    for nr in range(files):
+        with open(os.path.join(path, "frame_%06d.cbf" % nr), "wb") as fl:
+            for _ in range(chunks):
+                fl.write(data)
+                fl.flush()
+
+
+def queued_events(masks, files, chunks):
+    """ counts queued events of the write burst
+
+    :param masks: watch mask
+    :type masks: :obj:`int`
+    :param files: number of files
+    :type files: :obj:`int`
+    :param chunks: number of chunks written in each file
+    :type chunks: :obj:`int`
+    :returns: number of queued events and time in s
+    :rtype: (:obj:`int`, :obj:`float`)
+    """
+    tmpdir = tempfile.mkdtemp()
+    notifier = SafeINotifier()
+    notifier.inotify_timeout = 0.01
+    wqueue, qid = notifier.add_watch(tmpdir, masks)
+    try:
+        # wait until the watch is appended
+        time.sleep(0.5)
+        start = time.time()
+        burst(tmpdir, files, chunks)
+        events = 0
+        try:
+            while True:
+                wqueue.get(timeout=1)
+                events += 1
+        except queue.Empty:
+            pass
+        # the queue timeout is not a part of the burst
+        return events, time.time() - start - 1
+    finally:
+        notifier.rm_watch(qid)
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    """ the main program function
+    """
+    parser = argparse.ArgumentParser(
+        description="SafeINotifier event volume benchmark")
+    parser.add_argument(
+        "-f", "--files", type=int, default=1000,
+        help="number of detector files")
+    parser.add_argument(
+        "-c", "--chunks", type=int, default=16,
+        help="number of chunks written in each file")
+    options = parser.parse_args()
+    init_logger("SciCatBenchmark", "error")
+    masks = [
+        ("all events",
+         inotifyx.IN_ALL_EVENTS | inotifyx.IN_CLOSE_WRITE |
+         inotifyx.IN_DELETE | inotifyx.IN_MOVE_SELF |
+         inotifyx.IN_MOVED_TO | inotifyx.IN_MOVED_FROM),
+        ("minimal",
+         inotifyx.IN_CREATE | inotifyx.IN_DELETE | inotifyx.IN_MOVE_SELF),
+    ]
+    print("%12s %12s %12s" % ("mask", "events", "time [s]"))
+    try:
+        for name, mask in masks:
+            events, tm = queued_events(mask, options.files, options.chunks)
+            print("%12s %12s %12.3f" % (name, events, tm))
+    finally:
+        SafeINotifier().stop()
+
+
+if __name__ == "__main__":
+    main()
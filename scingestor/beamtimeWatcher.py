@@ -27,8 +27,13 @@ import inotifyx
 import pathlib
 
 from .scanDirWatcher import ScanDirWatcher
+from .scanDirDispatcher import ScanDirDispatcher
 from .safeINotifier import SafeINotifier
+from .pollingNotifier import PollingNotifier, get_notifier
+from .generatorPool import GeneratorPool
+from .ingestScheduler import IngestScheduler
 from .datasetIngestor import DatasetIngestor
+from .timerWheel import TimerWheel
 from .configuration import load_config
 from .logger import get_logger, init_logger
 
@@ -138,6 +143,12 @@ class BeamtimeWatcher:
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
 
+        #: (:obj:`type`) scandir watcher class
+        self.__scandir_watcher_class = ScanDirWatcher
+        if "use_scandir_dispatcher" in self.__config.keys() and \
+           self.__config["use_scandir_dispatcher"]:
+            self.__scandir_watcher_class = ScanDirDispatcher
+
         #: (:obj:`int`) notifier id
         self.__notifier = None
         #: (:obj:`dict` <:obj:`int`, :obj:`str`>) watch description paths
@@ -165,6 +176,18 @@ class BeamtimeWatcher:
                     self.__config["recheck_beamtime_file_interval"])
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
+        #: (:obj:`float`) time interval of beamtime file rechecks in s
+        self.__recheck_btfile_time = None
+        if "recheck_beamtime_file_time" in self.__config.keys():
+            try:
+                self.__recheck_btfile_time = float(
+                    self.__config["recheck_beamtime_file_time"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        #: (:class:`threading.Event`) beamtime file recheck flag
+        self.__recheck = threading.Event()
+        #: (:obj:`int`) timer id of beamtime file rechecks
+        self.__recheck_tid = None
 
         #: (:obj:`dict` <(:obj:`str`, :obj:`str`),
         #:               :class:`scanDirWatcher.ScanDirWatcher`>)
@@ -230,7 +253,7 @@ class BeamtimeWatcher:
         :param bpath: beamtime base path
         :type bpath: :obj:`str`
         """
-        self.__notifier = SafeINotifier()
+        self.__notifier = get_notifier(self.__config)
         if "inotify_timeout" in self.__config.keys():
             try:
                 self.__notifier.inotify_timeout = float(
@@ -252,10 +275,8 @@ class BeamtimeWatcher:
         try:
             wqueue, watch_descriptor = self.__notifier.add_watch(
                 path,
-                inotifyx.IN_CLOSE_WRITE | inotifyx.IN_DELETE |
-                inotifyx.IN_MOVE_SELF |
-                inotifyx.IN_ALL_EVENTS |
-                inotifyx.IN_MOVED_TO | inotifyx.IN_MOVED_FROM)
+                inotifyx.IN_CREATE | inotifyx.IN_CLOSE_WRITE |
+                inotifyx.IN_DELETE | inotifyx.IN_MOVE_SELF)
             self.__wd_to_path[watch_descriptor] = path
             self.__wd_to_queue[watch_descriptor] = wqueue
             get_logger().info('BeamtimeWatcher: Adding watch %s: %s'
@@ -287,7 +308,6 @@ class BeamtimeWatcher:
                     | inotifyx.IN_MOVED_TO
                     | inotifyx.IN_MOVE_SELF
                     | inotifyx.IN_DELETE
-                    | inotifyx.IN_ALL_EVENTS
                 )
                 failing = False
                 self.__wd_to_bpath[watch_descriptor] = bpath
@@ -347,8 +367,15 @@ class BeamtimeWatcher:
                 get_logger().debug('Files of %s: %s' % (path, files))
 
             counter = 0
+            if self.__recheck_btfile_time is not None \
+               and self.__recheck_btfile_time > 0:
+                wheel = TimerWheel()
+                wheel.configure(self.__config)
+                self.__recheck_tid = wheel.add(
+                    self.__recheck_btfile_time, self.__recheck.set)
             while self.running:
                 get_logger().debug('Bt Tic')
+                resync = False
                 if not self.__wd_to_queue and not self.__wd_to_bqueue:
                     time.sleep(self.__timeout/10.)
                 for qid in list(self.__wd_to_queue.keys()):
@@ -364,18 +391,18 @@ class BeamtimeWatcher:
                         break
                     if qid in self.__wd_to_path.keys():
                         get_logger().debug(
-                            'Bt: %s %s %s' % (event.name,
-                                              event.masks,
-                                              self.__wd_to_path[qid]))
+                            'Bt: %s %s %s', event.name, event,
+                            self.__wd_to_path[qid])
                         # get_logger().info(
                         #     'Bt: %s %s %s' % (event.name,
                         #                       event.masks,
                         #                       self.__wd_to_path[qid]))
-                        masks = event.masks.split("|")
-                        if "IN_IGNORED" in masks or \
-                           "IN_MOVE_FROM" in masks or \
-                           "IN_DELETE" in masks or \
-                           "IN_MOVE_SELF" in masks:
+                        if event.mask & inotifyx.IN_Q_OVERFLOW:
+                            # events may be lost
+                            resync = True
+                        elif event.mask & (
+                                inotifyx.IN_IGNORED | inotifyx.IN_DELETE |
+                                inotifyx.IN_MOVE_SELF):
                             # path/file does not exist anymore
                             #     (moved/deleted)
                             path = self.__wd_to_path.pop(qid)
@@ -414,9 +441,8 @@ class BeamtimeWatcher:
                             get_logger().debug('add paths')
                             self._add_path(path)
 
-                        elif "IN_CREATE" in masks or \
-                             "IN_MOVE_TO" in masks or \
-                             "IN_CLOSE_WRITE" in masks:
+                        elif event.mask & (
+                                inotifyx.IN_CREATE | inotifyx.IN_CLOSE_WRITE):
 
                             files = [fl for fl in [event.name]
                                      if (fl.startswith(self.__bt_prefix) and
@@ -457,25 +483,25 @@ class BeamtimeWatcher:
                         break
                     if qid in self.__wd_to_bpath.keys():
                         get_logger().debug(
-                            'BB: %s %s %s' % (event.name,
-                                              event.masks,
-                                              self.__wd_to_bpath[qid]))
+                            'BB: %s %s %s', event.name, event,
+                            self.__wd_to_bpath[qid])
                         # get_logger().info(
                         #     'BB: %s %s %s' % (event.name,
                         #                       event.masks,
                         #                       self.__wd_to_bpath[qid]))
-                        masks = event.masks.split("|")
-                        if not self.__beamtime_base_dir:
+                        if event.mask & inotifyx.IN_Q_OVERFLOW:
+                            # events may be lost
+                            resync = True
+                        elif not self.__beamtime_base_dir:
                             # if event.name is not None:
                             bpath = self.__wd_to_bpath.pop(qid)
                             # npath = os.path.join(bpath, event.name)
-                            if "IN_IGNORED" not in \
-                               event.masks.split():
+                            if event.mask != inotifyx.IN_IGNORED:
                                 self.__notifier.rm_watch(qid)
                             path = self.__wait_for_dirs.pop(bpath)
                             self._add_path(path)
-                        elif "IN_ISDIR" in masks and (
-                                "IN_CREATE" in masks or "IN_MOVE_TO" in masks):
+                        elif event.mask & inotifyx.IN_ISDIR and \
+                                event.mask & inotifyx.IN_CREATE:
                             if event.name:
                                 dr = os.path.abspath(os.path.join(
                                     self.__wd_to_bpath[qid], event.name))
@@ -495,7 +521,21 @@ class BeamtimeWatcher:
                                     get_logger().debug(
                                         'Files of %s: %s' % (dr, files))
 
-                if self.__recheck_btfile_interval > 0:
+                if resync:
+                    try:
+                        self._resync()
+                    except Exception as e:
+                        get_logger().warning(str(e))
+
+                if self.__recheck_tid is not None:
+                    if self.__recheck.is_set():
+                        self.__recheck.clear()
+                        get_logger().debug(
+                            'BeamtimeWatcher: '
+                            'Re-check beamtime file after %s s'
+                            % self.__recheck_btfile_time)
+                        self._recheck_beamtime_files()
+                elif self.__recheck_btfile_interval > 0:
                     if counter == self.__recheck_btfile_interval:
                         # if inotify does not work
                         counter = 0
@@ -506,24 +546,7 @@ class BeamtimeWatcher:
                             'BeamtimeWatcher: '
                             'Re-check beamtime file after %s s'
                             % self.__recheck_btfile_interval)
-                        dds = []
-                        for (ph, fl) in list(self.__scandir_watchers.keys()):
-                            if not os.path.isfile(fl):
-                                ds = self.__scandir_watchers.pop((ph, fl))
-                                ds.running = False
-                                dds.append(ds)
-                        while len(dds):
-                            ds = dds.pop()
-                            ds.running = False
-                            get_logger().debug("Joining ScanDirWatcher")
-                            ds.join()
-                            get_logger().debug("ScanDirWatcher Joined")
-                        get_logger().debug('add paths')
-
-                        for path in self.__beamtime_dirs:
-                            files = self._find_bt_files(
-                                path, self.__bt_prefix, self.__bt_postfix)
-                            self._launch_scandir_watcher(path, files)
+                        self._recheck_beamtime_files()
 
                         # try:
                         #     self.__ingestor.check_list()
@@ -554,6 +577,51 @@ class BeamtimeWatcher:
             get_logger().warning('Keyboard interrupt (SIGINT) received...')
             self.stop()
 
+    def _recheck_beamtime_files(self):
+        """ stops scandir watchers of removed beamtime files
+        and launches scandir watchers of new beamtime files
+        """
+        dds = []
+        for (ph, fl) in list(self.__scandir_watchers.keys()):
+            if not os.path.isfile(fl):
+                ds = self.__scandir_watchers.pop((ph, fl))
+                ds.running = False
+                dds.append(ds)
+        while len(dds):
+            ds = dds.pop()
+            ds.running = False
+            get_logger().debug("Joining ScanDirWatcher")
+            ds.join()
+            get_logger().debug("ScanDirWatcher Joined")
+        get_logger().debug('add paths')
+
+        for path in self.__beamtime_dirs:
+            files = self._find_bt_files(
+                path, self.__bt_prefix, self.__bt_postfix)
+            self._launch_scandir_watcher(path, files)
+
+    def _resync(self):
+        """ rescans the beamtime base directory and beamtime directories
+        when notifier events were lost
+        """
+        get_logger().debug('BeamtimeWatcher: Resync')
+        if not self.__beamtime_base_dir:
+            for qid, bpath in list(self.__wd_to_bpath.items()):
+                path = self.__wait_for_dirs.get(bpath)
+                if path is not None and os.path.isdir(path):
+                    self.__wd_to_bpath.pop(qid)
+                    self.__wd_to_bqueue.pop(qid, None)
+                    self.__notifier.rm_watch(qid)
+                    self.__wait_for_dirs.pop(bpath)
+                    self._add_path(path)
+        elif os.path.isdir(self.__beamtime_base_dir):
+            for it in os.scandir(self.__beamtime_base_dir):
+                dr = os.path.abspath(it.path)
+                if it.is_dir() and dr not in self.__beamtime_dirs:
+                    self.__beamtime_dirs.append(dr)
+                    self._add_path(dr)
+        self._recheck_beamtime_files()
+
     def _launch_scandir_watcher(self, path, files):
         """ launch scandir watcher
 
@@ -585,8 +653,9 @@ class BeamtimeWatcher:
                                 % (path, ffn))
                             btmd = self.__append_proposal_groups(btmd, path)
                             sdw = self.__scandir_watchers[(path, ffn)] =  \
-                                ScanDirWatcher(self.__config, path, btmd, ffn,
-                                               self.__scandir_depth)
+                                self.__scandir_watcher_class(
+                                    self.__config, path, btmd, ffn,
+                                    self.__scandir_depth)
                 if sdw is not None:
                     sdw.start()
             except Exception as e:
@@ -637,13 +706,19 @@ class BeamtimeWatcher:
         else:
             ingestor = DatasetIngestor(
                 self.__config, path, "", "", meta, path)
-            return ingestor.append_proposal_groups()
+            try:
+                return ingestor.append_proposal_groups()
+            finally:
+                ingestor.close()
 
     def stop(self):
         """ stop beamtime watcher
         """
         get_logger().debug('Cleaning up...')
         self.running = False
+        if self.__recheck_tid is not None:
+            TimerWheel().cancel(self.__recheck_tid)
+            self.__recheck_tid = None
         time.sleep(0.2)
         self._stop_notifier()
         with self.__scandir_lock:
@@ -710,4 +785,12 @@ def main(interrupt=0):
     bw._test_interrupt = interrupt
     bw.start()
     SafeINotifier().stop()
+    if PollingNotifier._notifier is not None:
+        PollingNotifier._notifier.stop()
+    if GeneratorPool._pool is not None:
+        GeneratorPool._pool.stop()
+    if IngestScheduler._scheduler is not None:
+        IngestScheduler._scheduler.stop()
+    if TimerWheel._wheel is not None:
+        TimerWheel._wheel.stop()
     sys.exit(0)
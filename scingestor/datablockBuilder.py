@@ -0,0 +1,607 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import json
+import time
+import stat
+import copy
+import fnmatch
+import sqlite3
+import threading
+import functools
+import concurrent.futures
+
+from nxstools import nxsfileinfo
+
+from .nxsGenerator import NXSGenerator
+from .logger import get_logger
+
+try:
+    import pwd
+    import grp
+    #: (:obj:`bool`) pwd and grp modules available
+    PWDGRP = True
+except ImportError:
+    PWDGRP = False
+
+
+#: (:obj:`float`) time in s after which a file is not expected to change
+SETTLE_TIME = 1.0
+
+#: (:obj:`dict` <:obj:`str`, :obj:`str`>) permission bits
+PERMISSIONS = {'7': 'rwx', '6': 'rw-', '5': 'r-x', '4': 'r--',
+               '3': '-wx', '2': '-w-', '1': '--x', '0': '---'}
+
+
+@functools.lru_cache(maxsize=1024)
+def user_name(uid):
+    """ provides the user name
+
+    :param uid: user id
+    :type uid: :obj:`int`
+    :returns: user name or user id
+    :rtype: :obj:`str` or :obj:`int`
+    """
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except Exception:
+        return uid
+
+
+@functools.lru_cache(maxsize=1024)
+def group_name(gid):
+    """ provides the group name
+
+    :param gid: group id
+    :type gid: :obj:`int`
+    :returns: group name or group id
+    :rtype: :obj:`str` or :obj:`int`
+    """
+    try:
+        return grp.getgrgid(gid).gr_name
+    except Exception:
+        return gid
+
+
+class FileStat:
+    """ cached file status """
+
+    __slots__ = ["st_ino", "st_size", "st_mtime", "st_ctime",
+                 "st_mode", "st_uid", "st_gid", "stime"]
+
+    def __init__(self, st_ino, st_size, st_mtime, st_ctime,
+                 st_mode, st_uid, st_gid, stime):
+        """ constructor
+
+        :param st_ino: inode number
+        :type st_ino: :obj:`int`
+        :param st_size: file size
+        :type st_size: :obj:`int`
+        :param st_mtime: modification time
+        :type st_mtime: :obj:`float`
+        :param st_ctime: status change time
+        :type st_ctime: :obj:`float`
+        :param st_mode: file mode
+        :type st_mode: :obj:`int`
+        :param st_uid: user id
+        :type st_uid: :obj:`int`
+        :param st_gid: group id
+        :type st_gid: :obj:`int`
+        :param stime: time of the stat call
+        :type stime: :obj:`float`
+        """
+        #: (:obj:`int`) inode number
+        self.st_ino = st_ino
+        #: (:obj:`int`) file size
+        self.st_size = st_size
+        #: (:obj:`float`) modification time
+        self.st_mtime = st_mtime
+        #: (:obj:`float`) status change time
+        self.st_ctime = st_ctime
+        #: (:obj:`int`) file mode
+        self.st_mode = st_mode
+        #: (:obj:`int`) user id
+        self.st_uid = st_uid
+        #: (:obj:`int`) group id
+        self.st_gid = st_gid
+        #: (:obj:`float`) time of the stat call
+        self.stime = stime
+
+    @classmethod
+    def stat(cls, path):
+        """ reads the file status
+
+        :param path: file path
+        :type path: :obj:`str`
+        :returns: file status
+        :rtype: :class:`FileStat`
+        """
+        stime = time.time()
+        st = os.stat(path)
+        return cls(st.st_ino, st.st_size, st.st_mtime, st.st_ctime,
+                   st.st_mode, st.st_uid, st.st_gid, stime)
+
+    def settled(self):
+        """ if the file was not modified shortly before the stat call
+
+        :returns: settled flag
+        :rtype: :obj:`bool`
+        """
+        return self.stime - max(self.st_mtime, self.st_ctime) > SETTLE_TIME
+
+    def tolist(self):
+        """ provides the status as a list
+
+        :returns: status values
+        :rtype: :obj:`list`
+        """
+        return [self.st_ino, self.st_size, self.st_mtime, self.st_ctime,
+                self.st_mode, self.st_uid, self.st_gid, self.stime]
+
+
+class StatCache:
+    """ persistent cache of directory listings and file status
+    in a SQLite database
+
+    Every directory has one record with its modification time and
+    its entries, i.e. name, directory and symlink flags and
+    the status of files which have been read.
+    """
+
+    #: (:obj:`str`) database schema
+    schema = (
+        "CREATE TABLE IF NOT EXISTS directories ("
+        "path TEXT PRIMARY KEY, "
+        "mtime_ns INTEGER, "
+        "entries TEXT)"
+    )
+
+    def __init__(self, filename=":memory:", timeout=30.0):
+        """ constructor
+
+        :param filename: database file name
+        :type filename: :obj:`str`
+        :param timeout: timeout for a locked database in s
+        :type timeout: :obj:`float`
+        """
+        #: (:obj:`str`) database file name
+        self.filename = filename or ":memory:"
+
+        #: (:class:`threading.Lock`) connection lock
+        self.__lock = threading.Lock()
+
+        if self.filename != ":memory:":
+            dirname = os.path.dirname(os.path.abspath(self.filename))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname, exist_ok=True)
+        #: (:class:`sqlite3.Connection`) database connection
+        self.__db = sqlite3.connect(
+            self.filename, timeout=timeout, check_same_thread=False)
+        if self.filename != ":memory:":
+            self.__db.execute("PRAGMA journal_mode=WAL")
+            self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute(self.schema)
+        self.__db.commit()
+
+    def get(self, path):
+        """ provides a directory record
+
+        :param path: directory path
+        :type path: :obj:`str`
+        :returns: directory modification time in ns and its entries
+                  or None
+        :rtype: (:obj:`int`, :obj:`dict` <:obj:`str`, :obj:`list`>)
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT mtime_ns, entries FROM directories WHERE path = ?",
+                (path,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def update(self, records):
+        """ updates directory records in one transaction
+
+        :param records: directory paths with their modification times
+                        in ns and entries
+        :type records: :obj:`dict` <:obj:`str`,
+                       (:obj:`int`, :obj:`dict` <:obj:`str`, :obj:`list`>)>
+        """
+        if not records:
+            return
+        with self.__lock:
+            self.__db.executemany(
+                "INSERT OR REPLACE INTO directories (path, mtime_ns, entries) "
+                "VALUES (?, ?, ?)",
+                [(path, mtime_ns, json.dumps(entries))
+                 for path, (mtime_ns, entries) in records.items()])
+            self.__db.commit()
+
+    def close(self):
+        """ closes the database
+        """
+        with self.__lock:
+            self.__db.close()
+
+
+class DirectoryListing:
+    """ entries of one directory """
+
+    __slots__ = ["path", "mtime_ns", "entries", "changed"]
+
+    def __init__(self, path, mtime_ns, entries, changed):
+        """ constructor
+
+        :param path: directory path
+        :type path: :obj:`str`
+        :param mtime_ns: directory modification time in ns
+        :type mtime_ns: :obj:`int`
+        :param entries: entry names with their directory and symlink
+                        flags and the file status values if known
+        :type entries: :obj:`dict` <:obj:`str`, :obj:`list`>
+        :param changed: listing differs from the cache
+        :type changed: :obj:`bool`
+        """
+        #: (:obj:`str`) directory path
+        self.path = path
+        #: (:obj:`int`) directory modification time in ns
+        self.mtime_ns = mtime_ns
+        #: (:obj:`dict` <:obj:`str`, :obj:`list`>) directory entries
+        self.entries = entries
+        #: (:obj:`bool`) listing differs from the cache
+        self.changed = changed
+
+    def files(self, prefix=""):
+        """ provides names of non-directory entries
+
+        :param prefix: name prefix
+        :type prefix: :obj:`str`
+        :returns: file names
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        return [name for name, entry in self.entries.items()
+                if not entry[0] and name.startswith(prefix)]
+
+    def directories(self, prefix="", links=True):
+        """ provides names of directory entries
+
+        :param prefix: name prefix
+        :type prefix: :obj:`str`
+        :param links: include symbolic links to directories
+        :type links: :obj:`bool`
+        :returns: directory names
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        return [name for name, entry in self.entries.items()
+                if entry[0] and name.startswith(prefix)
+                and (links or not entry[1])]
+
+
+class DatablockBuilder:
+    """ singleton origdatablock file list builder
+
+    Scan directories are listed with :func:`os.scandir` and their files
+    are stated across a thread pool. Directory listings and file status
+    are kept in a stat cache, so that unchanged directories, i.e. with
+    the same modification time, are neither listed nor stated again.
+    Files modified shortly before their stat call are stated again.
+    """
+
+    #: (:class:`DatablockBuilder`) singleton builder instance
+    _builder = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._builder:
+                cls._builder = super(DatablockBuilder, cls).__new__(cls)
+                cls._builder.init()
+        return cls._builder
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:obj:`int`) number of threads listing and stating files
+        self.workers = 8
+        #: (:obj:`int`) number of files stated by one job
+        self.chunk_size = 256
+
+        #: (:class:`threading.Lock`) cache lock
+        self.__lock = threading.Lock()
+        #: (:class:`StatCache`) stat cache
+        self.__cache = StatCache()
+
+    def configure(self, configuration):
+        """ sets the thread number and the stat cache file
+        from the configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        if "datablock_workers_number" in config.keys():
+            try:
+                self.workers = max(
+                    int(config["datablock_workers_number"]), 1)
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        if "datablock_stat_cache_file" in config.keys():
+            try:
+                filename = str(
+                    config["datablock_stat_cache_file"] or ":memory:")
+                with self.__lock:
+                    if filename != self.__cache.filename:
+                        self.__cache.close()
+                        self.__cache = StatCache(filename)
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+    def run(self, command):
+        """ runs the nxsfileinfo origdatablock command with the builder
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: standard output of the command
+                  or None for other commands
+        :rtype: :obj:`str`
+        """
+        generator = NXSGenerator({"origdatablock": OrigDatablock})
+        args = generator.arguments(command)
+        if args is None or args[0] != "origdatablock":
+            return None
+        return generator.run(command, args)
+
+    def walk(self, scandir, scanname, filters=None):
+        """ provides scan files in the order of :func:`os.walk`
+
+        :param scandir: directory of the scan
+        :type scandir: :obj:`str`
+        :param scanname: scan name, i.e. prefix of scan files
+                         and directories
+        :type scanname: :obj:`str`
+        :param filters: file name patterns to be skipped
+        :type filters: :obj:`list` <:obj:`str`>
+        :returns: scan files and files of scan subdirectories
+                  with their directory paths and status
+        :rtype: (:obj:`list` <(:obj:`str`, :obj:`str`, :class:`FileStat`)>,
+                 :obj:`list` <(:obj:`str`, :obj:`str`, :class:`FileStat`)>)
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers) as executor:
+            top = self._listing(scandir)
+            listings = {scandir: top}
+            level = [os.path.join(scandir, name)
+                     for name in top.directories(scanname)]
+            scandirs = list(level)
+            # subdirectories are listed level by level
+            while level:
+                children = []
+                for listing in executor.map(self._listing, level):
+                    listings[listing.path] = listing
+                    children.extend(
+                        os.path.join(listing.path, name)
+                        for name in listing.directories(links=False))
+                level = children
+
+            topfiles = [(scandir, name)
+                        for name in top.files(scanname)
+                        if not self._filtered(scandir, name, filters)]
+            subfiles = []
+            for path in scandirs:
+                stack = [path]
+                while stack:
+                    dirpath = stack.pop()
+                    listing = listings[dirpath]
+                    subfiles.extend(
+                        (dirpath, name) for name in listing.files()
+                        if not self._filtered(dirpath, name, filters))
+                    stack.extend(reversed(
+                        [os.path.join(dirpath, name)
+                         for name in listing.directories(links=False)]))
+
+            missing = [
+                (dirpath, name) for dirpath, name in topfiles + subfiles
+                if not self._cached(listings[dirpath].entries[name])]
+            chunks = [missing[i:i + self.chunk_size]
+                      for i in range(0, len(missing), self.chunk_size)]
+            for chunk, stats in zip(
+                    chunks, executor.map(self._stat, chunks)):
+                for (dirpath, name), status in zip(chunk, stats):
+                    listing = listings[dirpath]
+                    listing.entries[name] = \
+                        listing.entries[name][:2] + [status.tolist()]
+                    listing.changed = True
+
+        with self.__lock:
+            self.__cache.update(
+                {listing.path: (listing.mtime_ns, listing.entries)
+                 for listing in listings.values() if listing.changed})
+
+        def files(names):
+            return [(dirpath, name,
+                     FileStat(*listings[dirpath].entries[name][2]))
+                    for dirpath, name in names]
+
+        return files(topfiles), files(subfiles)
+
+    def _listing(self, path):
+        """ lists the directory or takes its listing from the cache
+
+        :param path: directory path
+        :type path: :obj:`str`
+        :returns: directory listing
+        :rtype: :class:`DirectoryListing`
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as e:
+            # os.walk skips directories which cannot be listed
+            get_logger().debug('DatablockBuilder: %s' % str(e))
+            return DirectoryListing(path, None, {}, False)
+        with self.__lock:
+            cached = self.__cache.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return DirectoryListing(path, mtime_ns, cached[1], False)
+        entries = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        isdir = entry.is_dir()
+                    except OSError:
+                        isdir = False
+                    try:
+                        islink = entry.is_symlink()
+                    except OSError:
+                        islink = False
+                    entries[entry.name] = [isdir, islink]
+        except OSError as e:
+            get_logger().debug('DatablockBuilder: %s' % str(e))
+            return DirectoryListing(path, None, {}, False)
+        return DirectoryListing(path, mtime_ns, entries, True)
+
+    def _stat(self, files):
+        """ reads status of the files
+
+        :param files: directory paths and file names
+        :type files: :obj:`list` <(:obj:`str`, :obj:`str`)>
+        :returns: file status
+        :rtype: :obj:`list` <:class:`FileStat`>
+        """
+        return [FileStat.stat(os.path.join(dirpath, name))
+                for dirpath, name in files]
+
+    @classmethod
+    def _cached(cls, entry):
+        """ if the entry has a settled file status
+
+        :param entry: directory entry
+        :type entry: :obj:`list`
+        :returns: cached flag
+        :rtype: :obj:`bool`
+        """
+        return len(entry) > 2 and FileStat(*entry[2]).settled()
+
+    @classmethod
+    def _filtered(cls, dirpath, name, filters):
+        """ if the file matches one of the filters
+
+        :param dirpath: directory path
+        :type dirpath: :obj:`str`
+        :param name: file name
+        :type name: :obj:`str`
+        :param filters: file name patterns to be skipped
+        :type filters: :obj:`list` <:obj:`str`>
+        :returns: filtered flag
+        :rtype: :obj:`bool`
+        """
+        if not filters:
+            return False
+        path = os.path.join(dirpath, name)
+        return any(fnmatch.fnmatch(path, df) for df in filters)
+
+
+class OrigDatablock(nxsfileinfo.OrigDatablock):
+    """ nxsfileinfo origdatablock runner using :class:`DatablockBuilder`
+    """
+
+    def record(self, scandir, dirpath, name, status, relpath):
+        """ creates a dataFileList record as nxsfileinfo does
+
+        :param scandir: directory of the scan
+        :type scandir: :obj:`str`
+        :param dirpath: directory of the file
+        :type dirpath: :obj:`str`
+        :param name: file name
+        :type name: :obj:`str`
+        :param status: file status
+        :type status: :class:`FileStat`
+        :param relpath: relative path to the scan files
+        :type relpath: :obj:`str`
+        :returns: dataFileList record
+        :rtype: :obj:`dict` <:obj:`str`, `any`>
+        """
+        scdir = os.path.relpath(dirpath, scandir) \
+            if dirpath != scandir else ""
+        prm = str(oct(status.st_mode)[-3:])
+        isdir = 'd' if stat.S_ISDIR(status.st_mode) else '-'
+        islink = 'l' if stat.S_ISLNK(status.st_mode) else isdir
+        path = os.path.join(scdir, name)
+        if path.startswith("./"):
+            path = path[2:]
+        if relpath:
+            path = os.path.join(relpath, path)
+        return {
+            "path": os.path.normpath(path),
+            "size": status.st_size,
+            "time": self.isotime(status.st_ctime),
+            "uid": user_name(status.st_uid) if PWDGRP else status.st_uid,
+            "gid": group_name(status.st_gid) if PWDGRP else status.st_gid,
+            "perm": islink + ''.join(PERMISSIONS.get(x, x) for x in prm),
+        }
+
+    def datablock(self, options):
+        """ dump scan datablock JSON
+
+        :param options: parser options
+        :type options: :class:`argparse.Namespace`
+        :returns: output information
+        :rtype: :obj:`str`
+        """
+        builder = DatablockBuilder()
+        skip = options.skip.split(',') if options.skip else None
+        add = options.add.split(',') if options.add else []
+        dtfiles = []
+        fscandir = None
+        for arg in options.args:
+            scandir, scanname = os.path.split(os.path.abspath(arg))
+            if not fscandir:
+                fscandir = scandir
+                relpath = options.relpath
+            else:
+                relpath = os.path.relpath(scandir, fscandir)
+                if options.relpath:
+                    relpath = os.path.join(options.relpath, relpath)
+            topfiles, subfiles = builder.walk(scandir, scanname, skip)
+            dtfiles.extend(
+                self.record(scandir, dirpath, name, status, relpath)
+                for dirpath, name, status in topfiles)
+            for fl in add:
+                if os.path.isfile(fl):
+                    ascandir, ascanname = os.path.split(os.path.abspath(fl))
+                    flist, _ = self.datafiles(
+                        scandir, ascandir, [ascanname], relpath)
+                    dtfiles.extend(flist)
+            dtfiles.extend(
+                self.record(scandir, dirpath, name, status, relpath)
+                for dirpath, name, status in subfiles)
+
+        # groups and dataset id are set by nxsfileinfo
+        goptions = copy.copy(options)
+        goptions.args = []
+        result = json.loads(super().datablock(goptions))
+        result["dataFileList"] = dtfiles
+        result["size"] = sum(rec["size"] for rec in dtfiles)
+        return json.dumps(result, sort_keys=True, indent=4)
@@ -49,6 +49,9 @@ class DatasetIngest:
             self.__config = load_config(options.config) or {}
             get_logger().debug("CONFIGURATION: %s" % str(self.__config))
 
+        #: (:obj:`bool`) regenerate origdatablocks of unchanged directories
+        self.__deep = bool(getattr(options, "deep", False))
+
         #: (:obj:`bool`) use core path
         self.__usecorepath = False
         if "use_corepath_as_scandir" in self.__config.keys():
@@ -267,10 +270,13 @@ class DatasetIngest:
                     token = ingestor.get_token()
                     for scan in ingestor.waiting_datasets():
                         if scan and not scan.startswith("__command__ "):
-                            ingestor.reingest(scan, token)
+                            ingestor.reingest(
+                                scan, token, deep=self.__deep)
                 ingestor.update_from_tmpfile()
             except Exception as e:
                 get_logger().warning(str(e))
+            finally:
+                ingestor.close()
 
     def _find_bt_files(self, path, prefix, postfix):
         """ find beamtime files with given prefix and postfix in the given path
@@ -323,6 +329,10 @@ def main():
         "-t", "--timestamps", action="store_true",
         default=False, dest="timestamps",
         help="timestamps in logs")
+    parser.add_argument(
+        "--deep", action="store_true",
+        default=False, dest="deep",
+        help="regenerate origdatablocks of scans with unchanged directories")
 
     options = parser.parse_args()
 
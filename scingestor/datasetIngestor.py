@@ -21,14 +21,25 @@ import os
 import glob
 import json
 import subprocess
-import requests
 import time
 import enum
 import socket
 import pathlib
-import shutil
+import threading
+import concurrent.futures
 
 from .logger import get_logger
+from .sciCatSession import SciCatSession
+from .listFileReader import ListFileReader
+from .nxsGenerator import NXSGenerator
+from .generatorPool import GeneratorPool
+from .fileStaging import stage_file, STAGING_METHODS
+from .metadataStore import MetadataStore
+from .datablockBuilder import DatablockBuilder
+from .fingerprintStore import FingerprintStore
+from .generatorCache import GeneratorCache
+from .stateStore import StateStore
+from .tokenManager import TokenManager
 
 
 class UpdateStrategy(enum.Enum):
@@ -117,12 +128,12 @@ class DatasetIngestor:
         self.__username = 'ingestor'
         #: (:obj:`str`) update strategy
         self.__strategy = UpdateStrategy.PATCH
-        #: (:obj:`str`) credential
-        self.__incd = None
         #: (:obj:`str`) credential file
         self.__incdfl = None
-        #: (:obj:`str`) credential file mtime
-        self.__incdfl_mtime = None
+        #: (:obj:`float`) token time-to-live in s
+        self.__token_ttl = None
+        #: (:obj:`float`) time in s to refresh token before its expiry
+        self.__token_margin = 60.0
         #: (:obj:`bool`) relative path in datablock flag
         self.__relpath_in_datablock = False
         #: (:obj:`str`) scicat url
@@ -153,6 +164,16 @@ class DatasetIngestor:
         self.__retry_failed_dataset_ingestion = True
         #: (:obj:`bool`) retry failed attachment ingestion on next event
         self.__retry_failed_attachment_ingestion = False
+        #: (:obj:`bool`) read only lines appended to the dataset lists
+        self.__incremental_list_reading = False
+        #: (:class:`scingestor.stateStore.StateStore`) ingestion state store
+        self.__state_store = None
+        #: (:obj:`float`) stale to live record ratio of the ingested
+        #:   dataset list which triggers its compaction
+        self.__compaction_ratio = None
+        #: (:obj:`int`) number of ingested dataset list records
+        #:   after the last compaction
+        self.__compacted_size = 0
         #: (:obj:`str`) metadata copy map file
         self.__copymapfile = None
         #: (:obj:`str`) metadata group map file
@@ -167,6 +188,24 @@ class DatasetIngestor:
         self.__override = False
         #: (:obj:`bool`) log generator command flag
         self.__logcommands = False
+        #: (:class:`scingestor.nxsGenerator.NXSGenerator`)
+        #:    in-process nxsfileinfo generator
+        self.__nxsgenerator = None
+        #: (:class:`scingestor.generatorPool.GeneratorPool`)
+        #:    generator worker pool
+        self.__generatorpool = None
+        #: (:class:`scingestor.metadataStore.MetadataStore`)
+        #:    in-memory store of streamed generator output
+        self.__metastore = None
+        #: (:class:`scingestor.datablockBuilder.DatablockBuilder`)
+        #:    built-in origdatablock generator
+        self.__datablockbuilder = None
+        #: (:class:`scingestor.fingerprintStore.FingerprintStore`)
+        #:    directory fingerprints of ingested origdatablocks
+        self.__fingerprints = None
+        #: (:class:`scingestor.generatorCache.GeneratorCache`)
+        #:    cache of generated metadata documents
+        self.__generatorcache = None
         #: (:obj:`bool`) empty units flag
         self.__emptyunits = True
         #: (:obj:`bool`) force measurement keyword flag
@@ -184,6 +223,14 @@ class DatasetIngestor:
 
         #: (:obj:`int`) maximal counter value for post tries
         self.__maxcounter = 100
+        #: (:obj:`int`) number of threads uploading origdatablocks
+        #:              and attachments of a dataset
+        self.__upload_workers = 1
+        #: (:obj:`bool`) generate metadata of fresh scans concurrently
+        self.__parallel_generation = False
+        #: (:obj:`list` <:obj:`str`>) staging methods of multi-entry
+        #:    master and plot files in the order of preference
+        self.__staging_methods = list(STAGING_METHODS)
 
         #: (:obj:`str`) raw dataset scan postfix
         self.__scanpostfix = ".scan.json"
@@ -317,6 +364,21 @@ class DatasetIngestor:
         #: (:obj:`dict`<:obj:`str`, :obj:`list`<:obj:`str`>>)
         #:   semi-ingested scan names
         self.__sc_seingested_map = {}
+        #: (:obj:`set`<:obj:`str`>) ingested scan names
+        self.__sc_ingested_keys = set()
+        #: (:obj:`set`<:obj:`str`>) scan names with ingested records
+        self.__sc_ingested_names = set()
+        #: (:class:`threading.Lock`) ingested dataset list lock
+        self.__ids_lock = threading.Lock()
+        #: (:class:`scingestor.listFileReader.ListFileReader`)
+        #:   dataset list reader
+        self.__ds_reader = ListFileReader(self.__dsfile)
+        #: (:class:`scingestor.listFileReader.ListFileReader`)
+        #:   ingested dataset list reader
+        self.__ids_reader = ListFileReader(self.__idsfile)
+        #: (:obj:`list`<:obj:`list`<:obj:`str`>>)
+        #:   ingested scans read from the ingested dataset list
+        self.__sc_ingested_read = []
 
         #: (:obj:`list` <:obj:`str`>) master file extension list
         self.__master_file_extension_list = ["nxs", "h5", "ndf", "nx", "fio"]
@@ -391,9 +453,6 @@ class DatasetIngestor:
         if "ingestor_credential_file" in self.__config.keys():
             self.__incdfl = self.__config["ingestor_credential_file"].format(
                 homepath=self.__homepath)
-            with open(self.__incdfl) as fl:
-                self.__incd = fl.read().strip()
-            self.__incdfl_mtime = os.stat(self.__incdfl)[8]
         if "ingestor_username" in self.__config.keys():
             self.__username = self.__config["ingestor_username"]
         if "dataset_update_strategy" in self.__config.keys():
@@ -451,6 +510,35 @@ class DatasetIngestor:
             self.__override = self.__config["override_attachment_signals"]
         if "log_generator_commands" in self.__config.keys():
             self.__logcommands = self.__config["log_generator_commands"]
+        if "in_process_metadata_generation" in self.__config.keys():
+            if self.__config["in_process_metadata_generation"]:
+                self.__nxsgenerator = NXSGenerator()
+        if "builtin_origdatablock_generator" in self.__config.keys():
+            if self.__config["builtin_origdatablock_generator"]:
+                self.__datablockbuilder = DatablockBuilder()
+                self.__datablockbuilder.configure(self.__config)
+        if "origdatablock_fingerprints" in self.__config.keys():
+            if self.__config["origdatablock_fingerprints"]:
+                self.__fingerprints = FingerprintStore(
+                    "%s%s" % (self.__idsfile, ".fingerprints"))
+        if "generator_cache_size" in self.__config.keys():
+            try:
+                maxsize = int(
+                    float(self.__config["generator_cache_size"]) * 1048576)
+                if maxsize > 0:
+                    self.__generatorcache = GeneratorCache(
+                        "%s%s%s" % (self.__var_dir, self.__idsfile,
+                                    ".generatorcache"), maxsize)
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        if "stream_generated_metadata" in self.__config.keys():
+            if self.__config["stream_generated_metadata"]:
+                self.__metastore = MetadataStore()
+        if "generator_pool_size" in self.__config.keys():
+            pool = GeneratorPool()
+            pool.configure(self.__config)
+            if pool.pool_size > 0:
+                self.__generatorpool = pool
         if "ingest_dataset_attachment" in self.__config.keys():
             self.__ingest_attachment = \
                 self.__config["ingest_dataset_attachment"]
@@ -460,6 +548,32 @@ class DatasetIngestor:
         if "retry_failed_attachment_ingestion" in self.__config.keys():
             self.__retry_failed_attachment_ingestion = \
                 self.__config["retry_failed_attachment_ingestion"]
+        if "incremental_list_reading" in self.__config.keys():
+            self.__incremental_list_reading = \
+                self.__config["incremental_list_reading"]
+        if "ingested_list_compaction_ratio" in self.__config.keys():
+            try:
+                self.__compaction_ratio = float(
+                    self.__config["ingested_list_compaction_ratio"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        if "ingestion_state_database" in self.__config.keys():
+            try:
+                self.__state_store = StateStore.open(
+                    str(self.__config["ingestion_state_database"]).format(
+                        beamtimeid=self.__bid,
+                        homepath=self.__homepath),
+                    self.__config.get("ingestion_state_batch_size", 100))
+                if os.path.isfile(self.__idsfile) and \
+                   not self.__state_store.size(self.__bid, self.__idsfile):
+                    get_logger().info(
+                        'DatasetIngestor: Import ingested datasets: %s'
+                        % self.__idsfile)
+                    self.__state_store.import_list(
+                        self.__bid, self.__idsfile)
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+                self.close()
         if "add_empty_units" in self.__config.keys():
             self.__emptyunits = self.__config["add_empty_units"]
 
@@ -687,6 +801,37 @@ class DatasetIngestor:
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
 
+        if "upload_workers_number" in self.__config.keys():
+            try:
+                self.__upload_workers = int(
+                    self.__config["upload_workers_number"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "parallel_metadata_generation" in self.__config.keys():
+            self.__parallel_generation = bool(
+                self.__config["parallel_metadata_generation"])
+
+        if "file_staging_methods" in self.__config.keys():
+            try:
+                self.__staging_methods = list(
+                    self.__config["file_staging_methods"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "scicat_token_ttl" in self.__config.keys():
+            try:
+                self.__token_ttl = float(self.__config["scicat_token_ttl"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "scicat_token_refresh_margin" in self.__config.keys():
+            try:
+                self.__token_margin = float(
+                    self.__config["scicat_token_refresh_margin"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
         if "metadata_fields_without_checks" in self.__config.keys():
             try:
                 self.__withoutsm = list(
@@ -701,6 +846,11 @@ class DatasetIngestor:
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
 
+        #: (:class:`scingestor.sciCatSession.SciCatSession`)
+        #:   shared pooled http session
+        self.__session = SciCatSession()
+        self.__session.configure(self.__config)
+
         #: (:obj:`dict` <:obj:`str`, :obj:`str`>) command format parameters
         self.__dctfmt = {
             "scanname": None,
@@ -754,6 +904,15 @@ class DatasetIngestor:
         # get_logger().info(
         #     'DatasetIngestor: LOGIN %s' % self.__tokenurl)
 
+        #: (:class:`scingestor.tokenManager.TokenManager`) token manager
+        self.__tokens = TokenManager()
+        #: (:class:`scingestor.tokenManager.TokenCredential`)
+        #:     ingestor credential
+        self.__credential = self.__tokens.credential(
+            self.__tokenurl, self.__incdfl, self.__username)
+        if self.__incdfl is not None:
+            self.__tokens.read_credential(self.__credential)
+
         #: (:obj:`str`) dataset url
         self.__dataseturl = self.__scicat_url + self.__scicat_datasets
         # self.__dataseturl = "http://www-science3d.desy.de:3000/api/v3/" \
@@ -775,48 +934,251 @@ class DatasetIngestor:
         #     "Datasets/{pid}/Attachments"
         #: (:obj:`str`) origdatablock url
 
-    def _generate_rawdataset_metadata(self, scan):
-        """ generate raw dataset metadata
+    def _run_generator(self, command, capture=False):
+        """ runs a generator command in-process or in the shell
 
-        :param scan: scan name
-        :type scan: :obj:`str`
-        :returns: a file name of generate file
+        :param command: generator command
+        :type command: :obj:`str`
+        :param capture: capture standard output flag
+        :type capture: :obj:`bool`
+        :returns: standard output of the command if captured
+        :rtype: :obj:`str`
+        """
+        if self.__datablockbuilder is not None:
+            output = self.__datablockbuilder.run(command)
+            if output is not None:
+                return output
+        if self.__generatorpool is not None:
+            return self.__generatorpool.run(command)
+        if self.__nxsgenerator is not None:
+            args = self.__nxsgenerator.arguments(command)
+            if args is not None:
+                return self.__nxsgenerator.run(command, args)
+        if capture:
+            result = subprocess.run(
+                command, shell=True,
+                text=True, capture_output=True, check=True)
+            return str(result.stdout)
+        subprocess.run(command, shell=True, check=True)
+        return ""
+
+    def _stream_generator(self, command):
+        """ runs a generator command printing its output document
+        and keeps the document in the metadata store
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: output file name, empty string without output document
+                  or None if the command writes its output file itself
+        :rtype: :obj:`str`
+        """
+        if self.__metastore is None:
+            return None
+        streamed = NXSGenerator().stream_command(command)
+        if streamed is None:
+            return None
+        command, output, mode = streamed
+        document = self._run_generator(command, capture=True)
+        # nxsfileinfo prints the document with a trailing new line
+        if document.endswith("\n"):
+            document = document[:-1]
+        if not document:
+            return ""
+        self.__metastore.put(output, document, mode)
+        return output
+
+    def _generator_key(self, template, command, dctfmt=None):
+        """ provides the generator cache key of the command
+
+        :param template: generator command template
+        :type template: :obj:`str`
+        :param command: formatted generator command
+        :type command: :obj:`str`
+        :param dctfmt: command format parameters,
+                       the ingestor ones if not given
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :returns: result key or None without the generator cache
+        :rtype: :obj:`str`
+        """
+        if self.__generatorcache is None:
+            return None
+        if dctfmt is None:
+            dctfmt = self.__dctfmt
+        files = [dctfmt[name] for name in [
+            "masterfile", "plotfile", "beamtimefile",
+            "copymapfile", "groupmapfile"]
+            if "{%s}" % name in template and dctfmt[name]]
+        return GeneratorCache.key(template, command, files)
+
+    def _cached_generator(self, key, command):
+        """ provides the cached output document of a generator command
+
+        :param key: generator cache key
+        :type key: :obj:`str`
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: output file name or None if the result is not cached
+        :rtype: :obj:`str`
+        """
+        if key is None:
+            return None
+        streamed = NXSGenerator().stream_command(command)
+        if streamed is None:
+            return None
+        _, output, mode = streamed
+        document = self.__generatorcache.get(key)
+        if document is None:
+            return None
+        if self.__metastore is not None:
+            self.__metastore.put(output, document, mode)
+        else:
+            with open(output, "w") as mf:
+                mf.write(document)
+            if mode is not None:
+                os.chmod(output, mode)
+        get_logger().debug(
+            'DatasetIngestor: Cached generator result: %s' % output)
+        return output
+
+    def _cache_generator_result(self, key, command):
+        """ stores the output document of a generator command
+
+        :param key: generator cache key
+        :type key: :obj:`str`
+        :param command: generator command
+        :type command: :obj:`str`
+        """
+        if key is None:
+            return
+        streamed = NXSGenerator().stream_command(command)
+        if streamed is None:
+            return
+        try:
+            document = self._read_metadata(streamed[1])
+        except Exception as e:
+            get_logger().debug('DatasetIngestor: %s' % str(e))
+            return
+        if document:
+            self.__generatorcache.put(key, document)
+
+    def _read_metadata(self, metafile):
+        """ reads a metadata document
+
+        :param metafile: metadata file name
+        :type metafile: :obj:`str`
+        :returns: json document
         :rtype: :obj:`str`
         """
+        if self.__metastore is not None:
+            return self.__metastore.read(metafile)
+        with open(metafile) as fl:
+            return fl.read()
+
+    def _write_metadata(self, metafile, smt):
+        """ writes a metadata document
+
+        :param metafile: metadata file name
+        :type metafile: :obj:`str`
+        :param smt: json document
+        :type smt: :obj:`str`
+        """
+        if self.__metastore is not None:
+            self.__metastore.update(metafile, smt)
+        else:
+            with open(metafile, "w") as mf:
+                mf.write(smt)
+
+    def _metadata_mtime(self, metafile):
+        """ provides modification time of a metadata document
+
+        :param metafile: metadata file name
+        :type metafile: :obj:`str`
+        :returns: modification time in s
+        :rtype: :obj:`float`
+        """
+        if self.__metastore is not None:
+            return self.__metastore.getmtime(metafile)
+        return os.path.getmtime(metafile)
+
+    def close(self):
+        """ releases the ingestion state store and the generator cache
+        """
+        if self.__state_store is not None:
+            self.__state_store.release()
+            self.__state_store = None
+        if self.__generatorcache is not None:
+            self.__generatorcache.close()
+            self.__generatorcache = None
+
+    def flush_metadata(self):
+        """ waits until streamed metadata documents are written
+        """
+        if self.__metastore is not None:
+            self.__metastore.flush()
+
+    def _resolve_masterfile(self, dctfmt):
+        """ sets the master file of the scan and its extension
+        in the command format parameters
+
+        :param dctfmt: command format parameters
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
+        """
         self.__ext = ""
 
-        self.__dctfmt["masterfile"] = \
-            "{scanpath}/{masterscanname}.{ext}".format(**self.__dctfmt)
+        dctfmt["masterfile"] = \
+            "{scanpath}/{masterscanname}.{ext}".format(**dctfmt)
         for ext in self.__master_file_extension_list:
-            self.__dctfmt["ext"] = ext
+            dctfmt["ext"] = ext
 
             if os.path.isfile(
                     "{scanpath}/{masterscanname}.{ext}".format(
-                        **self.__dctfmt)):
+                        **dctfmt)):
                 self.__ext = ext
-                self.__dctfmt["masterfile"] = \
+                dctfmt["masterfile"] = \
                     "{scanpath}/{masterscanname}.{ext}".format(
-                        **self.__dctfmt)
+                        **dctfmt)
                 break
         else:
             for ext in self.__master_file_extension_list:
-                self.__dctfmt["ext"] = ext
+                dctfmt["ext"] = ext
 
                 if os.path.isfile(
                         "{scanpath}/{scanname}/{scanname}.{ext}".
-                        format(**self.__dctfmt)):
+                        format(**dctfmt)):
                     self.__ext = ext
-                    self.__dctfmt["masterfile"] = \
+                    dctfmt["masterfile"] = \
                         "{scanpath}/{scanname}/{scanname}.{ext}".format(
-                            **self.__dctfmt)
+                            **dctfmt)
                     break
 
-        self.__dctfmt["ext"] = self.__ext
+        dctfmt["ext"] = self.__ext
+
+    def _generate_rawdataset_metadata(self, scan, dctfmt=None):
+        """ generate raw dataset metadata
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param dctfmt: command format parameters with the resolved
+                       master file, the ingestor ones if not given
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :returns: a file name of generate file
+        :rtype: :obj:`str`
+        """
+        if dctfmt is None:
+            dctfmt = self.__dctfmt
+            self._resolve_masterfile(dctfmt)
 
         ffname = ""
-        if self.__ext:
-            if self.__dctfmt["masterscanname"] != self.__dctfmt["scanname"]:
-                masterfile = self.__dctfmt["masterfile"]
+        streamed = None
+        if dctfmt["ext"]:
+            command = self.__datasetcommandfile.format(**dctfmt)
+            key = self._generator_key(
+                self.__datasetcommandfile, command, dctfmt)
+            cached = self._cached_generator(key, command)
+            staged = cached is None and \
+                dctfmt["masterscanname"] != dctfmt["scanname"]
+            if staged:
+                masterfile = dctfmt["masterfile"]
                 mdir, mfile = os.path.split(masterfile)
                 if self.__meta_in_var_dir and self.__var_dir:
                     mdir = "%s%s" % (self.__var_dir, mdir)
@@ -825,20 +1187,21 @@ class DatasetIngestor:
                 fcnt = 1
                 ffname = os.path.join(
                     mdir, "_tmp_scingestor_%s_%s" % (fcnt, mfile))
-                while os.path.isfile(ffname):
+                while os.path.lexists(ffname):
                     fcnt += 1
                     ffname = os.path.join(
                         mdir, "_tmp_scingestor_%s_%s" % (fcnt, mfile))
-                self.__dctfmt["masterfile"] = ffname
+                dctfmt["masterfile"] = ffname
 
-                shutil.copy(masterfile, self.__dctfmt["masterfile"])
+                stage_file(masterfile, dctfmt["masterfile"],
+                           self.__staging_methods)
+                command = self.__datasetcommandfile.format(**dctfmt)
 
             get_logger().info(
                 'DatasetIngestor: Generating %s metadata: %s %s' % (
-                    self.__ext, scan,
+                    dctfmt["ext"], scan,
                     "{metapath}/{scanname}{scanpostfix}".format(
-                        **self.__dctfmt)))
-            command = self.__datasetcommandfile.format(**self.__dctfmt)
+                        **dctfmt)))
             if self.__logcommands:
                 get_logger().info(
                     'DatasetIngestor: Generating dataset command: %s ' % (
@@ -847,20 +1210,26 @@ class DatasetIngestor:
                 get_logger().debug(
                     'DatasetIngestor: Generating dataset command: %s ' % (
                         command))
-            subprocess.run(command, shell=True, check=True)
+            if cached is not None:
+                streamed = cached
+            else:
+                streamed = self._stream_generator(command)
+                if streamed is None:
+                    self._run_generator(command)
+                self._cache_generator_result(key, command)
 
-            if self.__dctfmt["masterscanname"] != self.__dctfmt["scanname"]:
-                if os.path.isfile(self.__dctfmt["masterfile"]):
-                    os.remove(self.__dctfmt["masterfile"])
-                self.__dctfmt["masterfile"] = masterfile
+            if staged:
+                if os.path.isfile(dctfmt["masterfile"]):
+                    os.remove(dctfmt["masterfile"])
+                dctfmt["masterfile"] = masterfile
 
         else:
             get_logger().info(
                 'DatasetIngestor: Generating metadata: %s %s' % (
                     scan,
                     "{metapath}/{scanname}{scanpostfix}".format(
-                        **self.__dctfmt)))
-            command = self.__datasetcommand.format(**self.__dctfmt)
+                        **dctfmt)))
+            command = self.__datasetcommand.format(**dctfmt)
             if self.__logcommands:
                 get_logger().info(
                     'DatasetIngestor: Generating dataset command: %s'
@@ -869,92 +1238,129 @@ class DatasetIngestor:
                 get_logger().debug(
                     'DatasetIngestor: Generating dataset command: %s'
                     % (command))
-            subprocess.run(command, shell=True, check=True)
+            key = self._generator_key(
+                self.__datasetcommand, command, dctfmt)
+            streamed = self._cached_generator(key, command)
+            if streamed is None:
+                streamed = self._stream_generator(command)
+                if streamed is None:
+                    self._run_generator(command)
+                self._cache_generator_result(key, command)
         if ffname and os.path.isfile(ffname):
             try:
                 os.remove(ffname)
             except Exception as e:
                 get_logger().warning(
                     "File %s cannot be removed: %s" % (ffname, str(e)))
+        if streamed is not None:
+            return streamed
         rdss = glob.glob(
-            "{metapath}/{scanname}{scanpostfix}".format(**self.__dctfmt))
+            "{metapath}/{scanname}{scanpostfix}".format(**dctfmt))
         if rdss and rdss[0]:
             return rdss[0]
 
         return ""
 
-    def _generate_origdatablock_metadata(self, scan):
+    def _generate_origdatablock_metadata(self, scan, dctfmt=None):
         """ generate origdatablock metadata
 
         :param scan: scan name
         :type scan: :obj:`str`
+        :param dctfmt: command format parameters,
+                       the ingestor ones if not given
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
         :returns: a file name of generate file
         :rtype: :obj:`str`
         """
+        if dctfmt is None:
+            dctfmt = self.__dctfmt
         get_logger().info(
             'DatasetIngestor: Generating origdatablock metadata: %s %s' % (
                 scan,
                 "{metapath}/{scanname}{datablockpostfix}".format(
-                    **self.__dctfmt)))
-        cmd = self.__datablockcommand.format(**self.__dctfmt)
+                    **dctfmt)))
+        cmd = self.__datablockcommand.format(**dctfmt)
         sscan = (scan or "").split(" ")
         for sc in sscan:
             cmd += self.__datablockscanpath.format(
-                scanpath=self.__dctfmt["scanpath"], scanname=sc)
+                scanpath=dctfmt["scanpath"], scanname=sc)
         if self.__logcommands:
             get_logger().info(
                 'DatasetIngestor: Generating origdatablock command: %s' % cmd)
         else:
             get_logger().debug(
                 'DatasetIngestor: Generating origdatablock command: %s' % cmd)
-        subprocess.run(cmd, shell=True, check=True)
+        streamed = self._stream_generator(cmd)
+        if streamed is not None:
+            return streamed
+        self._run_generator(cmd)
         odbs = glob.glob(
             "{metapath}/{scanname}{datablockpostfix}".format(
-                    **self.__dctfmt))
+                    **dctfmt))
         if odbs and odbs[0]:
             return odbs[0]
         return ""
 
-    def _generate_attachment_metadata(self, scan):
-        """ generate origdatablock metadata
+    def _resolve_plotfile(self, dctfmt):
+        """ sets the plot file of the scan and its extension
+        in the command format parameters
 
-        :param scan: scan name
-        :type scan: :obj:`str`
-        :returns: a file name of generate file
-        :rtype: :obj:`str`
+        :param dctfmt: command format parameters
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
         """
         self.__plotext = ""
 
-        self.__dctfmt["plotfile"] = \
-            "{scanpath}/{masterscanname}.{plotext}".format(**self.__dctfmt)
+        dctfmt["plotfile"] = \
+            "{scanpath}/{masterscanname}.{plotext}".format(**dctfmt)
         for ext in self.__plot_file_extension_list:
-            self.__dctfmt["plotext"] = ext
+            dctfmt["plotext"] = ext
 
             if os.path.isfile(
                     "{scanpath}/{masterscanname}.{plotext}".format(
-                        **self.__dctfmt)):
+                        **dctfmt)):
                 self.__plotext = ext
-                self.__dctfmt["plotfile"] = \
+                dctfmt["plotfile"] = \
                     "{scanpath}/{masterscanname}.{plotext}".format(
-                        **self.__dctfmt)
+                        **dctfmt)
                 break
         else:
             for ext in self.__plot_file_extension_list:
-                self.__dctfmt["plotext"] = ext
+                dctfmt["plotext"] = ext
 
                 if os.path.isfile(
                         "{scanpath}/{scanname}/{scanname}.{plotext}".
-                        format(**self.__dctfmt)):
+                        format(**dctfmt)):
                     self.__plotext = ext
-                    self.__dctfmt["plotfile"] = \
+                    dctfmt["plotfile"] = \
                         "{scanpath}/{scanname}/{scanname}.{plotext}".format(
-                            **self.__dctfmt)
+                            **dctfmt)
                     break
-        self.__dctfmt["plotext"] = self.__plotext
+        dctfmt["plotext"] = self.__plotext
+
+    def _generate_attachment_metadata(self, scan, dctfmt=None):
+        """ generate origdatablock metadata
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param dctfmt: command format parameters with the resolved
+                       plot file, the ingestor ones if not given
+        :type dctfmt: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :returns: a file name of generate file
+        :rtype: :obj:`str`
+        """
+        if dctfmt is None:
+            dctfmt = self.__dctfmt
+            self._resolve_plotfile(dctfmt)
         ffname = ""
-        if self.__dctfmt["plotext"]:
-            if self.__dctfmt["masterscanname"] != self.__dctfmt["scanname"]:
-                plotfile = self.__dctfmt["plotfile"]
+        if dctfmt["plotext"]:
+            cmd = self.__attachmentcommand.format(**dctfmt)
+            key = self._generator_key(
+                self.__attachmentcommand, cmd, dctfmt)
+            cached = self._cached_generator(key, cmd)
+            staged = cached is None and \
+                dctfmt["masterscanname"] != dctfmt["scanname"]
+            if staged:
+                plotfile = dctfmt["plotfile"]
                 mdir, mfile = os.path.split(plotfile)
                 if self.__meta_in_var_dir and self.__var_dir:
                     mdir = "%s%s" % (self.__var_dir, mdir)
@@ -963,31 +1369,38 @@ class DatasetIngestor:
                 fcnt = 1
                 ffname = os.path.join(
                     mdir, "_tmp_scingestor_%s_%s" % (fcnt, mfile))
-                while os.path.isfile(ffname):
+                while os.path.lexists(ffname):
                     fcnt += 1
                     ffname = os.path.join(
                         mdir, "_tmp_scingestor_%s_%s" % (fcnt, mfile))
-                self.__dctfmt["plotfile"] = ffname
-                shutil.copy(plotfile, self.__dctfmt["plotfile"])
+                dctfmt["plotfile"] = ffname
+                stage_file(plotfile, dctfmt["plotfile"],
+                           self.__staging_methods)
+                cmd = self.__attachmentcommand.format(**dctfmt)
 
             get_logger().info(
                 'DatasetIngestor: Generating attachment metadata: %s %s' % (
                     scan,
                     "{metapath}/{scanname}{attachmentpostfix}".format(
-                        **self.__dctfmt)))
-            cmd = self.__attachmentcommand.format(**self.__dctfmt)
+                        **dctfmt)))
             if self.__logcommands:
                 get_logger().info(
                     'DatasetIngestor: Generating attachment command: %s' % cmd)
             else:
                 get_logger().debug(
                     'DatasetIngestor: Generating attachment command: %s' % cmd)
-            subprocess.run(cmd, shell=True, check=True)
+            if cached is not None:
+                streamed = cached
+            else:
+                streamed = self._stream_generator(cmd)
+                if streamed is None:
+                    self._run_generator(cmd)
+                self._cache_generator_result(key, cmd)
 
-            if self.__dctfmt["masterscanname"] != self.__dctfmt["scanname"]:
-                if os.path.isfile(self.__dctfmt["plotfile"]):
-                    os.remove(self.__dctfmt["plotfile"])
-                self.__dctfmt["plotfile"] = plotfile
+            if staged:
+                if os.path.isfile(dctfmt["plotfile"]):
+                    os.remove(dctfmt["plotfile"])
+                dctfmt["plotfile"] = plotfile
 
             if ffname and os.path.isfile(ffname):
                 try:
@@ -995,9 +1408,11 @@ class DatasetIngestor:
                 except Exception as e:
                     get_logger().warning(
                         "File %s cannot be removed: %s" % (ffname, str(e)))
+            if streamed is not None:
+                return streamed
             adss = glob.glob(
                 "{metapath}/{scanname}{attachmentpostfix}".format(
-                    **self.__dctfmt))
+                    **dctfmt))
             if adss and adss[0]:
                 return adss[0]
         return ""
@@ -1025,9 +1440,8 @@ class DatasetIngestor:
         # cmd = self.__datablockcommand.format(**self.__dctfmt)
         dmeta = None
         try:
-            with open(mfilename, "r") as mf:
-                meta = mf.read()
-                dmeta = json.loads(meta)
+            meta = self._read_metadata(mfilename)
+            dmeta = json.loads(meta)
         except Exception as e:
             if not force:
                 get_logger().warning('%s: %s' % (scan, str(e)))
@@ -1048,13 +1462,9 @@ class DatasetIngestor:
             get_logger().debug(
                 'DatasetIngestor: Generating origdatablock command: %s'
                 % cmd)
-        result = subprocess.run(
-            cmd, shell=True,
-            text=True, capture_output=True, check=True)
-        nwmeta = str(result.stdout)
+        nwmeta = self._run_generator(cmd, capture=True)
         if dmeta is None:
-            with open(mfilename, "w") as mf:
-                mf.write(nwmeta)
+            self._write_metadata(mfilename, nwmeta)
         else:
             try:
                 dnwmeta = json.loads(nwmeta)
@@ -1069,9 +1479,11 @@ class DatasetIngestor:
                             scan,
                             "{metapath}/{scanname}{datablockpostfix}".format(
                                 **self.__dctfmt)))
-                    with open(mfilename, "w") as mf:
-                        mf.write(nwmeta)
+                    self._write_metadata(mfilename, nwmeta)
 
+        if self.__metastore is not None \
+           and mfilename in self.__metastore.pending():
+            return mfilename
         odbs = glob.glob(mfilename)
         if odbs and odbs[0]:
             return odbs[0]
@@ -1141,38 +1553,43 @@ class DatasetIngestor:
         :rtype: :obj:`str`
         """
         try:
-            if self.__incdfl_mtime != os.stat(self.__incdfl)[8]:
-                with open(self.__incdfl) as fl:
-                    self.__incd = fl.read().strip()
-                self.__incdfl_mtime = os.stat(self.__incdfl)[8]
-            try:
-                jincd = json.loads(self.__incd)
-                if not isinstance(jincd, dict):
-                    jincd = {}
-            except Exception:
-                jincd = {}
-            if "jwt" in jincd.keys():
-                return jincd["jwt"]
-            if "id" in jincd.keys():
-                return jincd["id"]
-            password = self.__incd
-            username = self.__username
-            if "password" in jincd.keys():
-                password = jincd["password"]
-            if "username" in jincd.keys():
-                username = jincd["username"]
-            response = requests.post(
-                self.__tokenurl, headers=self.__headers,
-                json={"username": username, "password": password})
-            if response.ok:
-                return json.loads(response.content)["id"]
-            else:
-                raise Exception("%s" % response.text)
+            return self.__tokens.get_token(
+                self.__credential, self.__headers,
+                self.__token_ttl, self.__token_margin)
         except Exception as e:
             get_logger().error(
                 'DatasetIngestor: %s' % (str(e)))
         return ""
 
+    def _request(self, method, url, token, **kwargs):
+        """ sends scicat request and resends it once
+        with a refreshed token if the token was rejected
+
+        :param method: request method, i.e. get, post, patch or delete
+        :type method: :obj:`str`
+        :param url: request url
+        :type url: :obj:`str`
+        :param token: ingestor token
+        :type token: :obj:`str`
+        :returns: response
+        :rtype: :class:`requests.Response`
+        """
+        token = self.__tokens.current_token(self.__credential, token)
+        headers = dict(self.__headers)
+        headers["Authorization"] = "Bearer {}".format(token)
+        response = getattr(self.__session, method)(
+            url, headers=headers, params={"access_token": token}, **kwargs)
+        if response.status_code == 401:
+            ntoken = self.__tokens.refresh_token(
+                self.__credential, token, self.__headers,
+                self.__token_ttl, self.__token_margin)
+            if ntoken and ntoken != token:
+                headers["Authorization"] = "Bearer {}".format(ntoken)
+                response = getattr(self.__session, method)(
+                    url, headers=headers, params={"access_token": ntoken},
+                    **kwargs)
+        return response
+
     def append_proposal_groups(self):
         """ appends owner and access groups to beamtime
 
@@ -1186,17 +1603,15 @@ class DatasetIngestor:
         token = self.get_token()
         bid = self.__meta["beamtimeId"]
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
             propid = self.__idpattern.format(
                 beamtimeId=self.__bid.replace("/", "%2F"),
                 proposalId=self.__dpid.replace("/", "%2F"))
-            resexists = requests.get(
-                "{url}/{pid}"
+            resexists = self._request(
+                "get", "{url}/{pid}"
                 .format(
                     url=self.__proposalurl,
                     pid=propid),
-                headers=self.__headers,
-                params={"access_token": token}
+                token
             )
 
             if resexists.ok:
@@ -1281,14 +1696,12 @@ class DatasetIngestor:
             npid = npre + "/".join(spid)
             if len(spid) > 0:
                 ipid = npre + "/".join(spid)
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            resexists = requests.get(
-                "{url}/{pid}"
+            resexists = self._request(
+                "get", "{url}/{pid}"
                 .format(
                     url=self.__dataseturl,
                     pid=(npre + npid.replace("/", "%2F"))),
-                headers=self.__headers,
-                params={"access_token": token})
+                token)
             if resexists.ok:
                 pexist = bool(resexists.content)
             else:
@@ -1312,11 +1725,9 @@ class DatasetIngestor:
             'Post the dataset with a new pid: %s' % (npid))
 
         # post the dataset with the new pid
-        self.__headers["Authorization"] = "Bearer {}".format(token)
-        response = requests.post(
-            self.__dataseturl,
-            params={"access_token": token},
-            headers=self.__headers,
+        response = self._request(
+            "post", self.__dataseturl,
+            token,
             data=nmeta)
         if response.ok:
             return mdic["pid"]
@@ -1341,14 +1752,12 @@ class DatasetIngestor:
             'DatasetIngestor: '
             'Patch scientificMetadata of dataset:'
             ' %s' % (pid))
-        self.__headers["Authorization"] = "Bearer {}".format(token)
-        response = requests.patch(
-            "{url}/{pid}"
+        response = self._request(
+            "patch", "{url}/{pid}"
             .format(
                 url=self.__dataseturl,
                 pid=pid.replace("/", "%2F")),
-            params={"access_token": token},
-            headers=self.__headers,
+            token,
             data=nmeta)
         if response.ok:
             return mdct["pid"]
@@ -1374,15 +1783,13 @@ class DatasetIngestor:
                 'DatasetIngestor: Check if dataset exists: %s' % (pid))
             checking = True
             counter = 0
-            self.__headers["Authorization"] = "Bearer {}".format(token)
             exists = None
             while checking:
-                resexists = requests.get(
-                    "{url}/{pid}".format(
+                resexists = self._request(
+                    "get", "{url}/{pid}".format(
                         url=self.__dataseturl,
                         pid=pid.replace("/", "%2F")),
-                    headers=self.__headers,
-                    params={"access_token": token}
+                    token
                 )
                 if hasattr(resexists, "content"):
                     try:
@@ -1433,11 +1840,9 @@ class DatasetIngestor:
                     # post the new dataset since it does not exist
                     get_logger().info(
                         'DatasetIngestor: Post the dataset: %s' % (pid))
-                    self.__headers["Authorization"] = "Bearer {}".format(token)
-                    response = requests.post(
-                        self.__dataseturl,
-                        headers=self.__headers,
-                        params={"access_token": token},
+                    response = self._request(
+                        "post", self.__dataseturl,
+                        token,
                         data=metadata)
                     if response.ok:
                         return mdct["pid"]
@@ -1447,12 +1852,11 @@ class DatasetIngestor:
                     # find dataset by pid
                     get_logger().info(
                         'DatasetIngestor: Find the dataset by id: %s' % (pid))
-                    resds = requests.get(
-                        "{url}/{pid}".format(
+                    resds = self._request(
+                        "get", "{url}/{pid}".format(
                             url=self.__dataseturl,
                             pid=pid.replace("/", "%2F")),
-                        headers=self.__headers,
-                        params={"access_token": token}
+                        token
                     )
                     if resds.ok:
                         dsmeta = json.loads(resds.content)
@@ -1522,11 +1926,9 @@ class DatasetIngestor:
         :rtype: :obj:`bool`
         """
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.post(
-                self.__datablockurl,
-                headers=self.__headers,
-                params={"access_token": token},
+            response = self._request(
+                "post", self.__datablockurl,
+                token,
                 data=metadata)
             if response.ok:
                 return True
@@ -1555,11 +1957,9 @@ class DatasetIngestor:
             # get_logger().debug(
             #     'DatasetIngestor: ingest attachment %s' % (
             #         url.format(pid=dsid, token=token)))
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.post(
-                url.format(pid=dsid),
-                headers=self.__headers,
-                params={"access_token": token},
+            response = self._request(
+                "post", url.format(pid=dsid),
+                token,
                 data=metadata)
             if response.ok:
                 return True
@@ -1581,12 +1981,10 @@ class DatasetIngestor:
         :rtype: :obj:`str` <:obj:`str`>
         """
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.get(
-                self.__dataseturl + "/%s/%s" %
+            response = self._request(
+                "get", self.__dataseturl + "/%s/%s" %
                 (datasetid.replace("/", "%2F"), self.__scicat_datablocks),
-                params={"access_token": token},
-                headers=self.__headers)
+                token)
             if response.ok:
                 js = response.json()
                 return js
@@ -1604,14 +2002,12 @@ class DatasetIngestor:
         :type token: :obj:`str`
         """
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.delete(
-                "{url}/{pid}"
+            response = self._request(
+                "delete", "{url}/{pid}"
                 .format(
                     url=self.__datablockurl,
                     pid=did.replace("/", "%2F")),
-                params={"access_token": token},
-                headers=self.__headers,
+                token
             )
             if response.ok:
                 return True
@@ -1633,11 +2029,9 @@ class DatasetIngestor:
         :rtype: :obj:`str` <:obj:`str`>
         """
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.get(self.__attachmenturl.format(
+            response = self._request("get", self.__attachmenturl.format(
                 pid=datasetid.replace("/", "%2F")),
-                params={"access_token": token},
-                headers=self.__headers
+                token
             )
             if response.ok:
                 js = response.json()
@@ -1658,13 +2052,11 @@ class DatasetIngestor:
         :type token: :obj:`str`
         """
         try:
-            self.__headers["Authorization"] = "Bearer {}".format(token)
-            response = requests.delete(
-                self.__attachmenturl.format(
+            response = self._request(
+                "delete", self.__attachmenturl.format(
                     pid=datasetid.replace("/", "%2F"))
                 + "/{aid}".format(aid=aid.replace("/", "%2F")),
-                params={"access_token": token},
-                headers=self.__headers)
+                token)
             if response.ok:
                 return True
             else:
@@ -1684,8 +2076,7 @@ class DatasetIngestor:
         """
         pid = None
         try:
-            with open(metafile) as fl:
-                smt = fl.read()
+            smt = self._read_metadata(metafile)
             mt = json.loads(smt)
             pid = mt["pid"]
         except Exception as e:
@@ -1705,9 +2096,8 @@ class DatasetIngestor:
         :rtype: :obj:`str`
         """
         try:
-            with open(metafile) as fl:
-                smt = fl.read()
-                mt = json.loads(smt)
+            smt = self._read_metadata(metafile)
+            mt = json.loads(smt)
             spid = self.__idpattern.format(
                 beamtimeId=self.__bid, proposalId=self.__dpid)
             if mt["type"] == "raw" and mt["proposalId"] != spid:
@@ -1789,10 +2179,10 @@ class DatasetIngestor:
             odbs = self._get_attachments(datasetid, token) or []
             # get_logger().info("DA2 %s %s" % (pid, odbs))
             found = []
+            nads = []
             for fads in tads:
-                with open(fads) as fl:
-                    smt = fl.read()
-                    ads = json.loads(smt)
+                smt = self._read_metadata(fads)
+                ads = json.loads(smt)
                 if "thumbnail" in ads:
                     for odb in odbs:
                         if "thumbnail" in odb and \
@@ -1801,11 +2191,12 @@ class DatasetIngestor:
                                 found.append(odb["id"])
                             break
                     else:
-                        dastatus = self._ingest_attachment_metadata(
-                            fads, pid, token)
-                        get_logger().info(
-                            "DatasetIngestor: Ingest attachment: %s"
-                            % (fads))
+                        nads.append(fads)
+            for fads, dastatus in self._upload_metadata(
+                    self._ingest_attachment_metadata, nads, pid, token):
+                get_logger().info(
+                    "DatasetIngestor: Ingest attachment: %s"
+                    % (fads))
             for odb in odbs:
                 if "id" in odb and odb["id"] not in found:
                     self._get_delete_attachment(datasetid, odb["id"], token)
@@ -1826,9 +2217,8 @@ class DatasetIngestor:
         :rtype: :obj:`str`
         """
         try:
-            with open(metafile) as fl:
-                smt = fl.read()
-                mt = json.loads(smt)
+            smt = self._read_metadata(metafile)
+            mt = json.loads(smt)
             if not pid or not pid.startswith(self.__bid):
                 raise Exception(
                     "Wrong origdatablock datasetId %s for DESY beamtimeId "
@@ -1837,8 +2227,7 @@ class DatasetIngestor:
             if mt["datasetId"] != "%s%s" % (self.__pidprefix, pid):
                 mt["datasetId"] = "%s%s" % (self.__pidprefix, pid)
                 smt = json.dumps(mt)
-                with open(metafile, "w") as mf:
-                    mf.write(smt)
+                self._write_metadata(metafile, smt)
             status = time.time()
             if "dataFileList" in mt and mt["dataFileList"]:
                 status = self._ingest_origdatablock(smt, token)
@@ -1860,9 +2249,8 @@ class DatasetIngestor:
         :rtype: :obj:`str`
         """
         try:
-            with open(metafile) as fl:
-                smt = fl.read()
-                mt = json.loads(smt)
+            smt = self._read_metadata(metafile)
+            mt = json.loads(smt)
             if "datasetId" in mt:
                 if not pid or not pid.startswith(self.__bid):
                     raise Exception(
@@ -1872,13 +2260,11 @@ class DatasetIngestor:
                 if mt["datasetId"] != "%s%s" % (self.__pidprefix, pid):
                     mt["datasetId"] = "%s%s" % (self.__pidprefix, pid)
                     smt = json.dumps(mt)
-                    with open(metafile, "w") as mf:
-                        mf.write(smt)
+                    self._write_metadata(metafile, smt)
             else:
                 mt["datasetId"] = "%s%s" % (self.__pidprefix, pid)
                 smt = json.dumps(mt)
-                with open(metafile, "w") as mf:
-                    mf.write(smt)
+                self._write_metadata(metafile, smt)
             dsid = "%s%s" % (self.__pidprefix, pid)
             status = self._ingest_attachment(smt, dsid, token)
             if status:
@@ -1888,6 +2274,93 @@ class DatasetIngestor:
                 'DatasetIngestor: %s' % (str(e)))
         return ""
 
+    def _datablock_fingerprint(self, scan):
+        """ computes the directory fingerprint of origdatablock files
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :returns: scan fingerprint or None
+        :rtype: :obj:`dict` <:obj:`str`, `any`>
+        """
+        if self.__fingerprints is None:
+            return None
+        return self.__fingerprints.fingerprint(
+            self._datablock_paths(scan))
+
+    def _datablock_paths(self, scan):
+        """ provides scan paths of origdatablock files
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :returns: scan paths
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        return ["{scanpath}/{scanname}".format(
+            scanpath=self.__dctfmt["scanpath"], scanname=sc)
+            for sc in (scan or "").split(" ") if sc]
+
+    def _generate_metadata(self, scan, attachment=True):
+        """ generates dataset, origdatablock and attachment metadata
+        of the scan concurrently
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param attachment: generate attachment metadata flag
+        :type attachment: :obj:`bool`
+        :returns: file names of generated dataset, origdatablock
+                  and attachment metadata
+        :rtype: (:obj:`str`, :obj:`str`, :obj:`str`)
+        """
+        # each generator formats its commands with its own parameters
+        self._resolve_masterfile(self.__dctfmt)
+        if attachment:
+            self._resolve_plotfile(self.__dctfmt)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) \
+                as executor:
+            frds = executor.submit(
+                self._generate_rawdataset_metadata,
+                self.__dctfmt["scanname"], dict(self.__dctfmt))
+            fodb = executor.submit(
+                self._generate_origdatablock_metadata, scan,
+                dict(self.__dctfmt))
+            fads = None
+            if attachment:
+                fads = executor.submit(
+                    self._generate_attachment_metadata,
+                    self.__dctfmt["scanname"], dict(self.__dctfmt))
+            return (frds.result(), fodb.result(),
+                    fads.result() if fads is not None else None)
+
+    def _upload_metadata(self, ingest, metafiles, pid, token):
+        """ uploads origdatablock or attachment metadata files
+        of one dataset, concurrently if upload workers are set
+
+        :param ingest: ingest method, i.e.
+                       _ingest_origdatablock_metadata or
+                       _ingest_attachment_metadata
+        :type ingest: :obj:`instancemethod`
+        :param metafiles: metadata file names
+        :type metafiles: :obj:`list` <:obj:`str`>
+        :param pid: dataset id
+        :type pid: :obj:`str`
+        :param token: ingestor token
+        :type token: :obj:`str`
+        :returns: metadata file names with their upload status
+                  in the order of the input files
+        :rtype: :obj:`generator` <(:obj:`str`, :obj:`str`)>
+        """
+        if self.__upload_workers > 1 and len(metafiles) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(self.__upload_workers,
+                                    len(metafiles))) as executor:
+                futures = [executor.submit(ingest, metafile, pid, token)
+                           for metafile in metafiles]
+                for metafile, future in zip(metafiles, futures):
+                    yield metafile, future.result()
+        else:
+            for metafile in metafiles:
+                yield metafile, ingest(metafile, pid, token)
+
     def ingest(self, scan, token):
         """ ingest scan
 
@@ -1918,8 +2391,34 @@ class DatasetIngestor:
                 scan=self.__dctfmt["scanname"],
                 postfix=self.__scanpostfix,
                 metapath=self.__dctfmt["metapath"]))
+        odbs = glob.glob(
+            "{metapath}/{scan}{postfix}".format(
+                scan=self.__dctfmt["scanname"],
+                postfix=self.__datablockpostfix,
+                metapath=self.__dctfmt["metapath"]))
+        adss = []
+        if self.__ingest_attachment:
+            adss = glob.glob(
+                "{metapath}/{scan}{postfix}".format(
+                    scan=self.__dctfmt["scanname"],
+                    postfix=self.__attachmentpostfix,
+                    metapath=self.__dctfmt["metapath"]))
+        # taken before the origdatablock generation
+        fingerprint = self._datablock_fingerprint(scan)
+        generated = None
+        if self.__parallel_generation \
+           and not (rdss and rdss[0]) \
+           and not (odbs and odbs[0] and not self.__single_datablock) \
+           and not (adss and adss[0]) \
+           and (self.__forcegeneratemeasurement or
+                self.__dctfmt["scanname"] not in self.__measurements):
+            generated = self._generate_metadata(
+                scan, self.__ingest_attachment)
+
         if rdss and rdss[0]:
             rds = rdss[0]
+        elif generated is not None:
+            rds = generated[0]
         elif self.__forcegeneratemeasurement or \
                 self.__dctfmt["scanname"] not in self.__measurements:
             rds = self._generate_rawdataset_metadata(self.__dctfmt["scanname"])
@@ -1928,52 +2427,47 @@ class DatasetIngestor:
         mtmds = 0
         ads = None
         if rds:
-            mtmds = os.path.getmtime(rds)
+            mtmds = self._metadata_mtime(rds)
 
-        odbs = glob.glob(
-            "{metapath}/{scan}{postfix}".format(
-                scan=self.__dctfmt["scanname"],
-                postfix=self.__datablockpostfix,
-                metapath=self.__dctfmt["metapath"]))
         if odbs and odbs[0] and not self.__single_datablock:
             odb = odbs[0]
             todb = [odb]
-            with open(odb) as fl:
-                dbmt = json.loads(fl.read())
-                if isinstance(dbmt, list):
-                    if self.__skip_multi_datablock:
-                        todb = []
-                    else:
-                        todb = dbmt
+            fingerprint = None
+            dbmt = json.loads(self._read_metadata(odb))
+            if isinstance(dbmt, list):
+                if self.__skip_multi_datablock:
+                    todb = []
+                else:
+                    todb = dbmt
+        elif generated is not None:
+            odb = generated[1]
+            todb = [odb]
         else:
             odb = self._generate_origdatablock_metadata(scan)
             todb = [odb]
         mtmdb = 0
         if odb:
-            mtmdb = os.path.getmtime(odb)
+            mtmdb = self._metadata_mtime(odb)
         mtmda = 0
         if self.__ingest_attachment:
-            adss = glob.glob(
-                "{metapath}/{scan}{postfix}".format(
-                    scan=self.__dctfmt["scanname"],
-                    postfix=self.__attachmentpostfix,
-                    metapath=self.__dctfmt["metapath"]))
             if adss and adss[0]:
                 ads = adss[0]
                 tads = [ads]
-                with open(ads) as fl:
-                    admt = json.loads(fl.read())
-                    if isinstance(admt, list):
-                        if self.__skip_multi_attachment:
-                            tads = []
-                        else:
-                            tads = admt
+                admt = json.loads(self._read_metadata(ads))
+                if isinstance(admt, list):
+                    if self.__skip_multi_attachment:
+                        tads = []
+                    else:
+                        tads = admt
+            elif generated is not None:
+                ads = generated[2]
+                tads = [ads]
             else:
                 ads = self._generate_attachment_metadata(
                     self.__dctfmt["scanname"])
                 tads = [ads]
             if ads:
-                mtmda = os.path.getmtime(ads)
+                mtmda = self._metadata_mtime(ads)
 
         if (self.__callcallback or self.__measurement_status) \
            and self.__metadatageneratedcallback \
@@ -1982,7 +2476,9 @@ class DatasetIngestor:
             get_logger().info(
                 'DatasetIngestor: Metadata generated callback: %s ' % (
                     command))
-            subprocess.run(command, shell=True, check=True)
+            # the callback reads the metadata files
+            self.flush_metadata()
+            self._run_generator(command)
         dbstatus = None
         dastatus = None
         pid = None
@@ -1992,19 +2488,21 @@ class DatasetIngestor:
             if todb and todb[0] and pid:
                 if pid is None and rdss and rdss[0]:
                     pid = self._get_pid(rdss[0])
-                for odb in todb:
-                    dbstatus = self._ingest_origdatablock_metadata(
-                        odb, pid, token)
+                for odb, dbstatus in self._upload_metadata(
+                        self._ingest_origdatablock_metadata,
+                        todb, pid, token):
                     if not dbstatus:
                         mtmdb = -1
+                if dbstatus and fingerprint is not None:
+                    self.__fingerprints.update(scan, fingerprint)
             if pid is None and rdss and rdss[0]:
                 pid = self._get_pid(rdss[0])
             if self.__ingest_attachment and tads and tads[0] and pid:
                 if pid is None and rdss and rdss[0]:
                     pid = self._get_pid(rdss[0])
-                for ads in tads:
-                    dastatus = self._ingest_attachment_metadata(
-                        ads, pid, token)
+                for ads, dastatus in self._upload_metadata(
+                        self._ingest_attachment_metadata,
+                        tads, pid, token):
                     if not dastatus:
                         mtmda = -1
         if pid is None:
@@ -2026,10 +2524,10 @@ class DatasetIngestor:
         sscan.extend([str(mtmds), str(mtmdb), str(mtmda)])
         self.__sc_ingested.append(sscan)
         self.__sc_seingested_map[scan] = [mtmds, mtmdb, mtmda]
-        with open(self.__idsfile, 'a+') as f:
-            f.write("%s %s %s %s\n" % (scan, mtmds, mtmdb, mtmda))
+        self._write_ingested(
+            self.__idsfile, scan, mtmds, mtmdb, mtmda, pid)
 
-    def reingest(self, scan, token, notmp=False):
+    def reingest(self, scan, token, notmp=False, deep=False):
         """ re-ingest scan
 
         :param scan: scan name
@@ -2038,10 +2536,14 @@ class DatasetIngestor:
         :type token: :obj:`str`
         :param token: no tmp file flag
         :type token: :obj:`book`
+        :param deep: regenerate origdatablocks of unchanged directories
+        :type deep: :obj:`bool`
         """
         get_logger().info(
             'DatasetIngestor: Checking: %s %s' % (
                 self.__dsfile, scan))
+        # metadata files are compared with the ingested ones
+        self.flush_metadata()
 
         reingest_dataset = False
         reingest_origdatablock = False
@@ -2093,7 +2595,7 @@ class DatasetIngestor:
                 metapath=self.__dctfmt["metapath"]))
         if rdss and rdss[0]:
             rds = rdss[0]
-            mtm = os.path.getmtime(rds)
+            mtm = self._metadata_mtime(rds)
             # print(self.__sc_ingested_map.keys())
             get_logger().debug("MAP: %s" % (self.__sc_ingested_map))
 
@@ -2116,7 +2618,7 @@ class DatasetIngestor:
             rds = []
         mtmds = 0
         if rds:
-            mtmds = os.path.getmtime(rds)
+            mtmds = self._metadata_mtime(rds)
 
         odbs = glob.glob(
             "{metapath}/{scan}{postfix}".format(
@@ -2127,16 +2629,15 @@ class DatasetIngestor:
             odb = odbs[0]
             todb = [odb]
             olst = False
-            with open(odb) as fl:
-                dbmt = json.loads(fl.read())
-                if isinstance(dbmt, list):
-                    olst = True
-                    if self.__skip_multi_datablock:
-                        todb = []
-                    else:
-                        todb = dbmt
+            dbmt = json.loads(self._read_metadata(odb))
+            if isinstance(dbmt, list):
+                olst = True
+                if self.__skip_multi_datablock:
+                    todb = []
+                else:
+                    todb = dbmt
 
-            mtm0 = os.path.getmtime(odb)
+            mtm0 = self._metadata_mtime(odb)
             if scan not in self.__sc_ingested_map.keys() \
                or mtm0 > self.__sc_ingested_map[scan][-2]:
                 reingest_origdatablock = True
@@ -2147,11 +2648,20 @@ class DatasetIngestor:
                     mtm0 - self.__sc_ingested_map[scan][-2],
                     reingest_origdatablock)
                 )
-            if not olst:
+            if not olst and not reingest_origdatablock and not deep \
+               and self.__fingerprints is not None \
+               and self.__fingerprints.unchanged(
+                   scan, self._datablock_paths(pscan)):
+                get_logger().debug(
+                    "DB Fingerprint: %s unchanged" % (scan))
+            elif not olst:
+                fingerprint = self._datablock_fingerprint(pscan)
                 self._regenerate_origdatablock_metadata(
                     pscan, reingest_origdatablock)
+                if fingerprint is not None:
+                    self.__fingerprints.update(scan, fingerprint)
 
-            mtm = os.path.getmtime(odb)
+            mtm = self._metadata_mtime(odb)
 
             if scan in self.__sc_ingested_map.keys():
                 get_logger().debug("DB Timestamps: %s %s %s %s" % (
@@ -2180,7 +2690,7 @@ class DatasetIngestor:
                 reingest_origdatablock = True
         mtmdb = 0
         if odb:
-            mtmdb = os.path.getmtime(odb)
+            mtmdb = self._metadata_mtime(odb)
 
         if (self.__callcallback or self.__measurement_status) \
            and self.__metadatageneratedcallback \
@@ -2189,7 +2699,9 @@ class DatasetIngestor:
             get_logger().info(
                 'DatasetIngestor: Metadata generated callback: %s ' % (
                     command))
-            subprocess.run(command, shell=True, check=True)
+            # the callback reads the metadata files
+            self.flush_metadata()
+            self._run_generator(command)
         dastatus = None
         dbstatus = None
         ads = None
@@ -2203,14 +2715,13 @@ class DatasetIngestor:
             if adss and adss[0]:
                 ads = adss[0]
                 tads = [ads]
-                with open(ads) as fl:
-                    admt = json.loads(fl.read())
-                    if isinstance(admt, list):
-                        if self.__skip_multi_attachment:
-                            tads = []
-                        else:
-                            tads = admt
-                mtm0 = os.path.getmtime(ads)
+                admt = json.loads(self._read_metadata(ads))
+                if isinstance(admt, list):
+                    if self.__skip_multi_attachment:
+                        tads = []
+                    else:
+                        tads = admt
+                mtm0 = self._metadata_mtime(ads)
                 if scan in self.__sc_ingested_map.keys():
                     get_logger().debug(
                         "ATTRIBUTE REINGEST check: %s ?? %s"
@@ -2224,7 +2735,7 @@ class DatasetIngestor:
                 reingest_attachment = True
                 tads = [ads]
             if ads:
-                mtm0 = os.path.getmtime(ads)
+                mtm0 = self._metadata_mtime(ads)
 
         pid = None
         if (rds and odb) or ads:
@@ -2241,9 +2752,9 @@ class DatasetIngestor:
                 if pid is None and rdss and rdss[0]:
                     pid = self._get_pid(rdss[0])
                 self._delete_origdatablocks(pid, token)
-                for odb in todb:
-                    dbstatus = self._ingest_origdatablock_metadata(
-                        odb, pid, token)
+                for odb, dbstatus in self._upload_metadata(
+                        self._ingest_origdatablock_metadata,
+                        todb, pid, token):
                     get_logger().info(
                         "DatasetIngestor: Ingest origdatablock: %s" % (odb))
                 if not dbstatus:
@@ -2268,9 +2779,9 @@ class DatasetIngestor:
                                 tads, pid, token)
                         else:
                             self._delete_attachments(pid, token)
-                            for ads in tads:
-                                dastatus = self._ingest_attachment_metadata(
-                                    ads, pid, token)
+                            for ads, dastatus in self._upload_metadata(
+                                    self._ingest_attachment_metadata,
+                                    tads, pid, token):
                                 get_logger().info(
                                     "DatasetIngestor: Ingest attachment: %s"
                                     % (ads))
@@ -2278,7 +2789,7 @@ class DatasetIngestor:
                             mtmda = -1
         mtmda = 0
         if ads:
-            mtmda = os.path.getmtime(ads)
+            mtmda = self._metadata_mtime(ads)
 
         if (pid and reingest_dataset):
             pass
@@ -2306,76 +2817,223 @@ class DatasetIngestor:
         lfile = self.__idsfiletmp
         if notmp:
             lfile = self.__idsfile
-        with open(lfile, 'a+') as f:
-            f.write("%s %s %s %s\n" % (scan, mtmds, mtmdb, mtmda))
+        self._write_ingested(lfile, scan, mtmds, mtmdb, mtmda, pid)
+
+    def _write_ingested(self, lfile, scan, mtmds, mtmdb, mtmda, pid):
+        """ writes ingested scan record
+
+        :param lfile: ingested dataset list file
+        :type lfile: :obj:`str`
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param mtmds: dataset metadata modification time
+        :type mtmds: :obj:`float`
+        :param mtmdb: origdatablock metadata modification time
+        :type mtmdb: :obj:`float`
+        :param mtmda: attachment metadata modification time
+        :type mtmda: :obj:`float`
+        :param pid: dataset pid
+        :type pid: :obj:`str`
+        """
+        if self.__state_store is None:
+            with self.__ids_lock:
+                with open(lfile, 'a+') as f:
+                    f.write("%s %s %s %s\n" % (scan, mtmds, mtmdb, mtmda))
+            return
+        errors = [name for name, mtm in [
+            ("dataset", mtmds), ("origdatablock", mtmdb),
+            ("attachment", mtmda)] if mtm == -1]
+        error = None
+        if errors:
+            error = "%s ingestion failed" % ", ".join(errors)
+        self.__state_store.update(
+            self.__bid, self.__idsfile, scan, mtmds, mtmdb, mtmda,
+            pid or None, error)
+
+    def _read_lists(self):
+        """ reads lines appended to the dataset lists
+
+        :returns: scan names, new ingested scans and
+                  a flag if the ingested dataset list was parsed again
+        :rtype: (:obj:`list` <:obj:`str`>,
+                 :obj:`list` <:obj:`list` <:obj:`str`>>, :obj:`bool`)
+        """
+        self.__ds_reader.read()
+        scans = self.__ds_reader.all_lines()
+        nscans = None
+        full = True
+        if self.__state_store is None and os.path.isfile(self.__idsfile):
+            if self.__ids_reader.read():
+                self.__sc_ingested_read = []
+                nscans = self.__ids_reader.lines
+            else:
+                full = False
+                nscans = self.__ids_reader.lines[
+                    len(self.__ids_reader.lines)
+                    - self.__ids_reader.appended:]
+            # an unfinished line is taken when it is completed
+            nscans = [sc.split(" ") for sc in nscans]
+            self.__sc_ingested_read.extend(nscans)
+            self.__sc_ingested = list(self.__sc_ingested_read)
+        return scans, nscans, full
+
+    def _ingested_status(self, sc):
+        """ provides status of ingested scan record
+
+        :param sc: ingested scan record
+        :type sc: :obj:`list` <:obj:`str`>
+        :returns: scan name, metadata modification times or None,
+                  ingested flag and valid modification times flag
+        :rtype: (:obj:`str`, :obj:`list` <:obj:`float`>,
+                 :obj:`bool`, :obj:`bool`)
+        """
+        if len(sc) <= 3:
+            return sc[0], None, True, False
+        scan = " ".join(sc[:-3])
+        retry = self.__retry_failed_dataset_ingestion
+        try:
+            mtms = [float(sc[-3]), float(sc[-2]), float(sc[-1])]
+        except Exception as e:
+            get_logger().debug("%s" % str(e))
+            return scan, None, not retry, False
+        check_attach = self.__retry_failed_attachment_ingestion \
+            and self.__ingest_attachment
+        ingested = not retry or (
+            mtms[2] != -1 and (not check_attach or mtms[2] > 0)
+            and mtms[1] > 0 and mtms[0] > 0)
+        valid = mtms[2] >= 0 and mtms[1] > 0 and mtms[0] > 0
+        return scan, mtms, ingested, valid
+
+    def _index_ingested(self, ingested, frommemory=False):
+        """ updates ingested scan index
+
+        :param ingested: ingested scan records
+        :type ingested: :obj:`list` <:obj:`list` <:obj:`str`>>
+        :param frommemory: records not read from the ingested dataset list
+        :type frommemory: :obj:`bool`
+        """
+        for sc in ingested:
+            scan, mtms, isingested, valid = self._ingested_status(sc)
+            self.__sc_ingested_names.add(scan)
+            if isingested:
+                self.__sc_ingested_keys.add(scan)
+            if mtms is None:
+                continue
+            if not frommemory:
+                self.__sc_seingested_map[scan] = mtms
+            if valid:
+                sc[-3:] = mtms
+                self.__sc_ingested_map[scan] = sc
+
+    def _compact_ingested_list(self):
+        """ rewrites the ingested dataset list without superseded records
+
+        The last record of each scan is kept together with the last
+        parsable, the last ingested and the last valid record,
+        so the compacted list gives the same ingestion state.
+        The next compaction is triggered by records appended
+        after the kept ones.
+        """
+        with self.__ids_lock:
+            with open(self.__idsfile, "r") as idsf:
+                lines = [sc.strip() for sc in idsf.read().split("\n")
+                         if sc.strip()]
+            found = [set(), set(), set(), set()]
+            kept = []
+            for line in reversed(lines):
+                scan, mtms, isingested, valid = \
+                    self._ingested_status(line.split(" "))
+                flags = [True, mtms is not None, isingested, valid]
+                keep = False
+                for flag, names in zip(flags, found):
+                    if flag and scan not in names:
+                        names.add(scan)
+                        keep = True
+                if keep:
+                    kept.append(line)
+            self.__compacted_size = len(kept)
+            if len(kept) == len(lines):
+                return
+            tmpfile = "%s.compact.tmp" % self.__idsfile
+            with open(tmpfile, "w") as f:
+                for line in reversed(kept):
+                    f.write("%s\n" % line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpfile, self.__idsfile)
+        get_logger().info(
+            'DatasetIngestor: Compact ingested datasets: %s %s -> %s'
+            % (self.__idsfile, len(lines), len(kept)))
 
     def check_list(self, reingest=False):
         """ update waiting and ingested datasets
         """
-        with open(self.__dsfile, "r") as dsf:
-            scans = [sc.strip()
-                     for sc in dsf.read().split("\n")
-                     if sc.strip()]
-        if os.path.isfile(self.__idsfile):
-            with open(self.__idsfile, "r") as idsf:
-                self.__sc_ingested = [
-                    sc.strip().split(" ")
-                    for sc in idsf.read().split("\n")
-                    if sc.strip()]
-                for sc in self.__sc_ingested:
-                    try:
-                        if len(sc) > 3:
-                            self.__sc_seingested_map[" ".join(sc[:-3])] = \
-                                                     [float(sc[-3]),
-                                                      float(sc[-2]),
-                                                      float(sc[-1])]
-                    except Exception as e:
-                        get_logger().debug("%s" % str(e))
-        if not reingest:
-            if self.__retry_failed_dataset_ingestion:
-                check_attach = self.__retry_failed_attachment_ingestion \
-                    and self.__ingest_attachment
-                ingested = []
-                for sc in self.__sc_ingested:
-                    if len(sc) > 3:
-                        try:
-                            if float(sc[-1]) != -1 \
-                               and (not check_attach or float(sc[-1]) > 0) \
-                               and float(sc[-2]) > 0 and float(sc[-3]) > 0:
-                                ingested.append(" ".join(sc[:-3]))
-                        except Exception as e:
-                            get_logger().debug("%s" % str(e))
-                    else:
-                        ingested.append(sc[0])
-            else:
-                ingested = [(" ".join(sc[:-3]) if len(sc) > 3 else sc[0])
-                            for sc in self.__sc_ingested]
+        if self.__incremental_list_reading:
+            scans, nscans, full = self._read_lists()
+        else:
+            with open(self.__dsfile, "r") as dsf:
+                scans = [sc.strip()
+                         for sc in dsf.read().split("\n")
+                         if sc.strip()]
+            nscans = None
+            full = True
+            if self.__state_store is None and \
+               os.path.isfile(self.__idsfile):
+                with open(self.__idsfile, "r") as idsf:
+                    self.__sc_ingested = [
+                        sc.strip().split(" ")
+                        for sc in idsf.read().split("\n")
+                        if sc.strip()]
+                    nscans = self.__sc_ingested
+        if self.__state_store is not None:
+            self.__state_store.flush()
+            self.__sc_ingested = self.__state_store.records(
+                self.__bid, self.__idsfile)
+            nscans = self.__sc_ingested
+            full = True
+        if full:
+            self.__sc_ingested_keys = set()
+            self.__sc_ingested_names = set()
             self.__sc_ingested_map = {}
-            for sc in self.__sc_ingested:
-                try:
-                    if len(sc) > 3 and float(sc[-1]) >= 0 \
-                       and float(sc[-2]) > 0 and float(sc[-3]) > 0:
-                        sc[-1] = float(sc[-1])
-                        sc[-2] = float(sc[-2])
-                        sc[-3] = float(sc[-3])
-                        self.__sc_ingested_map[" ".join(sc[:-3])] = sc
-                except Exception as e:
-                    get_logger().debug("%s" % str(e))
+        if nscans is None:
+            self._index_ingested(self.__sc_ingested, True)
+        else:
+            self._index_ingested(nscans)
+        if not reingest:
+            ingested = self.__sc_ingested_keys
             self.__sc_waiting = [
                 sc for sc in scans if sc not in ingested]
         else:
             self.__sc_waiting = [sc for sc in scans]
-            self.__sc_ingested_map = {}
-            for sc in self.__sc_ingested:
-                try:
-                    if len(sc) > 3 and float(sc[-1]) >= 0 \
-                       and float(sc[-2]) > 0 and float(sc[-3]) > 0:
-                        sc[-1] = float(sc[-1])
-                        sc[-2] = float(sc[-2])
-                        sc[-3] = float(sc[-3])
-                        self.__sc_ingested_map[" ".join(sc[:-3])] = sc
-                except Exception as e:
-                    get_logger().debug("%s" % str(e))
+        if self.__compaction_ratio is not None and \
+           self.__state_store is None and \
+           len(self.__sc_ingested) - max(
+               len(self.__sc_ingested_names), self.__compacted_size) > \
+           self.__compaction_ratio * len(self.__sc_ingested_names) and \
+           os.path.isfile(self.__idsfile):
+            try:
+                self._compact_ingested_list()
+            except Exception as e:
+                get_logger().warning(str(e))
+
+    def master_file_candidates(self, scan):
+        """ provides possible master files of the scan
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :returns: master file names in the scan directory
+                  and in the scan subdirectory
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        sscan = scan.split(" ")
+        scanname = sscan[0] if sscan else ""
+        if not scanname or scan.startswith("__command__ ") \
+           or ":" in scanname:
+            return []
+        return [os.path.join(self.__path, "%s.%s" % (scanname, ext))
+                for ext in self.__master_file_extension_list] + \
+            [os.path.join(self.__path, scanname, "%s.%s" % (scanname, ext))
+             for ext in self.__master_file_extension_list]
 
     def waiting_datasets(self):
         """ provides waitings datasets
@@ -2385,11 +3043,17 @@ class DatasetIngestor:
         """
         return list(self.__sc_waiting)
 
-    def clear_waiting_datasets(self):
+    def clear_waiting_datasets(self, failed=None):
         """ clear waitings datasets
+
+        :param failed: scans which failed and remain waiting
+        :type failed: :obj:`list` <:obj:`str`>
         """
-        self.__sc_waiting = []
+        self.__sc_waiting = list(failed or [])
         self.__measurements = set()
+        self.flush_metadata()
+        if self.__state_store is not None:
+            self.__state_store.flush()
 
     def clear_tmpfile(self):
         """ clear waitings datasets
@@ -2400,6 +3064,9 @@ class DatasetIngestor:
     def update_from_tmpfile(self):
         """ clear waitings datasets
         """
+        if self.__state_store is not None:
+            self.__state_store.flush()
+            return
         os.rename(self.__idsfiletmp, self.__idsfile)
 
     def ingested_datasets(self):
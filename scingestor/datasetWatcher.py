@@ -23,8 +23,10 @@ import threading
 import queue
 import inotifyx
 
-from .safeINotifier import SafeINotifier
+from .pollingNotifier import get_notifier
 from .datasetIngestor import DatasetIngestor
+from .ingestScheduler import IngestScheduler
+from .timerWheel import TimerWheel
 from .pathConverter import PathConverter
 from .logger import get_logger
 
@@ -112,6 +114,18 @@ class DatasetWatcher(threading.Thread):
                     self.__config["recheck_dataset_list_interval"])
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
+        #: (:obj:`float`) time interval of dataset list rechecks in s
+        self.__recheck_dslist_time = None
+        if "recheck_dataset_list_time" in self.__config.keys():
+            try:
+                self.__recheck_dslist_time = float(
+                    self.__config["recheck_dataset_list_time"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        #: (:class:`threading.Event`) dataset list recheck flag
+        self.__recheck = threading.Event()
+        #: (:obj:`int`) timer id of dataset list rechecks
+        self.__recheck_tid = None
 
         if "get_event_timeout" in self.__config.keys():
             try:
@@ -125,20 +139,87 @@ class DatasetWatcher(threading.Thread):
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
 
+        #: (:obj:`bool`) debounce dataset list changes
+        self.__debounce = False
+        if "debounce_dataset_list_changes" in self.__config.keys():
+            self.__debounce = bool(
+                self.__config["debounce_dataset_list_changes"])
+        #: (:obj:`float`) monotonic time of the delayed ingestion
+        self.__due = None
+        #: (:obj:`float`) quiet time of master files
+        #:   which triggers the debounced ingestion in s
+        self.__quiet_time = None
+        if "ingestion_quiet_time" in self.__config.keys():
+            try:
+                self.__quiet_time = float(
+                    self.__config["ingestion_quiet_time"])
+                self.__debounce = True
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        #: (:obj:`str`) scan directory
+        self.__scandir = path
+        #: (:obj:`int`) scan directory queue id
+        self.__scandir_qid = None
+        #: (:class:`queue.Queue`) scan directory queue
+        self.__scandir_queue = None
+        #: (:obj:`dict` <:obj:`str`, :obj:`float`>)
+        #:    times of files closed after writing within the quiet time
+        self.__closed_files = {}
+
         #: (:class:`scingestor.datasetIngestor.DatasetIngestor`)
         #: dataset ingestor
         self.__ingestor = DatasetIngestor(
             configuration, path, dsfile, idsfile, meta,
             self.__conv.to_core(beamtimefile))
 
+        #: (:class:`scingestor.ingestScheduler.IngestScheduler`)
+        #:    global ingestion scheduler
+        self.__scheduler = None
+        #: (:class:`threading.Lock`) ingestor lock
+        self.__ingestor_lock = threading.Lock()
+        #: (:class:`threading.Event`) scheduled ingestion flag
+        self.__scheduled = threading.Event()
+        #: (:obj:`bool`) dataset list check postponed
+        self.__postponed = False
+
+        #: (:obj:`float`) maximal time to wait for scheduled ingestion
+        #:    when the watcher stops in s
+        self.__stop_timeout = 60.0
+        if "ingestion_stop_timeout" in self.__config.keys():
+            try:
+                self.__stop_timeout = float(
+                    self.__config["ingestion_stop_timeout"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "ingestion_workers_number" in self.__config.keys():
+            scheduler = IngestScheduler()
+            scheduler.register(self)
+            scheduler.configure(self.__config)
+            if scheduler.workers_number > 0:
+                self.__scheduler = scheduler
+            else:
+                scheduler.unregister(self)
+
     def _start_notifier(self, path):
         """ start notifier
 
         :param path: beamtime file sub directory
         :type path: :obj:`str`
         """
-        self.__notifier = SafeINotifier()
+        self.__notifier = get_notifier(self.__config)
         self._add_path(path)
+        if self.__quiet_time is not None:
+            try:
+                self.__scandir_queue, self.__scandir_qid = \
+                    self.__notifier.add_watch(
+                        self.__conv.from_core(self.__scandir),
+                        inotifyx.IN_CLOSE_WRITE)
+                get_logger().debug(
+                    'DatasetWatcher: Adding watch %s: %s' % (
+                        self.__scandir_qid, self.__scandir))
+            except Exception as e:
+                get_logger().warning('%s: %s' % (self.__scandir, str(e)))
 
     def _add_path(self, path):
         """ add path to notifier
@@ -149,13 +230,7 @@ class DatasetWatcher(threading.Thread):
         try:
             wqueue, watch_descriptor = self.__notifier.add_watch(
                 self.__conv.from_core(path),
-                inotifyx.IN_ALL_EVENTS |
-                inotifyx.IN_MODIFY |
-                inotifyx.IN_OPEN |
-                inotifyx.IN_CLOSE_WRITE | inotifyx.IN_DELETE |
-                inotifyx.IN_MOVE_SELF |
-                inotifyx.IN_ALL_EVENTS |
-                inotifyx.IN_MOVED_TO | inotifyx.IN_MOVED_FROM)
+                inotifyx.IN_CLOSE_WRITE)
             self.__wd_to_path[watch_descriptor] = path
             self.__wd_to_queue[watch_descriptor] = wqueue
             get_logger().info('DatasetWatcher: Adding watch %s: %s %s' % (
@@ -173,6 +248,13 @@ class DatasetWatcher(threading.Thread):
             get_logger().info(
                 'ScanDirWatcher: '
                 'Removing watch %s: %s' % (str(wd), path))
+        if self.__scandir_qid is not None:
+            self.__notifier.rm_watch(self.__scandir_qid)
+            get_logger().debug(
+                'DatasetWatcher: Removing watch %s: %s' % (
+                    self.__scandir_qid, self.__scandir))
+            self.__scandir_qid = None
+            self.__scandir_queue = None
 
     def run(self):
         """ scandir watcher thread
@@ -189,38 +271,26 @@ class DatasetWatcher(threading.Thread):
         get_logger().info(
             'DatasetWatcher: Ingested datasets: %s'
             % str(self.__ingestor.ingested_datasets()))
-        if self.__ingestor.waiting_datasets():
+        if self.__debounce:
+            self._debounce_datasets()
+        elif self.__scheduler is not None:
+            self._schedule_datasets()
+        elif self.__ingestor.waiting_datasets():
             time.sleep(self.__delay)
-        if self.__ingestor.waiting_datasets():
+        if not self.__debounce and self.__scheduler is None \
+           and self.__ingestor.waiting_datasets():
             try:
-                token = self.__ingestor.get_token()
-                if token:
-                    for scan in self.__ingestor.waiting_datasets():
-                        sscan = scan.split(" ")
-                        if scan and scan.startswith("__command__ "):
-                            if self.__executecommands and len(sscan) > 1:
-                                cmd = sscan[1]
-                                if cmd == "stop":
-                                    self.__ingestor.stop_measurement()
-                                if cmd == "start":
-                                    if len(sscan) > 2:
-                                        groupname = sscan[2]
-                                    self.__ingestor.start_measurement(
-                                        groupname)
-                        elif len(sscan) > 0 and ":" in sscan[0]:
-                            try:
-                                self.__ingestor.reingest(
-                                    scan, token, notmp=True)
-                            except Exception as e:
-                                get_logger().warning(str(e))
-                                continue
-                        else:
-                            self.__ingestor.ingest(scan, token)
-                    self.__ingestor.clear_waiting_datasets()
+                self._ingest_datasets(self.__ingestor.waiting_datasets())
             except Exception as e:
                 get_logger().warning(str(e))
 
         counter = 0
+        if self.__recheck_dslist_time is not None \
+           and self.__recheck_dslist_time > 0:
+            wheel = TimerWheel()
+            wheel.configure(self.__config)
+            self.__recheck_tid = wheel.add(
+                self.__recheck_dslist_time, self.__recheck.set)
         try:
             while self.running:
 
@@ -240,11 +310,19 @@ class DatasetWatcher(threading.Thread):
                         #                       event.masks,
                         #                       self._w_maid_to_path[qid]))
                         get_logger().debug(
-                            'Ds: %s %s %s' % (event.name,
-                                              event.masks,
-                                              self.__wd_to_path[qid]))
-                        masks = event.masks.split("|")
-                        if "IN_CLOSE_WRITE" in masks:
+                            'Ds: %s %s %s', event.name, event,
+                            self.__wd_to_path[qid])
+                        if event.mask & inotifyx.IN_Q_OVERFLOW:
+                            # events may be lost
+                            get_logger().debug(
+                                'DatasetWatcher: Resync %s' % self.__dsfile)
+                            try:
+                                self._check_list()
+                            except Exception as e:
+                                get_logger().warning(str(e))
+                            if self.__debounce:
+                                self.__due = time.monotonic() + self.__delay
+                        elif event.mask & inotifyx.IN_CLOSE_WRITE:
                             if event.name:
                                 fdir, fname = os.path.split(
                                     self.__wd_to_path[qid])
@@ -254,29 +332,35 @@ class DatasetWatcher(threading.Thread):
                             if ffn is not None and ffn == self.__dsfile:
                                 get_logger().debug(
                                     'DatasetWatcher: Changed %s' % ffn)
+                                if self.__debounce:
+                                    if self.__quiet_time is not None:
+                                        try:
+                                            self._check_list()
+                                        except Exception as e:
+                                            get_logger().warning(str(e))
+                                    self.__due = \
+                                        time.monotonic() + self.__delay
+                                    continue
                                 time.sleep(self.__delay)
                                 try:
-                                    self.__ingestor.check_list()
+                                    self._check_list()
                                 except Exception as e:
                                     get_logger().warning(str(e))
                                     continue
-                        elif "IN_MODIFY" in masks or "IN_OPEN" in masks:
-                            if event.name:
-                                fdir, fname = os.path.split(
-                                    self.__wd_to_path[qid])
-                                ffn = os.path.join(fdir, event.name)
-                                if ffn is not None and \
-                                   ffn == self.__dsfile:
-                                    get_logger().debug(
-                                        'DatasetWatcher: Changed %s' % ffn)
-                                    time.sleep(self.__delay)
-                                    try:
-                                        self.__ingestor.check_list()
-                                    except Exception as e:
-                                        get_logger().warning(str(e))
-                                        continue
-
-                if self.__recheck_dslist_interval > 0:
+
+                if self.__recheck_tid is not None:
+                    if self.__recheck.is_set():
+                        self.__recheck.clear()
+                        get_logger().debug(
+                            'DatasetWatcher: '
+                            'Re-check dataset list after %s s'
+                            % self.__recheck_dslist_time)
+                        try:
+                            self._check_list()
+                        except Exception as e:
+                            get_logger().warning(str(e))
+                            continue
+                elif self.__recheck_dslist_interval > 0:
                     if counter == self.__recheck_dslist_interval:
                         # if inotify does not work
                         counter = 0
@@ -288,7 +372,7 @@ class DatasetWatcher(threading.Thread):
                             'Re-check dataset list after %s s'
                             % self.__recheck_dslist_interval)
                         try:
-                            self.__ingestor.check_list()
+                            self._check_list()
                         except Exception as e:
                             get_logger().warning(str(e))
                             continue
@@ -301,48 +385,232 @@ class DatasetWatcher(threading.Thread):
                         #     (counter, self.__recheck_dslist_interval))
                         counter += 1
 
-                if self.__ingestor.waiting_datasets():
+                if self.__debounce:
+                    self._debounce_datasets()
+                elif self.__scheduler is not None:
+                    self._schedule_datasets()
+                elif self.__ingestor.waiting_datasets():
                     time.sleep(self.__delay)
                     try:
-                        token = self.__ingestor.get_token()
+                        self._ingest_datasets(
+                            self.__ingestor.waiting_datasets())
                     except Exception as e:
                         get_logger().warning(str(e))
                         continue
-                    if token:
-                        for scan in self.__ingestor.waiting_datasets():
-                            sscan = scan.split(" ")
-                            if scan and scan.startswith("__command__ "):
-                                if self.__executecommands and len(sscan) > 1:
-                                    cmd = sscan[1]
-                                    if cmd == "stop":
-                                        self.__ingestor.stop_measurement()
-                                    if cmd == "start":
-                                        if len(sscan) > 2:
-                                            groupname = sscan[2]
-                                        self.__ingestor.start_measurement(
-                                            groupname)
-                            elif len(sscan) > 0 and ":" in sscan[0]:
-                                try:
-                                    self.__ingestor.reingest(
-                                        scan, token, notmp=True)
-                                except Exception as e:
-                                    get_logger().warning(str(e))
-                                    continue
-                            else:
-                                try:
-                                    self.__ingestor.ingest(scan, token)
-                                except Exception as e:
-                                    get_logger().warning(str(e))
-                                    continue
-                        self.__ingestor.clear_waiting_datasets()
                 # else:
                 #     time.sleep(self.__timeout)
         finally:
             self.stop()
+            self.__ingestor.close()
+
+    def _check_list(self):
+        """ updates waiting datasets or postpones it
+        when datasets are scheduled for ingestion
+        """
+        if self.__scheduler is None:
+            self.__ingestor.check_list()
+        elif self.__scheduled.is_set():
+            self.__postponed = True
+        else:
+            with self.__ingestor_lock:
+                self.__ingestor.check_list()
+
+    def _debounce_datasets(self):
+        """ ingests waiting datasets the delay time after the last change
+        of the dataset list
+        """
+        if self.__due is None:
+            if self.__postponed or self.__ingestor.waiting_datasets():
+                self.__due = time.monotonic() + self.__delay
+            return
+        if time.monotonic() < self.__due and not self._quiescent():
+            return
+        self.__due = None
+        try:
+            self._check_list()
+        except Exception as e:
+            get_logger().warning(str(e))
+            return
+        if self.__scheduler is not None:
+            self._schedule_datasets(delay=False)
+        elif self.__ingestor.waiting_datasets():
+            self._ingest_datasets(self.__ingestor.waiting_datasets())
+
+    def _quiescent(self):
+        """ checks if master files of waiting datasets are completed
+
+        A master file is completed when it was closed after writing
+        and not modified afterwards, or it was not modified within
+        the quiet time.
+
+        :returns: True if all master files are completed
+        :rtype: :obj:`bool`
+        """
+        if self.__quiet_time is None:
+            return False
+        now = time.time()
+        try:
+            while self.__scandir_queue is not None:
+                event = self.__scandir_queue.get(block=False)
+                if event.name:
+                    self.__closed_files[
+                        os.path.join(self.__scandir, event.name)] = now
+        except queue.Empty:
+            pass
+        # files closed before the quiet time are found
+        # by their modification time
+        if self.__closed_files:
+            self.__closed_files = dict(
+                (fl, tm) for fl, tm in self.__closed_files.items()
+                if now - tm < self.__quiet_time)
+        scans = self.__ingestor.waiting_datasets()
+        if not scans:
+            return False
+        for scan in scans:
+            files = self.__ingestor.master_file_candidates(scan)
+            if not files or self._closed(files):
+                continue
+            try:
+                mtimes = [os.path.getmtime(fl) for fl in files
+                          if os.path.isfile(fl)]
+                sdir = os.path.dirname(files[-1])
+                if mtimes and os.path.isdir(sdir):
+                    mtimes.append(os.path.getmtime(sdir))
+            except OSError:
+                return False
+            if not mtimes or now - max(mtimes) < self.__quiet_time:
+                return False
+        get_logger().debug('DatasetWatcher: Master files completed')
+        return True
+
+    def _closed(self, files):
+        """ checks if one of the files was closed after its last change
+
+        :param files: file names
+        :type files: :obj:`list` <:obj:`str`>
+        :returns: True if one of the files was closed after writing
+        :rtype: :obj:`bool`
+        """
+        for fl in files:
+            closed = self.__closed_files.get(fl)
+            try:
+                # a scan written again is not completed by an old event
+                if closed is not None and os.path.getmtime(fl) <= closed:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def _schedule_datasets(self, delay=True):
+        """ submits waiting datasets to the ingestion scheduler
+
+        :param delay: submit the delay time after the datasets appear
+        :type delay: :obj:`bool`
+        """
+        if self.__scheduled.is_set():
+            return
+        if self.__postponed:
+            self.__postponed = False
+            try:
+                self._check_list()
+            except Exception as e:
+                get_logger().warning(str(e))
+                return
+        scans = self.__ingestor.waiting_datasets()
+        if not scans:
+            self.__due = None
+            return
+        if delay:
+            if self.__due is None:
+                self.__due = time.monotonic() + self.__delay
+            if time.monotonic() < self.__due:
+                return
+            self.__due = None
+        ingested = set(
+            (" ".join(sc[:-3]) if len(sc) > 3 else sc[0])
+            for sc in self.__ingestor.ingested_datasets())
+        lane = IngestScheduler.REINGEST
+        for scan in scans:
+            sscan = scan.split(" ")
+            if not scan.startswith("__command__ ") and \
+               ":" not in sscan[0] and scan not in ingested:
+                lane = IngestScheduler.FRESH
+                break
+        self.__scheduled.set()
+        if not self.__scheduler.submit(
+                self, lambda: self._run_scheduled(scans),
+                lane, self.__timeout):
+            self.__scheduled.clear()
+
+    def _run_scheduled(self, scans):
+        """ ingests datasets in a scheduler worker
+
+        :param scans: scan names
+        :type scans: :obj:`list` <:obj:`str`>
+        """
+        try:
+            with self.__ingestor_lock:
+                self._ingest_datasets(scans)
+        finally:
+            self.__scheduled.clear()
+
+    def _ingest_datasets(self, scans):
+        """ ingests datasets and executes measurement commands
+
+        :param scans: scan names
+        :type scans: :obj:`list` <:obj:`str`>
+        """
+        try:
+            token = self.__ingestor.get_token()
+        except Exception as e:
+            get_logger().warning(str(e))
+            return
+        if token:
+            failed = []
+            for scan in scans:
+                sscan = scan.split(" ")
+                if scan and scan.startswith("__command__ "):
+                    if self.__executecommands and len(sscan) > 1:
+                        cmd = sscan[1]
+                        if cmd == "stop":
+                            self.__ingestor.stop_measurement()
+                        if cmd == "start":
+                            if len(sscan) > 2:
+                                groupname = sscan[2]
+                            self.__ingestor.start_measurement(
+                                groupname)
+                elif len(sscan) > 0 and ":" in sscan[0]:
+                    try:
+                        self.__ingestor.reingest(
+                            scan, token, notmp=True)
+                    except Exception as e:
+                        get_logger().warning(str(e))
+                        continue
+                else:
+                    try:
+                        self.__ingestor.ingest(scan, token)
+                    except Exception as e:
+                        get_logger().warning(
+                            'DatasetWatcher: Ingestion of %s failed: %s'
+                            % (scan, str(e)))
+                        failed.append(scan)
+            # failed scans are retried in the next pass
+            self.__ingestor.clear_waiting_datasets(failed)
 
     def stop(self):
         """ stop the watcher
         """
         self.running = False
+        if self.__recheck_tid is not None:
+            TimerWheel().cancel(self.__recheck_tid)
+            self.__recheck_tid = None
         time.sleep(0.2)
+        if self.__scheduler is not None:
+            if self.__scheduler.cancel(self):
+                self.__scheduled.clear()
+            if not self.__scheduler.wait(self, self.__stop_timeout):
+                get_logger().warning(
+                    'DatasetWatcher: Ingestion of %s not finished '
+                    'after %s s' % (self.__dsfile, self.__stop_timeout))
+            self.__scheduler.unregister(self)
         self._stop_notifier()
@@ -0,0 +1,147 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import shutil
+
+try:
+    import fcntl
+    #: (:obj:`bool`) fcntl module available
+    FCNTL = True
+except ImportError:
+    FCNTL = False
+
+from .logger import get_logger
+
+
+#: (:obj:`int`) FICLONE ioctl request of Linux, i.e. _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+#: (:obj:`list` <:obj:`str`>) staging methods in the order of preference
+STAGING_METHODS = ["hardlink", "reflink", "symlink", "copy"]
+
+
+def hardlink(source, target):
+    """ links the source file on the same file system
+
+    :param source: source file name
+    :type source: :obj:`str`
+    :param target: target file name
+    :type target: :obj:`str`
+    """
+    os.link(source, target)
+
+
+def reflink(source, target):
+    """ clones the source file blocks on a copy-on-write file system
+
+    :param source: source file name
+    :type source: :obj:`str`
+    :param target: target file name
+    :type target: :obj:`str`
+    """
+    if not FCNTL:
+        raise OSError("reflink is not supported")
+    with open(source, "rb") as sfl, open(target, "xb") as tfl:
+        try:
+            fcntl.ioctl(tfl.fileno(), FICLONE, sfl.fileno())
+        except OSError:
+            os.remove(target)
+            raise
+
+
+def symlink(source, target):
+    """ links the source file by its absolute path
+
+    :param source: source file name
+    :type source: :obj:`str`
+    :param target: target file name
+    :type target: :obj:`str`
+    """
+    os.symlink(os.path.abspath(source), target)
+
+
+def copy(source, target):
+    """ copies the source file, in the kernel if possible
+
+    :param source: source file name
+    :type source: :obj:`str`
+    :param target: target file name
+    :type target: :obj:`str`
+    """
+    with open(source, "rb") as sfl, open(target, "xb") as tfl:
+        size = os.fstat(sfl.fileno()).st_size
+        offset = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                while offset < size:
+                    sent = os.copy_file_range(
+                        sfl.fileno(), tfl.fileno(), size - offset,
+                        offset, offset)
+                    if not sent:
+                        break
+                    offset += sent
+            except OSError as e:
+                get_logger().debug(
+                    'copy_file_range %s: %s' % (source, str(e)))
+                offset = 0
+        if offset < size:
+            sfl.seek(0)
+            tfl.seek(0)
+            tfl.truncate()
+            shutil.copyfileobj(sfl, tfl)
+    shutil.copymode(source, target)
+
+
+def stage_file(source, target, methods=None):
+    """ provides the source file under the target name without copying
+    its data if possible, i.e. by a hardlink, a reflink or a symlink
+
+    :param source: source file name
+    :type source: :obj:`str`
+    :param target: target file name
+    :type target: :obj:`str`
+    :param methods: staging methods in the order of preference
+    :type methods: :obj:`list` <:obj:`str`>
+    :returns: used staging method
+    :rtype: :obj:`str`
+    """
+    functions = {
+        "hardlink": hardlink,
+        "reflink": reflink,
+        "symlink": symlink,
+        "copy": copy,
+    }
+    methods = methods or STAGING_METHODS
+    error = None
+    for method in methods:
+        if method not in functions:
+            get_logger().warning('Unknown staging method: %s' % method)
+            continue
+        try:
+            functions[method](source, target)
+            get_logger().debug(
+                'Staging %s as %s: %s' % (source, target, method))
+            return method
+        except OSError as e:
+            error = e
+            get_logger().debug(
+                'Staging %s as %s: %s failed: %s'
+                % (source, target, method, str(e)))
+    raise error or OSError("No staging method for %s" % source)
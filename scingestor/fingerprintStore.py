@@ -0,0 +1,267 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import json
+import threading
+
+from .logger import get_logger
+
+
+class FingerprintStore:
+    """ directory fingerprints of scans with ingested origdatablocks
+
+    A fingerprint consists of the number, the total size and
+    the maximal modification time of scan files in the scan directory
+    and of the modification time chain of scan subdirectories.
+    Files added, removed or renamed in scan subdirectories change
+    the modification times of their directories. The fingerprints
+    are appended to a JSON lines file, the last line of a scan is valid.
+    The file is rewritten with one line per scan when its superseded
+    lines exceed the compaction ratio of the scans.
+    """
+
+    def __init__(self, filename, compaction_ratio=1.0):
+        """ constructor
+
+        :param filename: fingerprint file name
+        :type filename: :obj:`str`
+        :param compaction_ratio: ratio of superseded lines to scans
+                                 which triggers the file compaction
+        :type compaction_ratio: :obj:`float`
+        """
+        #: (:obj:`str`) fingerprint file name
+        self.filename = filename
+        #: (:obj:`float`) ratio of superseded lines to scans
+        #:    which triggers the file compaction
+        self.compaction_ratio = compaction_ratio
+
+        #: (:class:`threading.Lock`) fingerprint lock
+        self.__lock = threading.Lock()
+        #: (:obj:`dict` <:obj:`str`, :obj:`dict` <:obj:`str`, `any`>>)
+        #:    fingerprints of scans
+        self.__fingerprints = None
+        #: (:obj:`int`) number of lines in the fingerprint file
+        self.__lines = 0
+        #: (:obj:`dict` <:obj:`str`, (:obj:`int`, :obj:`list`)>)
+        #:    scan directory listings with their modification times
+        self.__listings = {}
+
+    def get(self, scan):
+        """ provides the stored fingerprint of the scan
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :returns: fingerprint or None
+        :rtype: :obj:`dict` <:obj:`str`, `any`>
+        """
+        with self.__lock:
+            if self.__fingerprints is None:
+                self.__fingerprints = self._read()
+            return self.__fingerprints.get(scan)
+
+    def update(self, scan, fingerprint):
+        """ stores the fingerprint of the scan
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param fingerprint: scan fingerprint
+        :type fingerprint: :obj:`dict` <:obj:`str`, `any`>
+        """
+        with self.__lock:
+            if self.__fingerprints is None:
+                self.__fingerprints = self._read()
+            if self.__fingerprints.get(scan) == fingerprint:
+                return
+            self.__fingerprints[scan] = fingerprint
+            with open(self.filename, "a+") as fl:
+                fl.write(json.dumps(
+                    {"scan": scan, "fingerprint": fingerprint}))
+                fl.write("\n")
+            self.__lines += 1
+            if self.__lines - len(self.__fingerprints) > \
+               self.compaction_ratio * len(self.__fingerprints):
+                try:
+                    self._compact()
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+
+    def _compact(self):
+        """ rewrites the fingerprint file with the last line of each scan
+        """
+        tmpfile = "%s.compact.tmp" % self.filename
+        with open(tmpfile, "w") as fl:
+            for scan, fingerprint in self.__fingerprints.items():
+                fl.write(json.dumps(
+                    {"scan": scan, "fingerprint": fingerprint}))
+                fl.write("\n")
+            fl.flush()
+            os.fsync(fl.fileno())
+        os.replace(tmpfile, self.filename)
+        get_logger().debug(
+            'FingerprintStore: Compact %s: %s -> %s' % (
+                self.filename, self.__lines, len(self.__fingerprints)))
+        self.__lines = len(self.__fingerprints)
+
+    def fingerprint(self, paths):
+        """ computes a fingerprint of scan files and directories
+
+        :param paths: scan paths, i.e. scan directory with scan name
+        :type paths: :obj:`list` <:obj:`str`>
+        :returns: scan fingerprint
+        :rtype: :obj:`dict` <:obj:`str`, `any`>
+        """
+        fingerprint = self._top(paths)
+        subdirs = []
+        stack = [path for path, _ in reversed(fingerprint["dirs"])]
+        while stack:
+            dirpath = stack.pop()
+            children = []
+            try:
+                with os.scandir(dirpath) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir() and not entry.is_symlink():
+                                children.append(entry.path)
+                        except OSError:
+                            pass
+            except OSError as e:
+                get_logger().debug('FingerprintStore: %s' % str(e))
+                continue
+            for child in children:
+                try:
+                    subdirs.append([child, os.stat(child).st_mtime_ns])
+                except OSError:
+                    continue
+            stack.extend(reversed(children))
+        fingerprint["subdirs"] = subdirs
+        return fingerprint
+
+    def unchanged(self, scan, paths):
+        """ checks if scan files and directories are unchanged
+        since the fingerprint of the scan has been stored
+
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param paths: scan paths, i.e. scan directory with scan name
+        :type paths: :obj:`list` <:obj:`str`>
+        :returns: unchanged flag
+        :rtype: :obj:`bool`
+        """
+        fingerprint = self.get(scan)
+        if not fingerprint:
+            return False
+        top = self._top(paths)
+        for key in ["count", "size", "mtime", "dirs"]:
+            if fingerprint.get(key) != top[key]:
+                return False
+        # stats of subdirectories are enough as they have the same parents
+        for dirpath, mtime_ns in fingerprint.get("subdirs", []):
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _top(self, paths):
+        """ computes the fingerprint of scan files and directories
+        in scan directories
+
+        :param paths: scan paths, i.e. scan directory with scan name
+        :type paths: :obj:`list` <:obj:`str`>
+        :returns: scan fingerprint without subdirectories
+        :rtype: :obj:`dict` <:obj:`str`, `any`>
+        """
+        count = 0
+        size = 0
+        mtime = 0
+        dirs = []
+        for path in paths:
+            scandir, scanname = os.path.split(os.path.abspath(path))
+            for name, isdir in self._listing(scandir):
+                if not name.startswith(scanname):
+                    continue
+                fpath = os.path.join(scandir, name)
+                try:
+                    status = os.stat(fpath)
+                except OSError:
+                    continue
+                if isdir:
+                    dirs.append([fpath, status.st_mtime_ns])
+                else:
+                    count += 1
+                    size += status.st_size
+                    mtime = max(mtime, status.st_mtime_ns)
+        return {"count": count, "size": size, "mtime": mtime, "dirs": dirs}
+
+    def _listing(self, scandir):
+        """ lists the scan directory if its modification time changed
+
+        :param scandir: scan directory
+        :type scandir: :obj:`str`
+        :returns: entry names with directory flags
+        :rtype: :obj:`list` <(:obj:`str`, :obj:`bool`)>
+        """
+        try:
+            mtime_ns = os.stat(scandir).st_mtime_ns
+            with self.__lock:
+                if scandir in self.__listings and \
+                   self.__listings[scandir][0] == mtime_ns:
+                    return self.__listings[scandir][1]
+            listing = []
+            with os.scandir(scandir) as it:
+                for entry in it:
+                    try:
+                        isdir = entry.is_dir()
+                    except OSError:
+                        isdir = False
+                    listing.append((entry.name, isdir))
+        except OSError as e:
+            get_logger().debug('FingerprintStore: %s' % str(e))
+            return []
+        with self.__lock:
+            self.__listings[scandir] = (mtime_ns, listing)
+        return listing
+
+    def _read(self):
+        """ reads fingerprints from the file
+
+        :returns: fingerprints of scans
+        :rtype: :obj:`dict` <:obj:`str`, :obj:`dict` <:obj:`str`, `any`>>
+        """
+        fingerprints = {}
+        self.__lines = 0
+        if not os.path.isfile(self.filename):
+            return fingerprints
+        try:
+            with open(self.filename) as fl:
+                for line in fl:
+                    if not line.strip():
+                        continue
+                    self.__lines += 1
+                    try:
+                        record = json.loads(line)
+                        fingerprints[record["scan"]] = record["fingerprint"]
+                    except Exception as e:
+                        get_logger().debug(
+                            'FingerprintStore: %s' % str(e))
+        except Exception as e:
+            get_logger().warning('%s' % (str(e)))
+        return fingerprints
@@ -0,0 +1,160 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from .logger import get_logger
+
+
+class GeneratorCache:
+    """ size bounded cache of generated metadata documents
+    in a SQLite database
+
+    A document is addressed by its generator command template,
+    the formatted command and the inode, size and modification time
+    of its input files. The least recently used documents are removed
+    when the cache exceeds its size.
+    """
+
+    #: (:obj:`str`) database schema
+    schema = (
+        "CREATE TABLE IF NOT EXISTS documents ("
+        "key TEXT PRIMARY KEY, "
+        "document TEXT, "
+        "size INTEGER, "
+        "atime INTEGER)"
+    )
+
+    def __init__(self, filename, maxsize, timeout=30.0):
+        """ constructor
+
+        :param filename: database file name
+        :type filename: :obj:`str`
+        :param maxsize: maximal size of cached documents in bytes
+        :type maxsize: :obj:`int`
+        :param timeout: timeout for a locked database in s
+        :type timeout: :obj:`float`
+        """
+        #: (:obj:`str`) database file name
+        self.filename = filename
+        #: (:obj:`int`) maximal size of cached documents in bytes
+        self.maxsize = maxsize
+
+        #: (:class:`threading.Lock`) connection lock
+        self.__lock = threading.Lock()
+
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        #: (:class:`sqlite3.Connection`) database connection
+        self.__db = sqlite3.connect(
+            self.filename, timeout=timeout, check_same_thread=False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute(self.schema)
+        self.__db.commit()
+
+    @classmethod
+    def key(cls, template, command, files):
+        """ provides a key of the generator result
+
+        :param template: generator command template
+        :type template: :obj:`str`
+        :param command: formatted generator command
+        :type command: :obj:`str`
+        :param files: input file names
+        :type files: :obj:`list` <:obj:`str`>
+        :returns: result key
+        :rtype: :obj:`str`
+        """
+        stats = []
+        for fname in files:
+            try:
+                status = os.stat(fname)
+                stats.append([fname, status.st_ino, status.st_size,
+                              status.st_mtime_ns])
+            except OSError:
+                stats.append([fname, None])
+        return hashlib.sha256(
+            json.dumps([template, command, stats]).encode()).hexdigest()
+
+    def get(self, key):
+        """ provides the cached document and marks it as recently used
+
+        :param key: result key
+        :type key: :obj:`str`
+        :returns: json document or None
+        :rtype: :obj:`str`
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT document FROM documents WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self.__db.execute(
+                "UPDATE documents SET atime = ? WHERE key = ?",
+                (time.time_ns(), key))
+            self.__db.commit()
+        return row[0]
+
+    def put(self, key, document):
+        """ stores the document and removes the least recently used
+        documents which exceed the cache size
+
+        :param key: result key
+        :type key: :obj:`str`
+        :param document: json document
+        :type document: :obj:`str`
+        """
+        size = len(document.encode())
+        if size > self.maxsize:
+            return
+        with self.__lock:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(key, document, size, atime) VALUES (?, ?, ?, ?)",
+                (key, document, size, time.time_ns()))
+            total = self.__db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+            if total > self.maxsize:
+                removed = []
+                for rkey, rsize in self.__db.execute(
+                        "SELECT key, size FROM documents "
+                        "WHERE key != ? ORDER BY atime", (key,)).fetchall():
+                    if total <= self.maxsize:
+                        break
+                    removed.append((rkey,))
+                    total -= rsize
+                self.__db.executemany(
+                    "DELETE FROM documents WHERE key = ?", removed)
+                get_logger().debug(
+                    'GeneratorCache: %s documents removed' % len(removed))
+            self.__db.commit()
+
+    def close(self):
+        """ closes the database
+        """
+        with self.__lock:
+            self.__db.close()
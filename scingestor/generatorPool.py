@@ -0,0 +1,314 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import sys
+import json
+import select
+import threading
+import subprocess
+
+from .nxsGenerator import NXSGenerator
+from .logger import get_logger, init_logger
+
+
+def run_worker(rfile, wfile):
+    """ generator worker loop
+
+    The worker reads one JSON request per line, i.e. {"command": ...},
+    and writes one JSON response per line, i.e. {"status": ...,
+    "output": ...}, where status is 0 or the exit status of the command
+    and output its standard output or the error message.
+    The worker ends at the end of its input.
+
+    :param rfile: request input
+    :type rfile: :class:`io.TextIOBase`
+    :param wfile: response output
+    :type wfile: :class:`io.TextIOBase`
+    """
+    generator = NXSGenerator()
+    for line in rfile:
+        if not line.strip():
+            continue
+        command = ""
+        try:
+            command = json.loads(line)["command"]
+            args = generator.arguments(command)
+            if args is not None:
+                status, output = 0, generator.run(command, args)
+            else:
+                result = subprocess.run(
+                    command, shell=True, text=True, capture_output=True)
+                status = result.returncode
+                output = str(result.stdout if not status else result.stderr)
+        except subprocess.CalledProcessError as e:
+            status, output = e.returncode or 255, str(e)
+        except Exception as e:
+            status, output = 255, str(e)
+        wfile.write(json.dumps({"status": status, "output": output}))
+        wfile.write("\n")
+        wfile.flush()
+
+
+def main():
+    """ generator worker process
+    """
+    init_logger("SciCatGeneratorWorker", "error")
+    # generators may print to the standard output
+    wfile = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    run_worker(sys.stdin, wfile)
+
+
+class GeneratorWorker:
+    """ long-lived generator process """
+
+    def __init__(self):
+        """ constructor
+
+        """
+        env = dict(os.environ)
+        # the worker uses the same scingestor package
+        path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(
+            [path] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+        #: (:class:`subprocess.Popen`) worker process
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "scingestor.generatorPool"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            env=env)
+        #: (:obj:`int`) number of done jobs
+        self.jobs = 0
+
+    def request(self, command, timeout=None):
+        """ sends the command to the worker and waits for the response
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :param timeout: timeout in s
+        :type timeout: :obj:`float`
+        :returns: exit status and output of the command
+                  or None after the timeout
+        :rtype: (:obj:`int`, :obj:`str`)
+        :raises: :exc:`EOFError` if the worker exited
+        """
+        try:
+            self.process.stdin.write(json.dumps({"command": command}))
+            self.process.stdin.write("\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise EOFError("worker input closed")
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            return None
+        line = self.process.stdout.readline()
+        if not line:
+            raise EOFError("worker output closed")
+        response = json.loads(line)
+        return response["status"], response["output"]
+
+    def close(self, kill=False):
+        """ stops the worker process
+
+        :param kill: kill the process without waiting
+        :type kill: :obj:`bool`
+        """
+        try:
+            if not kill:
+                self.process.stdin.close()
+                self.process.wait(1)
+        except Exception as e:
+            get_logger().debug('GeneratorWorker: %s' % str(e))
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for stream in [self.process.stdin, self.process.stdout]:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class GeneratorPool:
+    """ singleton pool of generator worker processes
+
+    The workers import nxstools once and run generator commands
+    received over a pipe. nxsfileinfo commands are run in the worker
+    process, other commands in its shell. A worker is replaced after
+    a given number of jobs, after a timeout or when it crashes.
+    """
+
+    #: (:class:`GeneratorPool`) singleton pool instance
+    _pool = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._pool or not cls._pool.running:
+                cls._pool = super(GeneratorPool, cls).__new__(cls)
+                cls._pool.init()
+        return cls._pool
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:obj:`bool`) running flag
+        self.running = True
+        #: (:obj:`int`) maximal number of worker processes
+        self.pool_size = 0
+        #: (:obj:`float`) job timeout in s
+        self.job_timeout = None
+        #: (:obj:`int`) number of jobs after which a worker is replaced
+        self.max_jobs = 100
+
+        #: (:class:`threading.Condition`) pool condition
+        self.__condition = threading.Condition()
+        #: (:obj:`list` <:class:`GeneratorWorker`>) idle workers
+        self.__idle = []
+        #: (:obj:`int`) number of started workers
+        self.__started = 0
+
+    def configure(self, configuration):
+        """ sets pool size, job timeout and worker job number
+        from the configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        with self.__condition:
+            if "generator_pool_size" in config.keys():
+                try:
+                    self.pool_size = max(
+                        int(config["generator_pool_size"]), 0)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            if "generator_job_timeout" in config.keys():
+                try:
+                    self.job_timeout = float(config["generator_job_timeout"])
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            if "generator_worker_max_jobs" in config.keys():
+                try:
+                    self.max_jobs = max(
+                        int(config["generator_worker_max_jobs"]), 1)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            # workers are started in advance
+            while self.running and self.__started < self.pool_size:
+                self.__idle.append(GeneratorWorker())
+                self.__started += 1
+            self.__condition.notify_all()
+
+    def run(self, command):
+        """ runs the generator command on a worker
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: standard output of the command
+        :rtype: :obj:`str`
+        """
+        worker = self._acquire()
+        kill = True
+        try:
+            try:
+                response = worker.request(command, self.job_timeout)
+            except EOFError:
+                try:
+                    worker.process.wait(1)
+                except subprocess.TimeoutExpired:
+                    pass
+                get_logger().warning(
+                    'GeneratorPool: Worker %s exited with %s'
+                    % (worker.process.pid, worker.process.returncode))
+                raise subprocess.CalledProcessError(
+                    worker.process.returncode or 255, command)
+            if response is None:
+                get_logger().warning(
+                    'GeneratorPool: Timeout %s s of %s'
+                    % (self.job_timeout, command))
+                raise subprocess.TimeoutExpired(command, self.job_timeout)
+            status, output = response
+            kill = False
+            worker.jobs += 1
+            if status:
+                raise subprocess.CalledProcessError(
+                    status, command, stderr=output)
+            return output
+        finally:
+            self._release(worker, kill)
+
+    def _acquire(self):
+        """ takes an idle worker or starts a new one
+
+        :returns: generator worker
+        :rtype: :class:`GeneratorWorker`
+        """
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.__idle
+                or self.__started < max(self.pool_size, 1))
+            if self.__idle:
+                return self.__idle.pop()
+            self.__started += 1
+        try:
+            return GeneratorWorker()
+        except Exception:
+            with self.__condition:
+                self.__started -= 1
+                self.__condition.notify()
+            raise
+
+    def _release(self, worker, kill=False):
+        """ returns the worker to the pool or stops it
+
+        :param worker: generator worker
+        :type worker: :class:`GeneratorWorker`
+        :param kill: kill the worker
+        :type kill: :obj:`bool`
+        """
+        if kill or worker.jobs >= self.max_jobs or not self.running \
+           or worker.process.poll() is not None:
+            worker.close(kill)
+            with self.__condition:
+                self.__started -= 1
+                self.__condition.notify()
+        else:
+            with self.__condition:
+                self.__idle.append(worker)
+                self.__condition.notify()
+
+    def stop(self):
+        """ stops all idle workers
+        """
+        with self.__condition:
+            self.running = False
+            idle, self.__idle = self.__idle, []
+            self.__started -= len(idle)
+            self.__condition.notify_all()
+        for worker in idle:
+            worker.close()
+
+
+if __name__ == "__main__":
+    main()
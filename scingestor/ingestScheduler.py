@@ -0,0 +1,278 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import time
+import heapq
+import threading
+import collections
+
+from .logger import get_logger
+
+
+class IngestScheduler:
+    """ singleton bounded work queue executing ingestion jobs
+
+    Jobs submitted with the same key are executed one after another
+    in the submission order. Jobs of different keys run in parallel
+    on the worker threads. A key waiting in the fresh lane is
+    started before keys waiting in the reingest lane. The workers
+    stop when the last registered user unregisters.
+    """
+
+    #: (:obj:`int`) lane of jobs ingesting new scans
+    FRESH = 0
+    #: (:obj:`int`) lane of jobs re-ingesting or retrying scans
+    REINGEST = 1
+
+    #: (:class:`IngestScheduler`) singleton scheduler instance
+    _scheduler = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._scheduler or not cls._scheduler.running:
+                cls._scheduler = super(IngestScheduler, cls).__new__(cls)
+                cls._scheduler.init()
+        return cls._scheduler
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:obj:`bool`) running flag
+        self.running = True
+        #: (:obj:`int`) number of worker threads
+        self.workers_number = 0
+        #: (:obj:`int`) maximal number of queued jobs
+        self.queue_size = 1000
+
+        #: (:class:`threading.Condition`) queue condition
+        self.__condition = threading.Condition()
+        #: (:obj:`int`) job counter
+        self.__counter = 0
+        #: (:obj:`int`) number of queued jobs
+        self.__queued = 0
+        #: (:obj:`dict` <`any`, :class:`collections.deque`>)
+        #:    queued jobs of keys, i.e. (lane, seq, function)
+        self.__jobs = {}
+        #: (:obj:`list` < (:obj:`int`, :obj:`int`, `any`) >)
+        #:    heap of keys ready to run, i.e. (lane, seq, key)
+        self.__ready = []
+        #: (:obj:`set` <`any`>) keys with a running job
+        self.__busy = set()
+        #: (:obj:`list` <:class:`threading.Thread`>) worker threads
+        self.__workers = []
+        #: (:obj:`set` <`any`>) registered users, e.g. dataset watchers
+        self.__users = set()
+
+    def configure(self, configuration):
+        """ sets worker number and queue size from the configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        with self.__condition:
+            if "ingestion_workers_number" in config.keys():
+                try:
+                    self.workers_number = max(
+                        int(config["ingestion_workers_number"]), 0)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            if "ingestion_queue_size" in config.keys():
+                try:
+                    self.queue_size = max(
+                        int(config["ingestion_queue_size"]), 1)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            self.__workers = [th for th in self.__workers if th.is_alive()]
+            while len(self.__workers) < self.workers_number:
+                worker = threading.Thread(target=self._run, daemon=True)
+                self.__workers.append(worker)
+                worker.start()
+            self.__condition.notify_all()
+
+    def register(self, user):
+        """ registers a user of the scheduler
+
+        :param user: scheduler user, e.g. a dataset watcher
+        :type user: `any`
+        """
+        with self.__condition:
+            self.__users.add(user)
+
+    def unregister(self, user):
+        """ unregisters a user and stops the workers
+        if it was the last one
+
+        :param user: scheduler user, e.g. a dataset watcher
+        :type user: `any`
+        """
+        with self.__condition:
+            self.__users.discard(user)
+            last = not self.__users
+        if last:
+            self.stop()
+
+    def submit(self, key, function, lane=None, timeout=None):
+        """ submits a job, blocks when the queue is full
+
+        :param key: job key, e.g. an ingestor
+        :type key: `any`
+        :param function: job function without arguments
+        :type function: :obj:`instancemethod`
+        :param lane: job lane, i.e. FRESH or REINGEST
+        :type lane: :obj:`int`
+        :param timeout: maximal time in s to wait for a free queue slot
+        :type timeout: :obj:`float`
+        :returns: True if the job was queued
+        :rtype: :obj:`bool`
+        """
+        lane = self.FRESH if lane is None else lane
+        with self.__condition:
+            if not self.__condition.wait_for(
+                    lambda: self.__queued < self.queue_size
+                    or not self.running,
+                    timeout):
+                return False
+            if not self.running:
+                return False
+            self.__counter += 1
+            if key not in self.__jobs:
+                self.__jobs[key] = collections.deque()
+            self.__jobs[key].append((lane, self.__counter, function))
+            self.__queued += 1
+            if key not in self.__busy and len(self.__jobs[key]) == 1:
+                heapq.heappush(self.__ready, (lane, self.__counter, key))
+            self.__condition.notify_all()
+        return True
+
+    def cancel(self, key):
+        """ removes queued jobs of the key
+
+        :param key: job key
+        :type key: `any`
+        :returns: number of removed jobs
+        :rtype: :obj:`int`
+        """
+        with self.__condition:
+            jobs = self.__jobs.pop(key, None) or []
+            self.__queued -= len(jobs)
+            if jobs and key not in self.__busy:
+                self.__ready = [rd for rd in self.__ready if rd[2] != key]
+                heapq.heapify(self.__ready)
+            self.__condition.notify_all()
+            return len(jobs)
+
+    def pending(self, key):
+        """ provides number of queued or running jobs of the key
+
+        :param key: job key
+        :type key: `any`
+        :returns: number of jobs
+        :rtype: :obj:`int`
+        """
+        with self.__condition:
+            return len(self.__jobs.get(key) or []) + \
+                (1 if key in self.__busy else 0)
+
+    def wait(self, key, timeout=None):
+        """ waits until all jobs of the key are finished
+
+        :param key: job key
+        :type key: `any`
+        :param timeout: timeout in s
+        :type timeout: :obj:`float`
+        :returns: True if there are no jobs of the key
+        :rtype: :obj:`bool`
+        """
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: key not in self.__busy and not self.__jobs.get(key),
+                timeout)
+
+    def _next(self):
+        """ takes the next job
+
+        :returns: key and job function or None if the worker should stop
+        :rtype: (`any`, :obj:`instancemethod`)
+        """
+        with self.__condition:
+            while self.running and not self.__ready:
+                if len(self.__workers) > self.workers_number:
+                    self.__workers.remove(threading.current_thread())
+                    return None
+                self.__condition.wait()
+            if not self.running:
+                return None
+            _, _, key = heapq.heappop(self.__ready)
+            _, _, function = self.__jobs[key].popleft()
+            self.__queued -= 1
+            self.__busy.add(key)
+            self.__condition.notify_all()
+            return key, function
+
+    def _done(self, key):
+        """ marks the job of the key as finished
+
+        :param key: job key
+        :type key: `any`
+        """
+        with self.__condition:
+            self.__busy.discard(key)
+            jobs = self.__jobs.get(key)
+            if jobs:
+                lane, seq, _ = jobs[0]
+                heapq.heappush(self.__ready, (lane, seq, key))
+            elif key in self.__jobs:
+                self.__jobs.pop(key)
+            self.__condition.notify_all()
+
+    def _run(self):
+        """ worker thread
+        """
+        while True:
+            job = self._next()
+            if job is None:
+                break
+            key, function = job
+            start = time.time()
+            try:
+                function()
+            except Exception as e:
+                get_logger().warning('IngestScheduler: %s' % str(e))
+            finally:
+                self._done(key)
+            get_logger().debug(
+                'IngestScheduler: job of %s done in %s s'
+                % (key, time.time() - start))
+
+    def stop(self):
+        """ stops the workers and removes queued jobs
+        """
+        with self.__condition:
+            self.running = False
+            for jobs in self.__jobs.values():
+                jobs.clear()
+            self.__queued = 0
+            self.__ready = []
+            self.__condition.notify_all()
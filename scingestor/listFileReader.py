@@ -0,0 +1,106 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+
+
+class ListFileReader:
+    """ incremental reader of an append-only list file
+
+    Only lines appended since the previous read are parsed.
+    The whole file is parsed again when it was truncated,
+    rewritten or replaced by a file with another inode.
+    """
+
+    #: (:obj:`int`) size of the file fragment checked before the offset
+    guard_size = 64
+
+    def __init__(self, filename):
+        """ constructor
+
+        :param filename: list file name
+        :type filename: :obj:`str`
+        """
+        #: (:obj:`str`) list file name
+        self.filename = filename
+        #: (:obj:`list` <:obj:`str`>) complete non-empty lines
+        self.lines = []
+        #: (:obj:`str`) last line without the end of line character
+        self.tail = ""
+        #: (:obj:`int`) number of complete lines parsed by the last read
+        self.appended = 0
+
+        #: ((:obj:`int`, :obj:`int`)) device and inode of the file
+        self.__inode = None
+        #: (:obj:`int`) byte offset of the first unread line
+        self.__offset = 0
+        #: (:obj:`bytes`) file fragment before the offset
+        self.__guard = b""
+
+    def reset(self):
+        """ forgets the read lines
+        """
+        self.lines = []
+        self.tail = ""
+        self.appended = 0
+        self.__inode = None
+        self.__offset = 0
+        self.__guard = b""
+
+    def all_lines(self):
+        """ provides complete lines and the last unfinished line
+
+        :returns: non-empty stripped lines
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        if self.tail:
+            return self.lines + [self.tail]
+        return list(self.lines)
+
+    def read(self):
+        """ reads lines appended to the file
+
+        :returns: True if the whole file was parsed again
+        :rtype: :obj:`bool`
+        """
+        with open(self.filename, "rb") as fl:
+            st = os.fstat(fl.fileno())
+            inode = (st.st_dev, st.st_ino)
+            full = inode != self.__inode or st.st_size < self.__offset
+            if not full and self.__guard:
+                fl.seek(self.__offset - len(self.__guard))
+                full = fl.read(len(self.__guard)) != self.__guard
+            if full:
+                self.reset()
+                self.__inode = inode
+            fl.seek(self.__offset)
+            data = fl.read()
+        end = data.rfind(b"\n") + 1
+        lines = [ln.strip() for ln in data[:end].decode().split("\n")]
+        lines = [ln for ln in lines if ln]
+        self.lines.extend(lines)
+        self.appended = len(lines)
+        self.tail = data[end:].decode(errors="replace").strip()
+        if end:
+            self.__offset += end
+            guard = data[max(0, end - self.guard_size):end]
+            if len(guard) < self.guard_size:
+                guard = (self.__guard + guard)[-self.guard_size:]
+            self.__guard = guard
+        return full
@@ -0,0 +1,207 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import stat
+import time
+import threading
+import concurrent.futures
+
+from .logger import get_logger
+
+
+class MetadataDocument:
+    """ generated metadata document waiting for its file """
+
+    __slots__ = ["text", "mtime_ns", "mode"]
+
+    def __init__(self, text, mtime_ns, mode=None):
+        """ constructor
+
+        :param text: json document
+        :type text: :obj:`str`
+        :param mtime_ns: modification time in ns
+        :type mtime_ns: :obj:`int`
+        :param mode: file permission mode
+        :type mode: :obj:`int`
+        """
+        #: (:obj:`str`) json document
+        self.text = text
+        #: (:obj:`int`) modification time in ns
+        self.mtime_ns = mtime_ns
+        #: (:obj:`int`) file permission mode
+        self.mode = mode
+
+    @property
+    def mtime(self):
+        """ modification time as provided by :func:`os.path.getmtime`
+
+        :returns: modification time in s
+        :rtype: :obj:`float`
+        """
+        return self.mtime_ns // 1000000000 + \
+            (self.mtime_ns % 1000000000) * 1e-9
+
+
+class MetadataStore:
+    """ in-memory store of generated metadata documents
+
+    Documents are served from memory while a background writer saves
+    each of them once to its file. The file gets the modification time
+    of the document, so the ingested dataset list stays consistent
+    with the metadata files.
+    """
+
+    def __init__(self):
+        """ constructor
+
+        """
+        #: (:class:`threading.Lock`) document lock
+        self.__lock = threading.Lock()
+        #: (:obj:`dict` <:obj:`str`, :class:`MetadataDocument`>)
+        #:    documents not written yet
+        self.__documents = {}
+        #: (:obj:`list` <:class:`concurrent.futures.Future`>) pending writes
+        self.__writes = []
+        #: (:class:`concurrent.futures.ThreadPoolExecutor`) file writer
+        self.__writer = None
+
+    def put(self, filename, text, mode=None):
+        """ stores the document and schedules writing its file
+
+        :param filename: metadata file name
+        :type filename: :obj:`str`
+        :param text: json document
+        :type text: :obj:`str`
+        :param mode: file permission mode
+        :type mode: :obj:`int`
+        """
+        # full microseconds are kept by all common file systems
+        mtime_ns = time.time_ns() // 1000 * 1000
+        with self.__lock:
+            self.__documents[filename] = MetadataDocument(
+                text, mtime_ns, mode)
+            if self.__writer is None:
+                self.__writer = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="MetadataStore")
+            self.__writes = [fu for fu in self.__writes if not fu.done()]
+            self.__writes.append(self.__writer.submit(self._write, filename))
+
+    def update(self, filename, text):
+        """ updates the document keeping its permission mode
+
+        :param filename: metadata file name
+        :type filename: :obj:`str`
+        :param text: json document
+        :type text: :obj:`str`
+        """
+        mode = None
+        with self.__lock:
+            if filename in self.__documents:
+                mode = self.__documents[filename].mode
+        self.put(filename, text, mode)
+
+    def read(self, filename):
+        """ provides the document from memory or from its file
+
+        :param filename: metadata file name
+        :type filename: :obj:`str`
+        :returns: json document
+        :rtype: :obj:`str`
+        """
+        with self.__lock:
+            if filename in self.__documents:
+                return self.__documents[filename].text
+        with open(filename) as fl:
+            return fl.read()
+
+    def getmtime(self, filename):
+        """ provides the modification time of the document
+
+        :param filename: metadata file name
+        :type filename: :obj:`str`
+        :returns: modification time in s
+        :rtype: :obj:`float`
+        """
+        with self.__lock:
+            if filename in self.__documents:
+                return self.__documents[filename].mtime
+        return os.path.getmtime(filename)
+
+    def pending(self):
+        """ provides file names of documents not written yet
+
+        :returns: metadata file names
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        with self.__lock:
+            return list(self.__documents.keys())
+
+    def flush(self):
+        """ waits until all documents are written
+        """
+        with self.__lock:
+            writes, self.__writes = self.__writes, []
+        concurrent.futures.wait(writes)
+
+    def close(self):
+        """ writes all documents and stops the writer
+        """
+        self.flush()
+        with self.__lock:
+            writer, self.__writer = self.__writer, None
+        if writer is not None:
+            writer.shutdown()
+
+    def _write(self, filename):
+        """ writes the current document to its file
+
+        :param filename: metadata file name
+        :type filename: :obj:`str`
+        """
+        with self.__lock:
+            doc = self.__documents.get(filename)
+        if doc is None:
+            # written by a previous job
+            return
+        tmpname = "%s.%s.tmp" % (filename, os.getpid())
+        try:
+            dirname = os.path.dirname(os.path.abspath(filename))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            mode = doc.mode
+            if mode is None and os.path.isfile(filename):
+                # a rewritten file keeps its permissions
+                mode = stat.S_IMODE(os.stat(filename).st_mode)
+            with open(tmpname, "w") as fl:
+                fl.write(doc.text)
+            if mode is not None:
+                os.chmod(tmpname, mode)
+            os.utime(tmpname, ns=(doc.mtime_ns, doc.mtime_ns))
+            os.replace(tmpname, filename)
+        except Exception as e:
+            get_logger().warning(
+                'MetadataStore: %s cannot be written: %s'
+                % (filename, str(e)))
+            if os.path.isfile(tmpname):
+                os.remove(tmpname)
+            return
+        with self.__lock:
+            if self.__documents.get(filename) is doc:
+                self.__documents.pop(filename)
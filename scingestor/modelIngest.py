@@ -18,14 +18,13 @@
 #
 #
 import sys
-import os
 import argparse
-import json
 import pathlib
-import requests
 
 from .configuration import load_config
 from .logger import get_logger, init_logger
+from .sciCatSession import SciCatSession
+from .tokenManager import TokenManager
 
 
 class ModelIngest:
@@ -70,12 +69,12 @@ class ModelIngest:
         #: (:obj:`str`) username
         self.__username = 'ingestor'
 
-        #: (:obj:`str`) credential
-        self.__incd = None
         #: (:obj:`str`) credential file
         self.__incdfl = None
-        #: (:obj:`str`) credential file mtime
-        self.__incdfl_mtime = None
+        #: (:obj:`float`) token time-to-live in s
+        self.__token_ttl = None
+        #: (:obj:`float`) time in s to refresh token before its expiry
+        self.__token_margin = 60.0
 
         if "ingestor_username" in self.__config.keys():
             self.__username = self.__config["ingestor_username"]
@@ -83,9 +82,6 @@ class ModelIngest:
         if "ingestor_credential_file" in self.__config.keys():
             self.__incdfl = self.__config["ingestor_credential_file"].format(
                 homepath=self.__homepath)
-            with open(self.__incdfl) as fl:
-                self.__incd = fl.read().strip()
-            self.__incdfl_mtime = os.stat(self.__incdfl)[8]
 
         if "max_request_tries_number" in self.__config.keys():
             try:
@@ -101,9 +97,27 @@ class ModelIngest:
             except Exception as e:
                 get_logger().warning('%s' % (str(e)))
 
+        if "scicat_token_ttl" in self.__config.keys():
+            try:
+                self.__token_ttl = float(self.__config["scicat_token_ttl"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "scicat_token_refresh_margin" in self.__config.keys():
+            try:
+                self.__token_margin = float(
+                    self.__config["scicat_token_refresh_margin"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
         if "scicat_url" in self.__config.keys():
             self.__scicat_url = self.__config["scicat_url"]
 
+        #: (:class:`scingestor.sciCatSession.SciCatSession`)
+        #:   shared pooled http session
+        self.__session = SciCatSession()
+        self.__session.configure(self.__config)
+
         #: (:obj:`str`) scicat users login
         self.__scicat_users_login = "Users/login"
         if "scicat_users_login_path" in self.__config.keys():
@@ -119,6 +133,15 @@ class ModelIngest:
         # get_logger().info(
         #     'DatasetIngestor: LOGIN %s' % self.__tokenurl)
 
+        #: (:class:`scingestor.tokenManager.TokenManager`) token manager
+        self.__tokens = TokenManager()
+        #: (:class:`scingestor.tokenManager.TokenCredential`)
+        #:     ingestor credential
+        self.__credential = self.__tokens.credential(
+            self.__tokenurl, self.__incdfl, self.__username)
+        if self.__incdfl is not None:
+            self.__tokens.read_credential(self.__credential)
+
         #: (:obj:`str`) dataset url
         self.__modelurl = self.__scicat_url + self.__scicat_model
 
@@ -165,13 +188,25 @@ class ModelIngest:
         :returns: rewquest startus
         :rtype: :obj:`bool`
         """
+        token = self.__tokens.current_token(self.__credential, token)
         self.__headers["Authorization"] = "Bearer {}".format(token)
         # print("ingest", self.__modelurl)
-        response = requests.post(
+        response = self.__session.post(
             self.__modelurl,
             headers=self.__headers,
             params={"access_token": token},
             data=metadata)
+        if response.status_code == 401 and not self.__tokenfile:
+            ntoken = self.__tokens.refresh_token(
+                self.__credential, token, self.__headers,
+                self.__token_ttl, self.__token_margin)
+            if ntoken and ntoken != token:
+                self.__headers["Authorization"] = "Bearer {}".format(ntoken)
+                response = self.__session.post(
+                    self.__modelurl,
+                    headers=self.__headers,
+                    params={"access_token": ntoken},
+                    data=metadata)
         if not response.ok:
             raise Exception("%s" % response.text)
         return True
@@ -183,33 +218,9 @@ class ModelIngest:
         :rtype: :obj:`str`
         """
         try:
-            if self.__incdfl_mtime != os.stat(self.__incdfl)[8]:
-                with open(self.__incdfl) as fl:
-                    self.__incd = fl.read().strip()
-                self.__incdfl_mtime = os.stat(self.__incdfl)[8]
-            try:
-                jincd = json.loads(self.__incd)
-                if not isinstance(jincd, dict):
-                    jincd = {}
-            except Exception:
-                jincd = {}
-            if "jwt" in jincd.keys():
-                return jincd["jwt"]
-            if "id" in jincd.keys():
-                return jincd["id"]
-            password = self.__incd
-            username = self.__username
-            if "password" in jincd.keys():
-                password = jincd["password"]
-            if "username" in jincd.keys():
-                username = jincd["username"]
-            response = requests.post(
-                self.__tokenurl, headers=self.__headers,
-                json={"username": username, "password": password})
-            if response.ok:
-                return json.loads(response.content)["id"]
-            else:
-                raise Exception("%s" % response.text)
+            return self.__tokens.get_token(
+                self.__credential, self.__headers,
+                self.__token_ttl, self.__token_margin)
         except Exception as e:
             get_logger().error(
                 'ModelIngestor: %s' % (str(e)))
@@ -0,0 +1,260 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import io
+import os
+import sys
+import shlex
+import argparse
+import threading
+import subprocess
+
+from nxstools import nxsfileinfo
+from nxstools.nxsargparser import NXSArgParser
+
+from .logger import get_logger
+
+
+class ThreadStdout:
+    """ standard output which can be captured by a single thread
+    """
+
+    def __init__(self, stream):
+        """ constructor
+
+        :param stream: original standard output
+        :type stream: :class:`io.TextIOBase`
+        """
+        #: (:class:`io.TextIOBase`) original standard output
+        self.stream = stream
+        #: (:class:`threading.local`) captured output of threads
+        self.local = threading.local()
+
+    def write(self, text):
+        """ writes text to the captured or the original output
+
+        :param text: output text
+        :type text: :obj:`str`
+        :returns: number of written characters
+        :rtype: :obj:`int`
+        """
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        """ flushes the original output
+        """
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        """ provides attributes of the original output
+
+        :param name: attribute name
+        :type name: :obj:`str`
+        :returns: attribute value
+        :rtype: `any`
+        """
+        return getattr(self.stream, name)
+
+
+class NXSGenerator:
+    """ runs nxsfileinfo generator commands in the current process
+
+    A command is run in-process only if it calls nxsfileinfo with
+    one of the supported sub-commands and does not use any shell syntax,
+    e.g. pipes, redirections or variables. Other commands are left
+    to the shell. Commands of different threads run in parallel.
+    Output permissions are set after the command is run as nxsfileinfo
+    would change the process umask shared by all threads.
+    """
+
+    #: (:obj:`dict` <:obj:`str`, :class:`nxstools.nxsargparser.Runner`>)
+    #:    supported nxsfileinfo sub-commands
+    runners = {
+        "metadata": nxsfileinfo.Metadata,
+        "origdatablock": nxsfileinfo.OrigDatablock,
+        "attachment": nxsfileinfo.Attachment,
+        "groupmetadata": nxsfileinfo.GroupMetadata,
+    }
+
+    #: (:class:`threading.Lock`) standard output lock
+    _lock = threading.Lock()
+    #: (:class:`ThreadStdout`) captured standard output
+    _stdout = None
+    #: (:obj:`int`) number of commands capturing the standard output
+    _capturing = 0
+
+    def __init__(self, runners=None):
+        """ constructor
+
+        :param runners: sub-command runners replacing the nxsfileinfo ones
+        :type runners: :obj:`dict` <:obj:`str`,
+                       :class:`nxstools.nxsargparser.Runner`>
+        """
+        if runners:
+            #: (:obj:`dict` <:obj:`str`,
+            #:    :class:`nxstools.nxsargparser.Runner`>)
+            #:    supported nxsfileinfo sub-commands
+            self.runners = dict(self.runners, **runners)
+
+    def arguments(self, command):
+        """ provides nxsfileinfo arguments of the command
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: nxsfileinfo arguments or None for shell commands
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        if "$" in command or "`" in command:
+            return None
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            args = list(lexer)
+        except ValueError:
+            return None
+        if len(args) < 2 or os.path.basename(args[0]) != "nxsfileinfo" \
+           or args[1] not in self.runners.keys():
+            return None
+        for arg in args:
+            if arg and all(ch in lexer.punctuation_chars for ch in arg):
+                return None
+        return args[1:]
+
+    def run(self, command, args=None):
+        """ runs the nxsfileinfo command in the current process
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :param args: nxsfileinfo arguments
+        :type args: :obj:`list` <:obj:`str`>
+        :returns: standard output of the command
+        :rtype: :obj:`str`
+        """
+        if args is None:
+            args = self.arguments(command)
+        parser = NXSArgParser(
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+        parser.cmdrunners = [(args[0], self.runners[args[0]])]
+        runners = parser.createSubParsers()
+        output = io.StringIO()
+        stdout = self._capture(output)
+        try:
+            options = parser.parse_args(args)
+            mode = None
+            if getattr(options, "chmod", None):
+                try:
+                    mode = int(options.chmod, 8)
+                except ValueError:
+                    pass
+                options.chmod = None
+            result = runners[options.subparser].run(options)
+            if mode is not None:
+                for fname in [getattr(options, "output", None),
+                              getattr(options, "dboutput", None)]:
+                    if fname and os.path.isfile(fname):
+                        os.chmod(fname, mode)
+            if result and str(result).strip():
+                print(result)
+        except (SystemExit, Exception) as e:
+            get_logger().debug(
+                'NXSGenerator: %s: %s' % (command, str(e)))
+            raise subprocess.CalledProcessError(255, command)
+        finally:
+            self._release(stdout)
+        return output.getvalue()
+
+    @classmethod
+    def _capture(cls, output):
+        """ captures the standard output of the current thread
+
+        :param output: output buffer
+        :type output: :class:`io.StringIO`
+        :returns: captured standard output
+        :rtype: :class:`ThreadStdout`
+        """
+        with cls._lock:
+            if cls._stdout is None or sys.stdout is not cls._stdout:
+                cls._stdout = ThreadStdout(sys.stdout)
+                sys.stdout = cls._stdout
+            cls._capturing += 1
+            cls._stdout.local.buffer = output
+            return cls._stdout
+
+    @classmethod
+    def _release(cls, stdout):
+        """ releases the standard output of the current thread and
+        restores the original one after the last command
+
+        :param stdout: captured standard output
+        :type stdout: :class:`ThreadStdout`
+        """
+        with cls._lock:
+            stdout.local.buffer = None
+            cls._capturing -= 1
+            if cls._capturing <= 0:
+                cls._capturing = 0
+                if sys.stdout is cls._stdout:
+                    sys.stdout = cls._stdout.stream
+                cls._stdout = None
+
+    def stream_command(self, command):
+        """ provides the nxsfileinfo command which prints its output
+        document instead of writing its output file
+
+        :param command: generator command
+        :type command: :obj:`str`
+        :returns: command without the output option, output file name
+                  and its permission mode or None for other commands
+        :rtype: (:obj:`str`, :obj:`str`, :obj:`int`)
+        """
+        args = self.arguments(command)
+        if args is None or args[0] == "groupmetadata":
+            return None
+        sargs = shlex.split(command)[:1]
+        output = None
+        chmod = None
+        values = iter(args)
+        for arg in values:
+            if arg in ["-o", "--output"]:
+                output = next(values, None)
+            elif arg.startswith("--output="):
+                output = arg[len("--output="):]
+            elif arg.startswith("-o") and not arg.startswith("--"):
+                output = arg[2:]
+            else:
+                sargs.append(arg)
+                if arg in ["-x", "--chmod"]:
+                    chmod = next(values, None)
+                    if chmod is not None:
+                        sargs.append(chmod)
+                elif arg.startswith("--chmod="):
+                    chmod = arg[len("--chmod="):]
+        if not output:
+            return None
+        mode = None
+        if chmod:
+            try:
+                mode = int(chmod, 8)
+            except ValueError:
+                mode = None
+        return shlex.join(sargs), output, mode
@@ -0,0 +1,448 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import stat
+import time
+import heapq
+import queue
+import threading
+import inotifyx
+
+from .safeINotifier import SafeINotifier, EventData
+from .logger import get_logger
+
+
+def get_notifier(configuration):
+    """ provides the notifier selected by the configuration
+
+    :param configuration: dictionary with the ingestor configuration
+    :type configuration: :obj:`dict` <:obj:`str`, `any`>
+    :returns: inotify or polling notifier
+    :rtype: :class:`scingestor.safeINotifier.SafeINotifier` or
+            :class:`PollingNotifier`
+    """
+    config = configuration or {}
+    if config.get("notifier_backend", "inotify") == "polling":
+        notifier = PollingNotifier()
+        notifier.configure(config)
+        return notifier
+    return SafeINotifier()
+
+
+class PollWatch:
+    """ snapshot of a polled directory or file """
+
+    __slots__ = ("path", "qids", "mask", "self_stat", "entries",
+                 "pending", "interval", "due")
+
+    def __init__(self, path, interval):
+        """ constructor
+
+        :param path: watch path
+        :type path: :obj:`str`
+        :param interval: poll interval in s
+        :type interval: :obj:`float`
+        """
+        #: (:obj:`str`) watch path
+        self.path = path
+        #: (:obj:`set` <:obj:`int`>) queue ids of the watch
+        self.qids = set()
+        #: (:obj:`int`) merged watch mask
+        self.mask = 0
+        #: ((:obj:`int`, :obj:`int`)) device and inode of the path
+        self.self_stat = None
+        #: (:obj:`dict` <:obj:`str`, (:obj:`int`, :obj:`int`,
+        #:    :obj:`int`, :obj:`bool`)>)
+        #:    mtime in ns, size, inode and directory flag of entries,
+        #:    mtime and size are None if only names are watched
+        self.entries = {}
+        #: (:obj:`set` <:obj:`str`>) modified files not closed yet
+        self.pending = set()
+        #: (:obj:`float`) poll interval in s
+        self.interval = interval
+        #: (:obj:`float`) monotonic time of the next poll
+        self.due = 0.
+
+
+class PollingNotifier(threading.Thread):
+    """ singleton notifier polling file status with the SafeINotifier
+    interface, e.g. for file systems where inotify does not see
+    changes made by other nodes
+
+    Every watched path keeps a snapshot of (mtime, size, inode) of its
+    entries. A path which changes is polled with the minimal interval,
+    the interval of an idle path grows up to the maximal one. The number
+    of stat calls per second is limited. Directories watched only for
+    created, deleted or moved entries are read without stat calls
+    of their entries.
+    """
+
+    #: (:obj:`int`) events which need status of directory entries
+    content_events = inotifyx.IN_MODIFY | inotifyx.IN_CLOSE_WRITE
+
+    #: (:class:`PollingNotifier`) singleton notifier instance
+    _notifier = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+    #: (:obj:`bool`) make notifier to be a daemon
+    daemon = True
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._notifier or not cls._notifier.running:
+                cls._notifier = super(PollingNotifier, cls).__new__(cls)
+                cls._notifier.init()
+
+        return cls._notifier
+
+    def init(self):
+        """ constructor
+
+        """
+        threading.Thread.__init__(self)
+
+        #: (:obj:`bool`) running loop flag
+        self.running = True
+
+        #: (:obj:`int`) watch description queue counter
+        self.id_queue_counter = 0
+        #: (:obj:`float`) timeout value for waiting on watch changes
+        self.inotify_timeout = 1.0
+        #: (:obj:`float`) poll interval of changing paths in s
+        self.min_interval = 0.5
+        #: (:obj:`float`) poll interval of idle paths in s
+        self.max_interval = 10.0
+        #: (:obj:`float`) maximal number of stat calls per second
+        self.max_stat_rate = 1000.
+
+        #: (:obj:`dict` <:obj:`int`, :obj:`queue.Queue`>) watch queues
+        self.__id_queue = {}
+        #: (:obj:`dict` <:obj:`int`, :obj:`int`>) queue id masks
+        self.__qid_mask = {}
+        #: (:obj:`dict` <:obj:`int`, :class:`PollWatch`>) queue id watches
+        self.__qid_watch = {}
+        #: (:obj:`dict` <:obj:`str`, :class:`PollWatch`>) path watches
+        self.__path_watch = {}
+        #: (:obj:`list` < (:obj:`float`, :obj:`int`, :obj:`str`) >)
+        #:    heap of polls, i.e. (due, counter, path)
+        self.__polls = []
+        #: (:obj:`int`) poll counter
+        self.__counter = 0
+        #: (:obj:`float`) available stat calls
+        self.__tokens = self.max_stat_rate
+        #: (:obj:`float`) monotonic time of the last token update
+        self.__token_time = time.monotonic()
+        #: (:class:`threading.Condition`) watch condition
+        self.__condition = threading.Condition()
+
+        # start the thread
+        self.start()
+
+    def configure(self, configuration):
+        """ sets poll intervals and the stat rate from the configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        with self.__condition:
+            if "polling_min_interval" in config.keys():
+                try:
+                    self.min_interval = max(
+                        float(config["polling_min_interval"]), 0.001)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            if "polling_max_interval" in config.keys():
+                try:
+                    self.max_interval = float(config["polling_max_interval"])
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            if "polling_max_stat_rate" in config.keys():
+                try:
+                    self.max_stat_rate = max(
+                        float(config["polling_max_stat_rate"]), 1.)
+                except Exception as e:
+                    get_logger().warning('%s' % (str(e)))
+            self.max_interval = max(self.max_interval, self.min_interval)
+            self.__condition.notify_all()
+
+    def add_watch(self, path, masks, wqueue=None):
+        """ add watch to notifier
+
+        :param path: watch path
+        :type path: :obj:`str`
+        :param mask: watch mask
+        :type mask: :obj:`int`
+        :param wqueue: queue shared by several watches
+        :type wqueue: :class:`queue.Queue`
+        :returns: queue providing events and its id
+        :rtype: [:class:`queue.Queue`, :obj:`int`]
+        """
+        wqueue = wqueue if wqueue is not None else queue.Queue()
+        with self.__condition:
+            self.id_queue_counter += 1
+            qid = self.id_queue_counter
+            self.__id_queue[qid] = wqueue
+            self.__qid_mask[qid] = masks
+            get_logger().debug(
+                "ADD WATCH: %s %s %s" % (qid, path, masks))
+            watch = self.__path_watch.get(path)
+            if watch is None:
+                watch = PollWatch(path, self.min_interval)
+                watch.mask = masks
+                try:
+                    # the snapshot is taken before the watch is returned
+                    self._snapshot(watch)
+                except Exception as e:
+                    get_logger().warning(
+                        'PollingNotifier: append  %s: %s' % (path, str(e)))
+                    return [wqueue, qid]
+                self.__path_watch[path] = watch
+                self._schedule(watch, self.min_interval)
+            watch.qids.add(qid)
+            watch.mask |= masks
+            self.__qid_watch[qid] = watch
+            self.__condition.notify_all()
+        return [wqueue, qid]
+
+    def rm_watch(self, qid):
+        """ remove watch from notifier
+
+        :param qid: queue id
+        :type qid: :obj:`int`
+        """
+        with self.__condition:
+            get_logger().debug(
+                "REMOVE WATCH: %s" % (qid))
+            self.__id_queue.pop(qid)
+            self.__qid_mask.pop(qid, None)
+            watch = self.__qid_watch.pop(qid, None)
+            if watch is not None:
+                watch.qids.discard(qid)
+                if not watch.qids:
+                    self.__path_watch.pop(watch.path, None)
+                else:
+                    watch.mask = 0
+                    for wqid in watch.qids:
+                        watch.mask |= self.__qid_mask.get(wqid, 0)
+
+    def _schedule(self, watch, interval):
+        """ schedules the next poll of the watch, called with the lock
+
+        :param watch: polled watch
+        :type watch: :class:`PollWatch`
+        :param interval: poll interval in s
+        :type interval: :obj:`float`
+        """
+        watch.interval = interval
+        watch.due = time.monotonic() + interval
+        self.__counter += 1
+        heapq.heappush(self.__polls, (watch.due, self.__counter, watch.path))
+
+    def _take_tokens(self, number):
+        """ takes stat calls from the rate limit, called with the lock
+
+        :param number: number of stat calls
+        :type number: :obj:`int`
+        :returns: time in s to wait for the stat calls
+        :rtype: :obj:`float`
+        """
+        now = time.monotonic()
+        self.__tokens = min(
+            self.__tokens + (now - self.__token_time) * self.max_stat_rate,
+            self.max_stat_rate)
+        self.__token_time = now
+        # a path with more entries than the rate waits for a full bucket
+        # and the calls above the bucket size delay the next polls
+        needed = min(number, self.max_stat_rate)
+        if self.__tokens < needed:
+            return (needed - self.__tokens) / self.max_stat_rate
+        self.__tokens -= number
+        return 0.
+
+    def _snapshot(self, watch):
+        """ reads the current status of the watch path
+
+        :param watch: polled watch
+        :type watch: :class:`PollWatch`
+        :returns: device and inode of the path and its entries
+        :rtype: ((:obj:`int`, :obj:`int`),
+                 :obj:`dict` <:obj:`str`, :obj:`tuple`>)
+        """
+        st = os.stat(watch.path)
+        watch.self_stat = (st.st_dev, st.st_ino)
+        watch.entries = self._entries(
+            watch.path, st, watch.mask & self.content_events)
+
+    def _entries(self, path, st, content=True):
+        """ reads entry status of a directory or a file
+
+        :param path: watch path
+        :type path: :obj:`str`
+        :param st: status of the path
+        :type st: :class:`os.stat_result`
+        :param content: read mtime and size of directory entries
+        :type content: :obj:`bool`
+        :returns: mtime in ns, size, inode and directory flag of entries
+        :rtype: :obj:`dict` <:obj:`str`, (:obj:`int`, :obj:`int`,
+                :obj:`int`, :obj:`bool`)>
+        """
+        if not stat.S_ISDIR(st.st_mode):
+            return {"": (st.st_mtime_ns, st.st_size, st.st_ino, False)}
+        entries = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if not content:
+                        # inode and type are given by the directory
+                        entries[entry.name] = (
+                            None, None, entry.inode(),
+                            entry.is_dir(follow_symlinks=False))
+                        continue
+                    est = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries[entry.name] = (
+                    est.st_mtime_ns, est.st_size, est.st_ino,
+                    stat.S_ISDIR(est.st_mode))
+        return entries
+
+    def _poll(self, watch):
+        """ polls the watch path and provides its events
+
+        :param watch: polled watch
+        :type watch: :class:`PollWatch`
+        :returns: events, i.e. (name, mask), and a flag if the watch ends
+        :rtype: (:obj:`list` < (:obj:`str`, :obj:`int`) >, :obj:`bool`)
+        """
+        content = watch.mask & self.content_events
+        try:
+            st = os.stat(watch.path)
+            if (st.st_dev, st.st_ino) != watch.self_stat:
+                raise OSError("%s was replaced" % watch.path)
+            entries = self._entries(watch.path, st, content)
+        except OSError as e:
+            get_logger().debug('PollingNotifier: %s' % str(e))
+            return [("", inotifyx.IN_MOVE_SELF),
+                    ("", inotifyx.IN_IGNORED)], True
+        events = []
+        old = watch.entries
+        for name in sorted(set(old) | set(entries)):
+            new = entries.get(name)
+            prev = old.get(name)
+            if new is not None and prev is not None and \
+               (new[0] is None or prev[0] is None):
+                # only names were read before or now
+                new, prev = new[2:], prev[2:]
+            if new == prev:
+                if name in watch.pending:
+                    watch.pending.discard(name)
+                    events.append((name, inotifyx.IN_CLOSE_WRITE))
+                continue
+            isdir = (new or prev)[-1]
+            dmask = inotifyx.IN_ISDIR if isdir else 0
+            if new is None:
+                watch.pending.discard(name)
+                events.append((name, inotifyx.IN_DELETE | dmask))
+                continue
+            if prev is None:
+                events.append((name, inotifyx.IN_CREATE | dmask))
+            elif prev[-2] != new[-2]:
+                events.append((name, inotifyx.IN_MOVED_TO | dmask))
+            elif not isdir:
+                events.append((name, inotifyx.IN_MODIFY))
+            if not isdir and content:
+                watch.pending.add(name)
+        watch.entries = entries
+        return events, False
+
+    def _dispatch(self, watch, events):
+        """ puts events into queues of the watch, called with the lock
+
+        :param watch: polled watch
+        :type watch: :class:`PollWatch`
+        :param events: events, i.e. (name, mask)
+        :type events: :obj:`list` < (:obj:`str`, :obj:`int`) >
+        """
+        for name, mask in events:
+            for qid in watch.qids:
+                if qid in self.__id_queue.keys() and mask & (
+                        self.__qid_mask.get(qid, 0) |
+                        SafeINotifier.unmasked_events):
+                    self.__id_queue[qid].put(EventData(name, mask, 0, qid))
+
+    def run(self):
+        """ polling notifier thread
+        """
+        try:
+            while self.running:
+                with self.__condition:
+                    watch = None
+                    wait = self.inotify_timeout
+                    while self.__polls:
+                        due, _, path = self.__polls[0]
+                        pwatch = self.__path_watch.get(path)
+                        if pwatch is None or pwatch.due != due:
+                            # removed or rescheduled watch
+                            heapq.heappop(self.__polls)
+                            continue
+                        wait = min(due - time.monotonic(), wait)
+                        if wait <= 0:
+                            wait = self._take_tokens(
+                                len(pwatch.entries) + 1
+                                if pwatch.mask & self.content_events
+                                else 1)
+                            if wait <= 0:
+                                heapq.heappop(self.__polls)
+                                watch = pwatch
+                        break
+                    if watch is None:
+                        self.__condition.wait(max(wait, 0.001))
+                        continue
+
+                events, ended = self._poll(watch)
+
+                with self.__condition:
+                    if self.__path_watch.get(watch.path) is not watch:
+                        continue
+                    self._dispatch(watch, events)
+                    if ended:
+                        self.__path_watch.pop(watch.path, None)
+                        for qid in watch.qids:
+                            self.__qid_watch.pop(qid, None)
+                    elif events or watch.pending:
+                        self._schedule(watch, self.min_interval)
+                    else:
+                        self._schedule(
+                            watch,
+                            min(watch.interval * 2, self.max_interval))
+        finally:
+            with self.__condition:
+                self.__path_watch = {}
+                self.__polls = []
+
+    def stop(self):
+        """ stop the watcher
+        """
+        self.running = False
+        with self.__condition:
+            self.__condition.notify_all()
@@ -17,31 +17,72 @@
 #
 #
 #
-import time
+import logging
 import threading
 import inotifyx
 import queue
+import select
 import os
 # import glob
 # import json
 from .logger import get_logger
 
 
+def _get_logger():
+    """ provides the ingestor logger or the root logger
+    if the ingestor logger is not initialized yet
+
+    :rtype: :class:`logging.logger`
+    :returns: logger object
+    """
+    return get_logger() or logging.getLogger()
+
+
 class EventData:
     """ event data """
 
-    def __init__(self, name, masks):
+    __slots__ = ("name", "mask", "cookie", "qid", "_masks")
+
+    def __init__(self, name, mask, cookie=0, qid=None):
         """ constructor
 
         :param name: name
         :type name: :obj:`str`
-        :param masks: mask description
-        :type maks: :obj:`str`
+        :param mask: inotify event mask
+        :type mask: :obj:`int`
+        :param cookie: inotify event cookie
+        :type cookie: :obj:`int`
+        :param qid: queue id of the watch
+        :type qid: :obj:`int`
         """
         #: (:obj:`str`) name
         self.name = name
-        #: (:obj:`str`) mask
-        self.masks = masks
+        #: (:obj:`int`) inotify event mask
+        self.mask = mask
+        #: (:obj:`int`) inotify event cookie connecting move events
+        self.cookie = cookie
+        #: (:obj:`int`) queue id of the watch
+        self.qid = qid
+        #: (:obj:`str`) mask description
+        self._masks = None
+
+    @property
+    def masks(self):
+        """ mask description, e.g. IN_CREATE|IN_ISDIR
+
+        :returns: mask description
+        :rtype: :obj:`str`
+        """
+        if self._masks is None:
+            self._masks = inotifyx.InotifyEvent(
+                None, self.mask, self.cookie, self.name
+            ).get_mask_description()
+        return self._masks
+
+    def __str__(self):
+        """ mask description
+        """
+        return self.masks
 
 
 class SafeINotifier(threading.Thread):
@@ -54,17 +95,28 @@ class SafeINotifier(threading.Thread):
     _lock = threading.Lock()
     #: (:obj:`bool`) make notifier to be a daemon
     daemon = True
+    #: (:obj:`int`) events passed to all watches of a path
+    #:    as the kernel sends them regardless of the watch mask
+    unmasked_events = \
+        inotifyx.IN_IGNORED | inotifyx.IN_Q_OVERFLOW | inotifyx.IN_UNMOUNT
 
     def __new__(cls, *args, **kwargs):
         """ create a new object if it is the first one
         """
         with cls._lock:
-            if not cls._notifier or not cls._notifier.running:
+            # a notifier thread which died is replaced as well
+            if not cls._notifier or not cls._notifier.running or \
+               not cls._notifier.is_alive():
                 cls._notifier = super(SafeINotifier, cls).__new__(cls)
                 cls._notifier.init()
 
         return cls._notifier
 
+    def __init__(self, *args, **kwargs):
+        """ keeps the thread state of the singleton,
+        which is initialized by :meth:`init`
+        """
+
     def init(self):
         """ constructor
 
@@ -86,6 +138,14 @@ class SafeINotifier(threading.Thread):
         self.__id_queue = {}
         #: (:obj:`dict` <:obj:`int`, :obj:`int`>)  queue ids watch description
         self.__qid_wd = {}
+        #: (:obj:`dict` <:obj:`int`, :obj:`set` <:obj:`int`>>)
+        #:    queue ids of watch descriptions
+        self.__wd_qids = {}
+        #: (:obj:`dict` <:obj:`int`, :obj:`int`>) queue id masks
+        self.__qid_mask = {}
+        #: (:obj:`dict` <:obj:`int`, (:obj:`str`, :obj:`int`)>)
+        #:    paths and merged masks of watch descriptions
+        self.__wd_path_mask = {}
         #: (:class:`threading.Lock`) watch dictionary lock
         self.__id_queue_lock = threading.Lock()
 
@@ -95,29 +155,37 @@ class SafeINotifier(threading.Thread):
         #: (:obj:`list` < :obj:`int`>)
         #: queue id of watch description to remove
         self.__wd_to_rm = []
+        #: ((:obj:`int`, :obj:`int`)) pipe waking up the notifier thread
+        #:    when watches are added or removed
+        self.__wakeup = os.pipe()
+        os.set_blocking(self.__wakeup[1], False)
 
         # start the thread
         self.start()
 
-    def add_watch(self, path, masks):
+    def add_watch(self, path, masks, wqueue=None):
         """ add watch to notifier
 
         :param path: watch path
         :type path: :obj:`str`
         :param mask: watch mask
         :type mask: :obj:`int`
+        :param wqueue: queue shared by several watches
+        :type wqueue: :class:`queue.Queue`
         :returns: queue providing events and its id
         :rtype: [:class:`queue.Queue`, :obj:`int`]
         """
 
-        wqueue = queue.Queue()
+        wqueue = wqueue if wqueue is not None else queue.Queue()
         with self.__id_queue_lock:
             self.id_queue_counter += 1
             qid = self.id_queue_counter
             self.__id_queue[qid] = wqueue
-            get_logger().debug(
+            self.__qid_mask[qid] = masks
+            _get_logger().debug(
                 "ADD WATCH: %s %s %s" % (qid, path, masks))
             self.__wd_to_add.append((qid, path, masks))
+            self._wake()
         return [wqueue, qid]
 
     def rm_watch(self, qid):
@@ -127,21 +195,59 @@ class SafeINotifier(threading.Thread):
         :type qid: :obj:`int`
         """
         with self.__id_queue_lock:
-            get_logger().debug(
+            _get_logger().debug(
                 "REMOVE WATCH: %s" % (qid))
             self.__wd_to_rm.append(qid)
             self.__id_queue.pop(qid)
+            self.__qid_mask.pop(qid, None)
+            self._wake()
+
+    def _wake(self):
+        """ wakes up the notifier thread, called with the watch lock
+        """
+        if self.__wakeup is not None:
+            try:
+                os.write(self.__wakeup[1], b"w")
+            except OSError:
+                # the pipe is full
+                pass
+
+    def _wait(self, timeout):
+        """ waits for inotify events or a wake-up
+
+        :param timeout: timeout in s
+        :type timeout: :obj:`float`
+        """
+        fds = [self.__wakeup[0]]
+        if self.__notifier is not None:
+            fds.append(self.__notifier)
+        try:
+            rfds, _, _ = select.select(fds, [], [], timeout)
+            if self.__wakeup[0] in rfds:
+                os.read(self.__wakeup[0], 4096)
+        except (OSError, ValueError) as e:
+            _get_logger().debug('SafeINotifier: wait %s' % str(e))
 
     def _append(self):
         """ append waches
         """
         for qid, path, masks in self.__wd_to_add:
+            if qid not in self.__id_queue:
+                continue
             try:
-                wd = inotifyx.add_watch(self.__notifier, path, masks)
+                # masks of all watches of the path are merged
+                wd = inotifyx.add_watch(
+                    self.__notifier, path, masks | inotifyx.IN_MASK_ADD)
                 self.__qid_wd[qid] = wd
+                if wd not in self.__wd_qids:
+                    self.__wd_qids[wd] = set()
+                    self.__wd_path_mask[wd] = (path, 0)
+                self.__wd_qids[wd].add(qid)
+                _, wmask = self.__wd_path_mask[wd]
+                self.__wd_path_mask[wd] = (path, wmask | masks)
 
             except Exception as e:
-                get_logger().warning(
+                _get_logger().warning(
                     'SafeINotifier: append  %s: %s' % (path, str(e)))
         self.__wd_to_add = []
 
@@ -151,14 +257,57 @@ class SafeINotifier(threading.Thread):
         for qid in self.__wd_to_rm:
             if qid in self.__qid_wd:
                 wd = self.__qid_wd.pop(qid)
-                if wd not in self.__qid_wd.values():
+                qids = self.__wd_qids.get(wd, set())
+                qids.discard(qid)
+                if not qids:
+                    self.__wd_qids.pop(wd, None)
+                    self.__wd_path_mask.pop(wd, None)
                     try:
                         inotifyx.rm_watch(self.__notifier, wd)
                     except Exception as e:
-                        get_logger().debug(
+                        _get_logger().debug(
                             'SafeINotifier: remove %s' % str(e))
+                else:
+                    self._reduce_mask(wd)
         self.__wd_to_rm = []
 
+    def _reduce_mask(self, wd):
+        """ sets the watch mask to the masks of the remaining watches
+
+        :param wd: watch description
+        :type wd: :obj:`int`
+        """
+        path, wmask = self.__wd_path_mask[wd]
+        masks = 0
+        for qid in self.__wd_qids[wd]:
+            masks |= self.__qid_mask.get(qid, 0)
+        if not masks or masks == wmask:
+            return
+        try:
+            nwd = inotifyx.add_watch(self.__notifier, path, masks)
+            if nwd == wd:
+                self.__wd_path_mask[wd] = (path, masks)
+            elif nwd not in self.__wd_qids:
+                # the path points to a new inode
+                inotifyx.rm_watch(self.__notifier, nwd)
+        except Exception as e:
+            _get_logger().debug(
+                'SafeINotifier: reduce mask %s' % str(e))
+
+    def _broadcast(self, event):
+        """ passes the event to all watch queues,
+        e.g. a queue overflow which requires resynchronization
+
+        :param event: inotify event
+        :type event: :class:`inotifyx.InotifyEvent`
+        """
+        _get_logger().warning(
+            'SafeINotifier: %s: resynchronizing watches'
+            % event.get_mask_description())
+        with self.__id_queue_lock:
+            for qid, wqueue in self.__id_queue.items():
+                wqueue.put(EventData("", event.mask, event.cookie, qid))
+
     def run(self):
         """ scandir watcher thread
         """
@@ -169,44 +318,51 @@ class SafeINotifier(threading.Thread):
 
                 with self.__id_queue_lock:
                     self._append()
-                    qlen = len(self.__id_queue)
 
-                if not qlen:
-                    time.sleep(self.inotify_timeout)
-                else:
-                    events = inotifyx.get_events(
-                        self.__notifier, self.inotify_timeout)
+                self._wait(self.inotify_timeout)
+                # events of removed watches are read out as well
+                events = inotifyx.get_events(self.__notifier, 0)
+                with self.__id_queue_lock:
+                    self._remove()
+                    self._append()
+                _get_logger().debug('Sc Talk')
+                debug = get_logger().isEnabledFor(logging.DEBUG)
+                for event in events:
+                    wd = event.wd
+                    if event.mask & inotifyx.IN_Q_OVERFLOW:
+                        self._broadcast(event)
+                        continue
                     with self.__id_queue_lock:
-                        self._remove()
-                        self._append()
-                    get_logger().debug('Sc Talk')
-                    for event in events:
-                        wd = event.wd
-                        with self.__id_queue_lock:
-                            get_logger().debug(
+                        if debug:
+                            _get_logger().debug(
                                 'SN: %s %s %s %s' % (
                                     event.name,
                                     event.get_mask_description(),
                                     event.wd,
-                                    self.__qid_wd
+                                    self.__wd_qids.get(wd)
                                 ))
-                            # get_logger().info(
-                            #     'SN: %s %s %s %s' % (
-                            #         event.name,
-                            #         event.get_mask_description(),
-                            #         event.wd,
-                            #         self.__qid_wd
-                            #     ))
-
-                            for qid, wd in self.__qid_wd.items():
-                                if event.wd == wd and \
-                                   qid in self.__id_queue.keys():
-                                    wqueue = self.__id_queue[qid]
-                                    wqueue.put(
-                                        EventData(
-                                            event.name,
-                                            event.get_mask_description()))
-                                    get_logger().debug(
+                        # get_logger().info(
+                        #     'SN: %s %s %s %s' % (
+                        #         event.name,
+                        #         event.get_mask_description(),
+                        #         event.wd,
+                        #         self.__qid_wd
+                        #     ))
+
+                        for qid in self.__wd_qids.get(wd, ()):
+                            if qid in self.__id_queue.keys() and \
+                               event.mask & (
+                                   self.__qid_mask.get(qid, 0) |
+                                   self.unmasked_events):
+                                wqueue = self.__id_queue[qid]
+                                wqueue.put(
+                                    EventData(
+                                        event.name,
+                                        event.mask,
+                                        event.cookie,
+                                        qid))
+                                if debug:
+                                    _get_logger().debug(
                                         'PUT EVENT: %s %s %s %s' % (
                                             event.name,
                                             event.get_mask_description(),
@@ -216,11 +372,11 @@ class SafeINotifier(threading.Thread):
                 with self.__id_queue_lock:
                     self._remove()
         finally:
-            for wd in self.__qid_wd.values():
+            for wd in self.__wd_qids.keys():
                 try:
                     inotifyx.rm_watch(self.__notifier, wd)
                 except Exception as e:
-                    get_logger().debug(
+                    _get_logger().debug(
                         'SafeINotifier: finally %s' % str(e))
             if self.__notifier:
                 try:
@@ -228,8 +384,17 @@ class SafeINotifier(threading.Thread):
                     self.__notifier = None
                 except OSError:
                     pass
+            with self.__id_queue_lock:
+                for fd in self.__wakeup:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+                self.__wakeup = None
 
     def stop(self):
         """ stop the watcher
         """
         self.running = False
+        with self.__id_queue_lock:
+            self._wake()
@@ -0,0 +1,447 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import threading
+import queue
+import socket
+import pathlib
+
+from .datasetWatcher import DatasetWatcher
+from .pollingNotifier import get_notifier
+from .pathConverter import PathConverter
+from .logger import get_logger
+
+import inotifyx
+
+
+class ScanDirNode:
+    """ watched scan directory of the dispatcher tree
+    """
+
+    def __init__(self, path, depth, parent=None):
+        """ constructor
+
+        :param path: scan dir core path
+        :type path: :obj:`str`
+        :param depth: scandir depth level
+        :type depth: :obj:`int`
+        :param parent: parent node
+        :type parent: :class:`ScanDirNode`
+        """
+        #: (:obj:`str`) scan dir core path
+        self.path = path
+        #: (:obj:`int`) scan dir depth
+        self.depth = depth
+        #: (:class:`ScanDirNode`) parent node
+        self.parent = parent
+        #: (:obj:`int`) notifier queue id
+        self.qid = None
+        #: (:obj:`dict` <:obj:`str`, :class:`ScanDirNode`>) child nodes
+        self.children = {}
+        #: (:obj:`dict` <:obj:`str`,
+        #:    :class:`scingestor.datasetWatcher.DatasetWatcher`>)
+        #:       dataset watchers instances for given dataset list file
+        self.dataset_watchers = {}
+
+
+class ScanDirDispatcher(threading.Thread):
+    """ ScanDir Dispatcher
+
+    It watches a scan directory and its subdirectories
+    in one event loop instead of a ScanDirWatcher thread per directory.
+    """
+    def __init__(self,
+                 configuration,
+                 path, meta, beamtimefile, depth):
+        """ constructor
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        :param path: scan dir path
+        :type path: :obj:`str`
+        :param meta: beamtime configuration
+        :type meta: :obj:`dict` <:obj:`str`, `any`>
+        :param beamtimefile: beamtime file
+        :type beamtimefile: :obj:`str`
+        :param depth: scandir depth level
+        :type depth: :obj:`int`
+        """
+        threading.Thread.__init__(self)
+
+        #: (:obj:`bool`) running loop flag
+        self.running = True
+
+        #: (:obj:`dict` <:obj:`str`, `any`>) ingestor configuration
+        self.__config = configuration or {}
+
+        #: (:obj:`str`) home directory
+        self.__homepath = str(pathlib.Path.home())
+
+        #: (:obj:`str`) core path
+        self.__corepath = meta.get("corePath", None)
+
+        #: (:obj:`str`) beamtime path
+        self.__bpath = os.path.split(beamtimefile)[0]
+
+        #: (:obj:`bool`) use core path
+        self.__usecorepath = False
+        if "use_corepath_as_scandir" in self.__config.keys():
+            self.__usecorepath = bool(
+                self.__config["use_corepath_as_scandir"])
+
+        #: (:obj:`bool`) watch scandir subdirectories
+        self.__watchscandirsubdir = False
+        if "watch_scandir_subdir" in self.__config.keys():
+            self.__watchscandirsubdir = bool(
+                self.__config["watch_scandir_subdir"])
+
+        #: (:class:`scingestor.pathConverter.PathConverter`) path converter
+        self.__conv = PathConverter(
+            self.__corepath, self.__bpath,
+            self.__usecorepath and self.__corepath)
+        #: (:obj:`str`) scan dir path
+        self.__path = self.__conv.to_core(path)
+        #: (:obj:`str`) beamtime core path and file name
+        self.__btfile = self.__conv.to_core(beamtimefile)
+        #: (:obj:`dict` <:obj:`str`, `any`>) beamtime configuration
+        self.__meta = meta
+        #: (:obj:`int`) scan dir depth
+        self.__depth = depth
+        #: (:obj:`str`) beamtime id
+        self.__beamtimeId = meta["beamtimeId"]
+
+        #: (:obj:`str`) scicat dataset file pattern
+        self.__ds_pattern = "scicat-datasets-{beamtimeid}.lst"
+        #: (:obj:`str`) indested scicat dataset file pattern
+        self.__ids_pattern = "scicat-ingested-datasets-{beamtimeid}.lst"
+        #: (:obj:`str`) indested scicat dataset file pattern
+        self.__hostname = socket.gethostname()
+
+        #: (:class:`scingestor.safeINotifier.SafeINotifier`) notifier
+        self.__notifier = None
+        #: (:class:`queue.Queue`) event queue shared by all watches
+        self.__queue = queue.Queue()
+        #: (:class:`ScanDirNode`) root node of the watched tree
+        self.__root = None
+        #: (:obj:`dict` <:obj:`int`, :class:`ScanDirNode`>)
+        #:       watched nodes for given queue ids
+        self.__qid_to_node = {}
+        #: (:class:`threading.Lock`) node tree lock
+        self.__tree_lock = threading.Lock()
+        #: (:obj:`list` <:class:`scingestor.datasetWatcher.DatasetWatcher`>)
+        #:       stopped dataset watchers to be joined without the tree lock
+        self.__stopped = []
+        #: (:obj:`float`) timeout value for inotifyx get events
+        self.__timeout = 0.1
+
+        #: (:obj:`list` <:obj:`str`>) scandir blacklist
+        self.__scandir_blacklist = [
+            "/gpfs/current/scratch_bl",
+            "/gpfs/current/processed",
+            "/gpfs/current/shared"
+        ]
+        if "scandir_blacklist" in self.__config.keys() \
+           and isinstance(self.__config["scandir_blacklist"], list):
+            self.__scandir_blacklist = []
+            for sdir in self.__config["scandir_blacklist"]:
+                if sdir:
+                    self.__scandir_blacklist.append(sdir.format(
+                        homepath=self.__homepath))
+
+        if "get_event_timeout" in self.__config.keys():
+            try:
+                self.__timeout = float(self.__config["get_event_timeout"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+        if "datasets_filename_pattern" in self.__config.keys():
+            self.__ds_pattern = self.__config["datasets_filename_pattern"]
+
+        if "ingested_datasets_filename_pattern" in self.__config.keys():
+            self.__ids_pattern = \
+                self.__config["ingested_datasets_filename_pattern"]
+
+        #: (:obj:`str`) datasets file name
+        self.__dslist_filename = self.__ds_pattern.format(
+            beamtimeid=self.__beamtimeId, hostname=self.__hostname)
+        #: (:obj:`str`) ingescted datasets file name
+        self.__idslist_filename = self.__ids_pattern.format(
+            beamtimeid=self.__beamtimeId, hostname=self.__hostname)
+
+        #: (:obj:`str`) ingestor log directory
+        self.__var_dir = ""
+        if "ingestor_var_dir" in self.__config.keys():
+            self.__var_dir = str(
+                self.__config["ingestor_var_dir"]).format(
+                    beamtimeid=self.__beamtimeId,
+                    homepath=self.__homepath)
+        if self.__var_dir == "/":
+            self.__var_dir = ""
+
+    def _dslist_fullname(self, node):
+        """ provides the dataset list file name of the node
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        :returns: dataset list file name
+        :rtype: :obj:`str`
+        """
+        return os.path.join(node.path, self.__dslist_filename)
+
+    def _add_path(self, node):
+        """ add node path to notifier
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        """
+        try:
+            _, qid = self.__notifier.add_watch(
+                self.__conv.from_core(node.path),
+                inotifyx.IN_CREATE | inotifyx.IN_DELETE |
+                inotifyx.IN_MOVED_FROM | inotifyx.IN_MOVE_SELF,
+                self.__queue)
+            node.qid = qid
+            self.__qid_to_node[qid] = node
+            get_logger().info('ScanDirWatcher: Adding watch %s: %s'
+                              % (str(qid), node.path))
+        except Exception as e:
+            get_logger().warning('%s: %s' % (node.path, str(e)))
+
+    def _start_node(self, node):
+        """ starts watching the node directory
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        """
+        self._add_path(node)
+        dslist = self._dslist_fullname(node)
+        get_logger().debug("ScanDir file:  %s " % (dslist))
+        if os.path.isfile(dslist):
+            self._launch_dataset_watcher(node, dslist, True)
+        if os.path.isdir(node.path) and (
+                self.__watchscandirsubdir or not os.path.isfile(dslist)):
+            self._launch_children(node, self._subdirs(node))
+
+    def _subdirs(self, node):
+        """ provides subdirectories of the node
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        :returns: subdirectory paths
+        :rtype: :obj:`list` <:obj:`str`>
+        """
+        try:
+            return [it.path for it in os.scandir(node.path) if it.is_dir()]
+        except Exception as e:
+            get_logger().warning('%s: %s' % (node.path, str(e)))
+            return []
+
+    def _launch_dataset_watcher(self, node, fn, frompath=False):
+        """ creates dataset watcher for the dataset list file
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        :param fn: dataset list file name
+        :type fn: :obj:`str`
+        :param frompath: convert beamtime file from core path
+        :type frompath: :obj:`bool`
+        """
+        if fn in node.dataset_watchers.keys():
+            return
+        ifn = fn[:-(len(self.__dslist_filename))] + self.__idslist_filename
+        if self.__var_dir:
+            ifn = "%s%s" % (self.__var_dir, ifn)
+        ipath, _ = os.path.split(ifn)
+        if not os.path.isdir(ipath):
+            os.makedirs(ipath, exist_ok=True)
+        btfile = self.__conv.from_core(self.__btfile) \
+            if frompath else self.__btfile
+        dw = node.dataset_watchers[fn] = DatasetWatcher(
+            self.__config, node.path, fn, ifn, self.__meta, btfile)
+        get_logger().info(
+            'ScanDirWatcher: Creating DatasetWatcher %s' % fn)
+        dw.start()
+
+    def _launch_children(self, node, paths):
+        """ adds child nodes of the given subdirectories
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        :param path: list of subdirectories
+        :type path: :obj:`list`<:obj:`str`>
+        """
+        if node.depth != 0:
+            for path in sorted(paths):
+                if self.__conv.from_core(path) in self.__scandir_blacklist or \
+                   self.__conv.to_core(path) in self.__scandir_blacklist:
+                    continue
+                if path in node.children.keys():
+                    continue
+                try:
+                    child = node.children[path] = ScanDirNode(
+                        path, node.depth - 1, node)
+                    get_logger().info(
+                        'ScanDirWatcher: Create ScanDirWatcher %s %s'
+                        % (path, self.__btfile))
+                    self._start_node(child)
+                except Exception as e:
+                    get_logger().warning(
+                        "%s cannot be watched: %s" % (path, str(e)))
+
+    def _stop_node(self, node):
+        """ stops watching the node directory and its subdirectories
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        """
+        if node.qid is not None:
+            self.__qid_to_node.pop(node.qid, None)
+            try:
+                self.__notifier.rm_watch(node.qid)
+            except Exception as e:
+                get_logger().debug(
+                    'ScanDirWatcher: remove %s' % str(e))
+            get_logger().info(
+                'ScanDirWatcher: '
+                'Removing watch %s: %s' % (str(node.qid), node.path))
+            node.qid = None
+        for fn, dw in node.dataset_watchers.items():
+            get_logger().info(
+                'ScanDirWatcher: Stopping DatasetWatcher %s' % (fn))
+            dw.running = False
+            self.__stopped.append(dw)
+        node.dataset_watchers = {}
+        self._stop_children(node)
+
+    def _join_stopped(self):
+        """ waits for the stopped dataset watchers without the tree lock
+        """
+        with self.__tree_lock:
+            stopped = self.__stopped
+            self.__stopped = []
+        for dw in stopped:
+            dw.join()
+
+    def _stop_children(self, node):
+        """ stops watching subdirectories of the node
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        """
+        children = node.children
+        node.children = {}
+        for child in children.values():
+            get_logger().info('ScanDirWatcher: '
+                              'Stopping ScanDirWatcher %s' % (self.__btfile))
+            self._stop_node(child)
+
+    def _dispatch(self, node, event):
+        """ handles the event of the node directory
+
+        :param node: scan dir node
+        :type node: :class:`ScanDirNode`
+        :param event: notifier event
+        :type event: :class:`scingestor.safeINotifier.EventData`
+        """
+        get_logger().debug(
+            'Sd: %s %s %s %s', node.qid, event.name, event, node.path)
+        dslist = self._dslist_fullname(node)
+        if event.mask & inotifyx.IN_Q_OVERFLOW:
+            # events may be lost
+            get_logger().debug('ScanDirWatcher: Resync %s' % node.path)
+            if os.path.isfile(dslist):
+                self._launch_dataset_watcher(node, dslist, True)
+            if os.path.isdir(node.path) and (
+                    self.__watchscandirsubdir or not os.path.isfile(dslist)):
+                self._launch_children(node, self._subdirs(node))
+        elif self.__watchscandirsubdir and \
+                event.mask & inotifyx.IN_ISDIR and \
+                event.mask & inotifyx.IN_CREATE:
+            npath = os.path.join(node.path, event.name)
+            self._launch_children(node, [npath])
+        elif event.mask & (
+                inotifyx.IN_IGNORED | inotifyx.IN_DELETE |
+                inotifyx.IN_MOVED_FROM | inotifyx.IN_MOVE_SELF):
+            # path/file does not exist anymore (moved/deleted)
+            if event.name is not None:
+                npath = os.path.join(node.path, event.name)
+                get_logger().debug("Remove path/file %s" % npath)
+                child = node.children.pop(npath, None) \
+                    if event.mask & inotifyx.IN_ISDIR else None
+                if child is not None:
+                    get_logger().info(
+                        'ScanDirWatcher: '
+                        'Stopping ScanDirWatcher %s' % (self.__btfile))
+                    self._stop_node(child)
+                elif dslist == npath and not os.path.isfile(dslist) \
+                        and os.path.isdir(node.path):
+                    subdirs = self._subdirs(node)
+                    get_logger().debug(
+                        "Sub-directories: %s" % str(subdirs))
+                    self._launch_children(node, subdirs)
+                    get_logger().debug(
+                        "watcher for subdirectories launched")
+        elif not event.mask & inotifyx.IN_ISDIR and \
+                event.mask & inotifyx.IN_CREATE:
+            fn = os.path.join(node.path, event.name)
+            if fn == dslist:
+                self._launch_dataset_watcher(node, fn)
+            if not self.__watchscandirsubdir:
+                self._stop_children(node)
+        elif event.mask & inotifyx.IN_ISDIR and \
+                event.mask & inotifyx.IN_CREATE:
+            if not os.path.isfile(dslist):
+                npath = os.path.join(node.path, event.name)
+                self._launch_children(node, [npath])
+
+    def run(self):
+        """ scandir dispatcher thread
+        """
+        try:
+            self.__notifier = get_notifier(self.__config)
+            with self.__tree_lock:
+                self.__root = ScanDirNode(self.__path, self.__depth)
+                self._start_node(self.__root)
+
+            while self.running:
+                get_logger().debug('Dt Tac')
+                try:
+                    event = self.__queue.get(
+                        block=True, timeout=self.__timeout)
+                except queue.Empty:
+                    continue
+                with self.__tree_lock:
+                    if not self.running:
+                        break
+                    node = self.__qid_to_node.get(event.qid)
+                    if node is not None:
+                        self._dispatch(node, event)
+                self._join_stopped()
+        finally:
+            get_logger().debug("Stopping ScanDirWatcher")
+            self.stop()
+
+    def stop(self):
+        """ stop the dispatcher
+        """
+        get_logger().debug("Stop ScanDirWatcher")
+        self.running = False
+        with self.__tree_lock:
+            if self.__root is not None:
+                self._stop_node(self.__root)
+        self._join_stopped()
@@ -23,7 +23,7 @@ import socket
 import pathlib
 
 from .datasetWatcher import DatasetWatcher
-from .safeINotifier import SafeINotifier
+from .pollingNotifier import get_notifier
 from .pathConverter import PathConverter
 from .logger import get_logger
 
@@ -177,7 +177,7 @@ class ScanDirWatcher(threading.Thread):
         :param path: beamtime file subdirectory
         :type path: :obj:`str`
         """
-        self.__notifier = SafeINotifier()
+        self.__notifier = get_notifier(self.__config)
         self._add_path(path)
 
     def _add_path(self, path):
@@ -189,11 +189,8 @@ class ScanDirWatcher(threading.Thread):
         try:
             wqueue, watch_descriptor = self.__notifier.add_watch(
                 self.__conv.from_core(path),
-                inotifyx.IN_ALL_EVENTS |
-                inotifyx.IN_CLOSE_WRITE | inotifyx.IN_DELETE |
-                inotifyx.IN_MOVE_SELF |
-                inotifyx.IN_ALL_EVENTS |
-                inotifyx.IN_MOVED_TO | inotifyx.IN_MOVED_FROM)
+                inotifyx.IN_CREATE | inotifyx.IN_DELETE |
+                inotifyx.IN_MOVE_SELF)
             self.__wd_to_path[watch_descriptor] = path
             self.__wd_to_queue[watch_descriptor] = wqueue
             get_logger().info('ScanDirWatcher: Adding watch %s: %s'
@@ -247,6 +244,40 @@ class ScanDirWatcher(threading.Thread):
                     get_logger().warning(
                         "%s cannot be watched: %s" % (path, str(e)))
 
+    def _scan(self):
+        """ launches watchers of the dataset list file and subdirectories
+        which are not watched yet
+        """
+        if os.path.isfile(self.__dslist_fullname):
+            dw = None
+            with self.__dataset_lock:
+                fn = self.__dslist_fullname
+                if fn not in self.__dataset_watchers.keys():
+                    ifn = fn[:-(len(self.__dslist_filename))] + \
+                        self.__idslist_filename
+                    if self.__var_dir:
+                        ifn = "%s%s" % (self.__var_dir, ifn)
+                    ipath, _ = os.path.split(ifn)
+                    if not os.path.isdir(ipath):
+                        os.makedirs(ipath, exist_ok=True)
+                    dw = self.__dataset_watchers[fn] = DatasetWatcher(
+                        self.__config,
+                        self.__path,
+                        fn, ifn, self.__meta,
+                        self.__conv.from_core(self.__btfile))
+                    get_logger().info(
+                        'ScanDirWatcher: Creating DatasetWatcher %s' % fn)
+            if dw is not None:
+                dw.start()
+                # get_logger().info(str(btmd))
+
+        if os.path.isdir(self.__path) and (
+                self.__watchscandirsubdir or not
+                os.path.isfile(self.__dslist_fullname)):
+            subdirs = [it.path for it in os.scandir(self.__path)
+                       if it.is_dir()]
+            self._launch_scandir_watcher(subdirs)
+
     def run(self):
         """ scandir watcher thread
         """
@@ -255,35 +286,7 @@ class ScanDirWatcher(threading.Thread):
             # get_logger().info("START %s " % (self.__notifier))
 
             get_logger().debug("ScanDir file:  %s " % (self.__dslist_fullname))
-            if os.path.isfile(self.__dslist_fullname):
-                dw = None
-                with self.__dataset_lock:
-                    fn = self.__dslist_fullname
-                    if fn not in self.__dataset_watchers.keys():
-                        ifn = fn[:-(len(self.__dslist_filename))] + \
-                            self.__idslist_filename
-                        if self.__var_dir:
-                            ifn = "%s%s" % (self.__var_dir, ifn)
-                        ipath, _ = os.path.split(ifn)
-                        if not os.path.isdir(ipath):
-                            os.makedirs(ipath, exist_ok=True)
-                        dw = self.__dataset_watchers[fn] = DatasetWatcher(
-                            self.__config,
-                            self.__path,
-                            fn, ifn, self.__meta,
-                            self.__conv.from_core(self.__btfile))
-                        get_logger().info(
-                            'ScanDirWatcher: Creating DatasetWatcher %s' % fn)
-                if dw is not None:
-                    dw.start()
-                    # get_logger().info(str(btmd))
-
-            if os.path.isdir(self.__path) and (
-                    self.__watchscandirsubdir or not
-                    os.path.isfile(self.__dslist_fullname)):
-                subdirs = [it.path for it in os.scandir(self.__path)
-                           if it.is_dir()]
-                self._launch_scandir_watcher(subdirs)
+            self._scan()
 
             while self.running:
                 get_logger().debug('Dt Tac')
@@ -297,22 +300,26 @@ class ScanDirWatcher(threading.Thread):
                         break
                     if qid in self.__wd_to_path.keys():
                         get_logger().debug(
-                            'Sd: %s %s %s %s' % (qid,
-                                                 event.name,
-                                                 event.masks,
-                                                 self.__wd_to_path[qid]))
-                        masks = event.masks.split("|")
-                        if self.__watchscandirsubdir and \
-                                "IN_ISDIR" in masks and (
-                                "IN_CREATE" in masks
-                                or "IN_MOVE_TO" in masks):
+                            'Sd: %s %s %s %s', qid, event.name, event,
+                            self.__wd_to_path[qid])
+                        if event.mask & inotifyx.IN_Q_OVERFLOW:
+                            # events may be lost
+                            get_logger().debug(
+                                'ScanDirWatcher: Resync %s' % self.__path)
+                            try:
+                                self._scan()
+                            except Exception as e:
+                                get_logger().warning(
+                                    '%s: %s' % (self.__path, str(e)))
+                        elif self.__watchscandirsubdir and \
+                                event.mask & inotifyx.IN_ISDIR and \
+                                event.mask & inotifyx.IN_CREATE:
                             npath = os.path.join(
                                 self.__wd_to_path[qid], event.name)
                             self._launch_scandir_watcher([npath])
-                        elif "IN_IGNORED" in masks or \
-                                "IN_MOVE_FROM" in masks or \
-                                "IN_DELETE" in masks or \
-                                "IN_MOVE_SELF" in masks:
+                        elif event.mask & (
+                                inotifyx.IN_IGNORED | inotifyx.IN_DELETE |
+                                inotifyx.IN_MOVE_SELF):
                             # path/file does not exist anymore
                             #     (moved/deleted)
                             if event.name is not None:
@@ -333,8 +340,8 @@ class ScanDirWatcher(threading.Thread):
                                     get_logger().debug(
                                         "watcher for subdirectories launched")
 
-                        elif "IN_ISDIR" not in masks and (
-                                "IN_CREATE" in masks or "IN_MOVE_TO" in masks):
+                        elif not event.mask & inotifyx.IN_ISDIR and \
+                                event.mask & inotifyx.IN_CREATE:
                             fn = os.path.join(
                                 self.__wd_to_path[qid], event.name)
                             dw = None
@@ -376,9 +383,8 @@ class ScanDirWatcher(threading.Thread):
                                     ds = dds.pop()
                                     ds.join()
 
-                        elif "IN_ISDIR" in masks and (
-                                "IN_CREATE" in masks
-                                or "IN_MOVE_TO" in masks):
+                        elif event.mask & inotifyx.IN_ISDIR and \
+                                event.mask & inotifyx.IN_CREATE:
                             if not os.path.isfile(self.__dslist_fullname):
                                 npath = os.path.join(
                                     self.__wd_to_path[qid], event.name)
@@ -0,0 +1,181 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import threading
+import requests
+import requests.adapters
+
+from .logger import get_logger
+
+
+class SciCatSession:
+    """ singleton pooled http session for SciCat requests
+
+    All threads share one connection pool, i.e. keep-alive connections
+    are reused between requests. Every thread gets its own
+    :class:`requests.Session` mounted on the shared adapter.
+    """
+
+    #: (:class:`SciCatSession`) singleton session instance
+    _session = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._session:
+                cls._session = super(SciCatSession, cls).__new__(cls)
+                cls._session.init()
+        return cls._session
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:obj:`int`) number of cached host connection pools
+        self.pool_connections = 10
+        #: (:obj:`int`) maximal number of connections per host
+        self.pool_maxsize = 10
+        #: (:obj:`bool`) block when no free connection in the host pool
+        self.pool_block = False
+
+        #: (:class:`threading.Lock`) adapter lock
+        self.__adapter_lock = threading.Lock()
+        #: (:class:`requests.adapters.HTTPAdapter`) shared http adapter
+        self.__adapter = None
+        #: (:obj:`int`) adapter generation
+        self.__generation = 0
+        #: (:class:`threading.local`) thread local sessions
+        self.__local = threading.local()
+
+    def configure(self, configuration):
+        """ set pool parameters from the ingestor configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        connections = self.pool_connections
+        maxsize = self.pool_maxsize
+        block = self.pool_block
+        if "request_pool_connections" in config.keys():
+            try:
+                connections = int(config["request_pool_connections"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        if "request_pool_maxsize" in config.keys():
+            try:
+                maxsize = int(config["request_pool_maxsize"])
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+        if "request_pool_block" in config.keys():
+            block = bool(config["request_pool_block"])
+
+        with self.__adapter_lock:
+            if (connections, maxsize, block) != (
+                    self.pool_connections, self.pool_maxsize,
+                    self.pool_block):
+                self.pool_connections = connections
+                self.pool_maxsize = maxsize
+                self.pool_block = block
+                if self.__adapter is not None:
+                    self.__adapter.close()
+                self.__adapter = None
+                self.__generation += 1
+
+    def _adapter(self):
+        """ provides the shared http adapter
+
+        :returns: shared http adapter and its generation
+        :rtype: [:class:`requests.adapters.HTTPAdapter`, :obj:`int`]
+        """
+        with self.__adapter_lock:
+            if self.__adapter is None:
+                self.__adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block)
+            return self.__adapter, self.__generation
+
+    def session(self):
+        """ provides the session of the current thread
+
+        :returns: http session
+        :rtype: :class:`requests.Session`
+        """
+        adapter, generation = self._adapter()
+        session = getattr(self.__local, "session", None)
+        if session is None or self.__local.generation != generation:
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.__local.session = session
+            self.__local.generation = generation
+        return session
+
+    def get(self, url, **kwargs):
+        """ sends a GET request
+
+        :param url: request url
+        :type url: :obj:`str`
+        :returns: response
+        :rtype: :class:`requests.Response`
+        """
+        return self.session().get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ sends a POST request
+
+        :param url: request url
+        :type url: :obj:`str`
+        :returns: response
+        :rtype: :class:`requests.Response`
+        """
+        return self.session().post(url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        """ sends a PATCH request
+
+        :param url: request url
+        :type url: :obj:`str`
+        :returns: response
+        :rtype: :class:`requests.Response`
+        """
+        return self.session().patch(url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """ sends a DELETE request
+
+        :param url: request url
+        :type url: :obj:`str`
+        :returns: response
+        :rtype: :class:`requests.Response`
+        """
+        return self.session().delete(url, **kwargs)
+
+    def close(self):
+        """ closes pooled connections
+        """
+        with self.__adapter_lock:
+            if self.__adapter is not None:
+                self.__adapter.close()
+            self.__adapter = None
+            self.__generation += 1
@@ -0,0 +1,347 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import sqlite3
+import threading
+
+from .logger import get_logger
+
+
+class StateStore:
+    """ ingestion state store in a SQLite database
+
+    Every ingested scan has one record with modification times of
+    its dataset, origdatablock and attachment metadata, its dataset pid
+    and the last ingestion error. The records are keyed by beamtime id,
+    ingested dataset list file and scan name. Each record also keeps
+    the modification times of the most successful ingestion of the scan,
+    so a scan stays ingested if any of its ingestions succeeded.
+
+    Stores shared by ingestors are opened with :meth:`StateStore.open`
+    and closed with :meth:`StateStore.release`.
+    """
+
+    #: (:obj:`dict` <:obj:`str`, :class:`StateStore`>)
+    #:    open shared stores of database files
+    _stores = {}
+    #: (:class:`threading.Lock`) shared store lock
+    _lock = threading.Lock()
+
+    #: (:obj:`str`) database schema
+    schema = (
+        "CREATE TABLE IF NOT EXISTS ingested ("
+        "beamtime TEXT NOT NULL, "
+        "listfile TEXT NOT NULL, "
+        "scan TEXT NOT NULL, "
+        "dataset REAL, "
+        "datablock REAL, "
+        "attachment REAL, "
+        "pid TEXT, "
+        "error TEXT, "
+        "rank INTEGER NOT NULL DEFAULT 0, "
+        "best_dataset REAL, "
+        "best_datablock REAL, "
+        "best_attachment REAL, "
+        "PRIMARY KEY (beamtime, listfile, scan))"
+    )
+
+    def __init__(self, filename, batch_size=100, timeout=30.0):
+        """ constructor
+
+        :param filename: database file name
+        :type filename: :obj:`str`
+        :param batch_size: number of updates in one transaction
+        :type batch_size: :obj:`int`
+        :param timeout: timeout for a locked database in s
+        :type timeout: :obj:`float`
+        """
+        #: (:obj:`str`) database file name
+        self.filename = filename
+        #: (:obj:`int`) number of updates in one transaction
+        self.batch_size = max(int(batch_size), 1)
+
+        #: (:class:`threading.Lock`) connection lock
+        self.__lock = threading.Lock()
+        #: (:obj:`int`) number of uncommitted updates
+        self.__pending = 0
+        #: (:obj:`int`) number of ingestors sharing the store
+        self.__users = 0
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        #: (:class:`sqlite3.Connection`) database connection
+        self.__db = sqlite3.connect(
+            filename, timeout=timeout, check_same_thread=False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute(self.schema)
+        self.__db.commit()
+
+    @classmethod
+    def open(cls, filename, batch_size=100, timeout=30.0):
+        """ opens a store shared by all users of the database file
+
+        :param filename: database file name
+        :type filename: :obj:`str`
+        :param batch_size: number of updates in one transaction
+        :type batch_size: :obj:`int`
+        :param timeout: timeout for a locked database in s
+        :type timeout: :obj:`float`
+        :returns: shared state store
+        :rtype: :class:`StateStore`
+        """
+        key = os.path.abspath(filename)
+        with cls._lock:
+            store = cls._stores.get(key)
+            # a removed database file is created again
+            if store is None or not os.path.isfile(key):
+                store = cls(filename, batch_size, timeout)
+                cls._stores[key] = store
+            store.__users += 1
+        return store
+
+    def release(self):
+        """ releases a shared store and closes it after its last user
+        """
+        key = os.path.abspath(self.filename)
+        with self._lock:
+            self.__users -= 1
+            if self.__users > 0:
+                return
+            if self._stores.get(key) is self:
+                self._stores.pop(key)
+        self.close()
+
+    @staticmethod
+    def rank(dataset, datablock, attachment):
+        """ provides a rank of ingestion success
+
+        :param dataset: dataset metadata modification time
+        :type dataset: :obj:`float`
+        :param datablock: origdatablock metadata modification time
+        :type datablock: :obj:`float`
+        :param attachment: attachment metadata modification time
+        :type attachment: :obj:`float`
+        :returns: 3 if all documents were ingested, 2 if the attachment
+                  was skipped, 1 for failed ingestion, 0 without times
+        :rtype: :obj:`int`
+        """
+        if dataset is None or datablock is None or attachment is None:
+            return 0
+        if dataset > 0 and datablock > 0:
+            if attachment > 0:
+                return 3
+            if attachment != -1:
+                return 2
+        return 1
+
+    def update(self, beamtime, listfile, scan, dataset, datablock,
+               attachment, pid=None, error=None):
+        """ updates a scan record
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :param dataset: dataset metadata modification time
+        :type dataset: :obj:`float`
+        :param datablock: origdatablock metadata modification time
+        :type datablock: :obj:`float`
+        :param attachment: attachment metadata modification time
+        :type attachment: :obj:`float`
+        :param pid: dataset pid, the previous pid is kept if None
+        :type pid: :obj:`str`
+        :param error: last ingestion error
+        :type error: :obj:`str`
+        """
+        rank = self.rank(dataset, datablock, attachment)
+        with self.__lock:
+            self.__db.execute(
+                "INSERT INTO ingested (beamtime, listfile, scan, dataset, "
+                "datablock, attachment, pid, error, rank, best_dataset, "
+                "best_datablock, best_attachment) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (beamtime, listfile, scan) DO UPDATE SET "
+                "dataset = excluded.dataset, "
+                "datablock = excluded.datablock, "
+                "attachment = excluded.attachment, "
+                "pid = COALESCE(excluded.pid, ingested.pid), "
+                "error = excluded.error, "
+                "best_dataset = CASE WHEN excluded.rank >= ingested.rank "
+                "THEN excluded.best_dataset ELSE ingested.best_dataset END, "
+                "best_datablock = CASE WHEN excluded.rank >= ingested.rank "
+                "THEN excluded.best_datablock "
+                "ELSE ingested.best_datablock END, "
+                "best_attachment = CASE WHEN excluded.rank >= ingested.rank "
+                "THEN excluded.best_attachment "
+                "ELSE ingested.best_attachment END, "
+                "rank = MAX(excluded.rank, ingested.rank)",
+                (str(beamtime), listfile, scan, dataset, datablock,
+                 attachment, pid, error, rank, dataset, datablock,
+                 attachment))
+            self.__pending += 1
+            if self.__pending >= self.batch_size:
+                self._commit()
+
+    def get(self, beamtime, listfile, scan):
+        """ provides a scan record
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :param scan: scan name
+        :type scan: :obj:`str`
+        :returns: dataset, origdatablock and attachment modification times,
+                  dataset pid and the last error or None
+        :rtype: (:obj:`float`, :obj:`float`, :obj:`float`,
+                 :obj:`str`, :obj:`str`)
+        """
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT dataset, datablock, attachment, pid, error "
+                "FROM ingested WHERE beamtime = ? AND listfile = ? "
+                "AND scan = ?",
+                (str(beamtime), listfile, scan)).fetchone()
+
+    def records(self, beamtime, listfile):
+        """ provides scan records in the ingested dataset list format
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :returns: split lines of the ingested dataset list, the record
+                  of the most successful ingestion precedes the last one
+        :rtype: :obj:`list` <:obj:`list` <:obj:`str`>>
+        """
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT scan, dataset, datablock, attachment, rank, "
+                "best_dataset, best_datablock, best_attachment "
+                "FROM ingested WHERE beamtime = ? AND listfile = ? "
+                "ORDER BY rowid",
+                (str(beamtime), listfile)).fetchall()
+        records = []
+        for scan, dataset, datablock, attachment, rank, \
+                bdataset, bdatablock, battachment in rows:
+            if rank > self.rank(dataset, datablock, attachment):
+                records.append(
+                    scan.split(" ") +
+                    [str(bdataset), str(bdatablock), str(battachment)])
+            record = scan.split(" ")
+            if dataset is not None:
+                record.extend(
+                    [str(dataset), str(datablock), str(attachment)])
+            records.append(record)
+        return records
+
+    def import_list(self, beamtime, listfile, filename=None):
+        """ imports scan records from an ingested dataset list
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :param filename: file to import, listfile if None
+        :type filename: :obj:`str`
+        :returns: number of imported lines
+        :rtype: :obj:`int`
+        """
+        with open(filename or listfile, "r") as fl:
+            lines = [sc.strip().split(" ")
+                     for sc in fl.read().split("\n") if sc.strip()]
+        for sc in lines:
+            if len(sc) > 3:
+                scan = " ".join(sc[:-3])
+                try:
+                    mtms = [float(sc[-3]), float(sc[-2]), float(sc[-1])]
+                except Exception as e:
+                    get_logger().debug("%s" % str(e))
+                    # an unparsable record counts as a failed ingestion
+                    if self.get(beamtime, listfile, scan) is None:
+                        self.update(beamtime, listfile, scan, -1, -1, -1)
+                    continue
+                self.update(beamtime, listfile, scan, *mtms)
+            else:
+                self.update(beamtime, listfile, sc[0], None, None, None)
+        self.flush()
+        return len(lines)
+
+    def export_list(self, beamtime, listfile, filename=None):
+        """ exports scan records to an ingested dataset list
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :param filename: file to export, listfile if None
+        :type filename: :obj:`str`
+        :returns: number of exported lines
+        :rtype: :obj:`int`
+        """
+        self.flush()
+        records = self.records(beamtime, listfile)
+        filename = filename or listfile
+        tmpname = "%s.%s.tmp" % (filename, os.getpid())
+        with open(tmpname, "w") as fl:
+            for sc in records:
+                fl.write("%s\n" % " ".join(sc))
+        os.replace(tmpname, filename)
+        return len(records)
+
+    def size(self, beamtime, listfile):
+        """ provides a number of scan records
+
+        :param beamtime: beamtime id
+        :type beamtime: :obj:`str`
+        :param listfile: ingested dataset list file
+        :type listfile: :obj:`str`
+        :returns: number of scan records
+        :rtype: :obj:`int`
+        """
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT COUNT(*) FROM ingested "
+                "WHERE beamtime = ? AND listfile = ?",
+                (str(beamtime), listfile)).fetchone()[0]
+
+    def flush(self):
+        """ commits pending updates
+        """
+        with self.__lock:
+            self._commit()
+
+    def close(self):
+        """ commits pending updates and closes the database
+        """
+        with self.__lock:
+            self._commit()
+            self.__db.close()
+
+    def _commit(self):
+        """ commits pending updates without the lock
+        """
+        if self.__pending:
+            self.__db.commit()
+            self.__pending = 0
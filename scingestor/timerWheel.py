@@ -0,0 +1,242 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import math
+import time
+import random
+import threading
+
+from .logger import get_logger
+
+
+class PeriodicTimer:
+    """ periodic timer of the timer wheel """
+
+    __slots__ = ("period", "callback", "nominal", "due")
+
+    def __init__(self, period, callback, nominal):
+        """ constructor
+
+        :param period: timer period in s
+        :type period: :obj:`float`
+        :param callback: function called without arguments
+        :type callback: :obj:`instancemethod`
+        :param nominal: monotonic time of the first call without jitter
+        :type nominal: :obj:`float`
+        """
+        #: (:obj:`float`) timer period in s
+        self.period = period
+        #: (:obj:`instancemethod`) function called without arguments
+        self.callback = callback
+        #: (:obj:`float`) monotonic time of the next call without jitter
+        self.nominal = nominal
+        #: (:obj:`float`) monotonic time of the next call
+        self.due = nominal
+
+
+class TimerWheel:
+    """ singleton hashed timer wheel calling periodic callbacks
+    at monotonic time intervals
+
+    Every timer starts with a random phase and each call is shifted
+    by a random jitter so calls of timers with the same period
+    are spread in time. The jitter does not accumulate.
+    Callbacks are called from the wheel thread and should only pass
+    the work to their owners, e.g. by setting a flag.
+    """
+
+    #: (:class:`TimerWheel`) singleton timer wheel instance
+    _wheel = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._wheel or not cls._wheel.running:
+                cls._wheel = super(TimerWheel, cls).__new__(cls)
+                cls._wheel.init()
+        return cls._wheel
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:obj:`bool`) running flag
+        self.running = True
+        #: (:obj:`float`) wheel tick in s
+        self.tick = 0.1
+        #: (:obj:`int`) number of wheel slots
+        self.size = 512
+        #: (:obj:`float`) jitter as a fraction of the timer period
+        self.jitter = 0.1
+
+        #: (:class:`threading.Condition`) wheel condition
+        self.__condition = threading.Condition()
+        #: (:obj:`list` <:obj:`set` <:obj:`int`>>) timer ids of slots
+        self.__slots = [set() for _ in range(self.size)]
+        #: (:obj:`dict` <:obj:`int`, :class:`PeriodicTimer`>) timers
+        self.__timers = {}
+        #: (:obj:`dict` <:obj:`int`, :obj:`int`>) slots of timer ids
+        self.__timer_slot = {}
+        #: (:obj:`int`) timer counter
+        self.__counter = 0
+        #: (:obj:`int`) last processed tick
+        self.__current = int(time.monotonic() / self.tick)
+        #: (:class:`threading.Thread`) wheel thread
+        self.__thread = None
+
+    def configure(self, configuration):
+        """ sets the jitter from the configuration
+
+        :param configuration: dictionary with the ingestor configuration
+        :type configuration: :obj:`dict` <:obj:`str`, `any`>
+        """
+        config = configuration or {}
+        if "recheck_jitter" in config.keys():
+            try:
+                self.jitter = min(max(float(config["recheck_jitter"]), 0.), 1.)
+            except Exception as e:
+                get_logger().warning('%s' % (str(e)))
+
+    def add(self, period, callback):
+        """ adds a periodic timer
+
+        :param period: timer period in s
+        :type period: :obj:`float`
+        :param callback: function called without arguments
+        :type callback: :obj:`instancemethod`
+        :returns: timer id
+        :rtype: :obj:`int`
+        """
+        period = max(float(period), self.tick)
+        timer = PeriodicTimer(
+            period, callback, time.monotonic() + random.uniform(0, period))
+        with self.__condition:
+            self.__counter += 1
+            tid = self.__counter
+            self.__timers[tid] = timer
+            self._insert(tid, timer)
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(
+                    target=self._run, daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+        return tid
+
+    def cancel(self, tid):
+        """ removes a periodic timer
+
+        :param tid: timer id
+        :type tid: :obj:`int`
+        :returns: True if the timer was removed
+        :rtype: :obj:`bool`
+        """
+        with self.__condition:
+            if tid not in self.__timers:
+                return False
+            self.__timers.pop(tid)
+            self.__slots[self.__timer_slot.pop(tid)].discard(tid)
+            return True
+
+    def stop(self):
+        """ stops the timer wheel
+        """
+        with self.__condition:
+            self.running = False
+            self.__condition.notify_all()
+
+    def _insert(self, tid, timer):
+        """ puts the timer into the slot of its due time,
+        called with the lock
+
+        :param tid: timer id
+        :type tid: :obj:`int`
+        :param timer: periodic timer
+        :type timer: :class:`PeriodicTimer`
+        """
+        slot = max(self._ticks(timer.due), self.__current + 1) % self.size
+        self.__slots[slot].add(tid)
+        self.__timer_slot[tid] = slot
+
+    def _ticks(self, due):
+        """ provides the first tick not before the due time
+
+        :param due: monotonic time
+        :type due: :obj:`float`
+        :returns: wheel tick
+        :rtype: :obj:`int`
+        """
+        return int(math.ceil(due / self.tick))
+
+    def _expired(self, now):
+        """ takes expired timers and schedules their next calls,
+        called with the lock
+
+        :param now: monotonic time
+        :type now: :obj:`float`
+        :returns: callbacks of expired timers
+        :rtype: :obj:`list` <:obj:`instancemethod`>
+        """
+        ticks = int(now / self.tick)
+        expired = []
+        # after a long pause every slot is checked once
+        start = max(self.__current + 1, ticks - self.size + 1)
+        for tk in range(start, ticks + 1):
+            slot = self.__slots[tk % self.size]
+            tids = [tid for tid in slot
+                    if self._ticks(self.__timers[tid].due) <= ticks]
+            slot.difference_update(tids)
+            expired.extend(tids)
+        self.__current = ticks
+        callbacks = []
+        for tid in expired:
+            timer = self.__timers[tid]
+            callbacks.append(timer.callback)
+            timer.nominal += timer.period
+            if timer.nominal <= now:
+                # missed calls are skipped
+                timer.nominal = now + timer.period
+            timer.due = timer.nominal + timer.period * self.jitter \
+                * random.uniform(-0.5, 0.5)
+            self._insert(tid, timer)
+        return callbacks
+
+    def _run(self):
+        """ wheel thread
+        """
+        while self.running:
+            with self.__condition:
+                if not self.__timers:
+                    # no timer is scheduled until add or stop is called
+                    self.__condition.wait()
+                    continue
+                now = time.monotonic()
+                wait = (self.__current + 1) * self.tick - now
+                if wait > 0:
+                    self.__condition.wait(wait)
+                    continue
+                callbacks = self._expired(now)
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    get_logger().warning(
+                        'TimerWheel: %s' % (str(e)))
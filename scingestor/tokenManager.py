@@ -0,0 +1,272 @@
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+import os
+import json
+import time
+import threading
+
+from .sciCatSession import SciCatSession
+
+
+class TokenCredential:
+    """ cached access token of one ingestor credential
+    """
+
+    def __init__(self, tokenurl, credfile, username):
+        """ constructor
+
+        :param tokenurl: scicat login url
+        :type tokenurl: :obj:`str`
+        :param credfile: credential file name
+        :type credfile: :obj:`str`
+        :param username: default ingestor username
+        :type username: :obj:`str`
+        """
+        #: (:obj:`str`) scicat login url
+        self.tokenurl = tokenurl
+        #: (:obj:`str`) credential file
+        self.credfile = credfile
+        #: (:obj:`str`) default ingestor username
+        self.username = username
+
+        #: (:class:`threading.Lock`) credential lock
+        self.lock = threading.Lock()
+        #: (:obj:`str`) credential
+        self.incd = None
+        #: (:obj:`float`) credential file mtime
+        self.mtime = None
+        #: (:obj:`str`) cached token
+        self.token = None
+        #: (:obj:`float`) monotonic time when the cached token expires
+        self.expires = None
+        #: (:obj:`dict` <:obj:`str`, :obj:`str`>) rejected tokens
+        #:    replaced by the current token
+        self.renewed = {}
+
+
+class TokenManager:
+    """ singleton provider of SciCat access tokens
+
+    Tokens obtained from the login endpoint are cached
+    for their time-to-live and refreshed ahead of expiry.
+    The cache of a credential is invalidated when its file changes.
+    """
+
+    #: (:class:`TokenManager`) singleton manager instance
+    _manager = None
+    #: (:class:`threading.Lock`) singleton lock
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """ create a new object if it is the first one
+        """
+        with cls._lock:
+            if not cls._manager:
+                cls._manager = super(TokenManager, cls).__new__(cls)
+                cls._manager.init()
+        return cls._manager
+
+    def init(self):
+        """ constructor
+
+        """
+        #: (:class:`threading.Lock`) credential dictionary lock
+        self.__credentials_lock = threading.Lock()
+        #: (:obj:`dict` <(:obj:`str`, :obj:`str`, :obj:`str`),
+        #:    :class:`TokenCredential`>) credentials
+        self.__credentials = {}
+
+    def credential(self, tokenurl, credfile, username):
+        """ provides the credential object
+
+        :param tokenurl: scicat login url
+        :type tokenurl: :obj:`str`
+        :param credfile: credential file name
+        :type credfile: :obj:`str`
+        :param username: default ingestor username
+        :type username: :obj:`str`
+        :returns: credential object
+        :rtype: :class:`TokenCredential`
+        """
+        key = (tokenurl, credfile, username)
+        with self.__credentials_lock:
+            if key not in self.__credentials:
+                self.__credentials[key] = TokenCredential(
+                    tokenurl, credfile, username)
+            return self.__credentials[key]
+
+    def clear(self):
+        """ removes all cached tokens
+        """
+        with self.__credentials_lock:
+            self.__credentials = {}
+
+    def get_token(self, credential, headers, ttl=None, margin=60.0):
+        """ provides a valid token
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        :param headers: login request headers
+        :type headers: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :param ttl: token time-to-live in s,
+                    if None the server value is taken,
+                    if 0 tokens are not cached
+        :type ttl: :obj:`float`
+        :param margin: time in s to refresh a token before its expiry
+        :type margin: :obj:`float`
+        :returns: ingestor token
+        :rtype: :obj:`str`
+        """
+        with credential.lock:
+            self._read_credential(credential)
+            if credential.token is not None and \
+               credential.expires is not None and \
+               time.monotonic() < credential.expires:
+                return credential.token
+            return self._login(credential, headers, ttl, margin)
+
+    def refresh_token(self, credential, token, headers,
+                      ttl=None, margin=60.0):
+        """ provides a new token after the given token was rejected
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        :param token: rejected token
+        :type token: :obj:`str`
+        :param headers: login request headers
+        :type headers: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :param ttl: token time-to-live in s
+        :type ttl: :obj:`float`
+        :param margin: time in s to refresh a token before its expiry
+        :type margin: :obj:`float`
+        :returns: ingestor token
+        :rtype: :obj:`str`
+        """
+        with credential.lock:
+            if token in credential.renewed:
+                return credential.renewed[token]
+            self._read_credential(credential)
+            if credential.token is not None and credential.token != token \
+               and credential.expires is not None \
+               and time.monotonic() < credential.expires:
+                ntoken = credential.token
+            else:
+                credential.token = None
+                ntoken = self._login(credential, headers, ttl, margin)
+            if ntoken and ntoken != token:
+                # only replacements of the current token are kept
+                credential.renewed = dict(
+                    (tk, ntk) for tk, ntk in credential.renewed.items()
+                    if ntk == ntoken)
+                credential.renewed[token] = ntoken
+            return ntoken
+
+    def current_token(self, credential, token):
+        """ provides a token which replaced the given token
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        :param token: ingestor token
+        :type token: :obj:`str`
+        :returns: ingestor token
+        :rtype: :obj:`str`
+        """
+        with credential.lock:
+            tokens = set()
+            while token in credential.renewed and token not in tokens:
+                tokens.add(token)
+                token = credential.renewed[token]
+        return token
+
+    def read_credential(self, credential):
+        """ reads the credential file if it was changed
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        """
+        with credential.lock:
+            self._read_credential(credential)
+
+    def _read_credential(self, credential):
+        """ reads the credential file if it was changed without locking
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        """
+        mtime = os.stat(credential.credfile)[8]
+        if credential.mtime != mtime:
+            with open(credential.credfile) as fl:
+                credential.incd = fl.read().strip()
+            credential.mtime = mtime
+            credential.token = None
+            credential.expires = None
+            credential.renewed = {}
+
+    def _login(self, credential, headers, ttl, margin):
+        """ logs in to scicat
+
+        :param credential: credential object
+        :type credential: :class:`TokenCredential`
+        :param headers: login request headers
+        :type headers: :obj:`dict` <:obj:`str`, :obj:`str`>
+        :param ttl: token time-to-live in s
+        :type ttl: :obj:`float`
+        :param margin: time in s to refresh a token before its expiry
+        :type margin: :obj:`float`
+        :returns: ingestor token
+        :rtype: :obj:`str`
+        """
+        try:
+            jincd = json.loads(credential.incd)
+            if not isinstance(jincd, dict):
+                jincd = {}
+        except Exception:
+            jincd = {}
+        if "jwt" in jincd.keys():
+            return jincd["jwt"]
+        if "id" in jincd.keys():
+            return jincd["id"]
+        password = credential.incd
+        username = credential.username
+        if "password" in jincd.keys():
+            password = jincd["password"]
+        if "username" in jincd.keys():
+            username = jincd["username"]
+        start = time.monotonic()
+        response = SciCatSession().post(
+            credential.tokenurl, headers=headers,
+            json={"username": username, "password": password})
+        if not response.ok:
+            raise Exception("%s" % response.text)
+        jresp = json.loads(response.content)
+        token = jresp["id"]
+        if ttl is None:
+            for key in ["ttl", "expires_in"]:
+                if key in jresp.keys():
+                    try:
+                        ttl = float(jresp[key])
+                    except Exception:
+                        pass
+                    break
+        credential.token = token
+        credential.expires = None
+        if ttl and ttl > 0:
+            credential.expires = start + ttl - min(margin, ttl / 2.)
+        return token
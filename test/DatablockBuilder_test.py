@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import json
+import time
+import shutil
+import subprocess
+import logging
+
+from scingestor.datablockBuilder import DatablockBuilder
+from scingestor.logger import init_logger
+
+
+# test fixture
+class DatablockBuilderTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatDatablockBuilder", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_datablock_current")
+        self.__scandir = os.path.join(self.__dirname, "raw")
+        for subdir in ["scan_00001/pilatus/sub", "scan_00001/lambda",
+                       "other"]:
+            os.makedirs(os.path.join(self.__scandir, subdir))
+        for name in ["scan_00001.fio", "scan_00001.nxs", "scan_00001~",
+                     "scan_00001.scan.json", "scan_00002.fio",
+                     "scan_00001/lambda/l.pyc", "scan_00001/pilatus/sub/s",
+                     "other/o1"]:
+            self.write(name, name)
+        for nr in range(300):
+            self.write("scan_00001/pilatus/p_%05d.cbf" % nr, "%s" % nr)
+        os.symlink(os.path.join(self.__scandir, "other"),
+                   os.path.join(self.__scandir, "scan_00001", "lnk"))
+        self.__cache = os.path.join(self.__dirname, "cache.db")
+
+    def tearDown(self):
+        DatablockBuilder().configure({"datablock_stat_cache_file": ""})
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def write(self, name, content):
+        with open(os.path.join(self.__scandir, name), "w") as fl:
+            fl.write(content)
+
+    def test_nxsfileinfo_output(self):
+        builder = DatablockBuilder()
+        builder.configure({"datablock_workers_number": 4})
+        commands = [
+            "nxsfileinfo origdatablock "
+            " -s *.pyc,*.origdatablock.json,*.scan.json,*~ "
+            " -r 'raw' -p 99001234/scan_00001 -c group1,group2 "
+            " %s/scan_00001" % self.__scandir,
+            "nxsfileinfo origdatablock -s *.pyc "
+            " -a %s/other/o1 -p 99001234/scan_00001 -w owner "
+            " %s/scan_00001 %s/scan_00002"
+            % (self.__scandir, self.__scandir, self.__scandir),
+        ]
+        for command in commands:
+            result = subprocess.run(
+                command, shell=True, text=True, capture_output=True,
+                check=True)
+            self.assertEqual(builder.run(command), result.stdout)
+            self.assertEqual(builder.run(command), result.stdout)
+        self.assertEqual(builder.run("nxsfileinfo metadata a.nxs"), None)
+        self.assertEqual(builder.run("mygenerator origdatablock a"), None)
+
+    def test_stat_cache(self):
+        builder = DatablockBuilder()
+        builder.configure({"datablock_stat_cache_file": self.__cache})
+        command = "nxsfileinfo origdatablock -s *.pyc " \
+            " -p 99001234/scan_00001 %s/scan_00001" % self.__scandir
+
+        def sizes():
+            meta = json.loads(builder.run(command))
+            return {rec["path"]: rec["size"]
+                    for rec in meta["dataFileList"]}
+
+        # status of fresh files is read again
+        self.assertEqual(sizes()["scan_00001/pilatus/p_00010.cbf"], 2)
+        time.sleep(1.2)
+        self.write("scan_00001/pilatus/p_00010.cbf", "10+")
+        self.assertEqual(sizes()["scan_00001/pilatus/p_00010.cbf"], 3)
+        time.sleep(1.2)
+        self.assertEqual(sizes()["scan_00001/pilatus/p_00010.cbf"], 3)
+
+        # settled files of unchanged directories are taken from the cache
+        self.write("scan_00001/pilatus/p_00010.cbf", "10++")
+        builder.configure({"datablock_stat_cache_file": ""})
+        builder.configure({"datablock_stat_cache_file": self.__cache})
+        result = sizes()
+        self.assertEqual(result["scan_00001/pilatus/p_00010.cbf"], 3)
+        self.assertEqual(len(result), 305)
+
+        # a new file changes the directory
+        self.write("scan_00001/pilatus/p_00300.cbf", "300")
+        result = sizes()
+        self.assertEqual(result["scan_00001/pilatus/p_00010.cbf"], 4)
+        self.assertEqual(result["scan_00001/pilatus/p_00300.cbf"], 3)
+        self.assertEqual(len(result), 306)
+
+
+if __name__ == '__main__':
+    unittest.main()
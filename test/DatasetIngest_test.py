@@ -78,11 +78,11 @@ class DatasetIngestTest(unittest.TestCase):
         self.helperror = "Error: too few arguments\n"
         self.idate = isoDate("2022-05-19 09:00:00.000000")
         self.helpshort = """usage: scicat_dataset_ingest [-h]""" \
-            """[-c CONFIG] [-l LOG] [-f LOGFILE] [-t]
+            """[-c CONFIG] [-l LOG] [-f LOGFILE] [-t] [--deep]
 scicat_dataset_ingest: error: unrecognized arguments: """
 
         self.helpinfo = """usage: scicat_dataset_ingest [-h]""" \
-            """[-c CONFIG] [-l LOG] [-f LOGFILE] [-t]
+            """[-c CONFIG] [-l LOG] [-f LOGFILE] [-t] [--deep]
 
 Re-ingestion script for SciCat Datasets.
 
@@ -95,6 +95,8 @@ optional arguments:
   -f LOGFILE, --log-file LOGFILE
                         log file name
   -t, --timestamps      timestamps in logs
+  --deep                regenerate origdatablocks of scans with unchanged
+                        directories
 
  examples:
       scicat_dataset_ingest -c ~/.scingestor.yaml
@@ -102,7 +104,7 @@ optional arguments:
 """
 
         self.helpinfo2 = """usage: scicat_dataset_ingest [-h]""" \
-            """ [-c CONFIG] [-l LOG] [-f LOGFILE] [-t]
+            """ [-c CONFIG] [-l LOG] [-f LOGFILE] [-t] [--deep]
 
 Re-ingestion script for SciCat Datasets.
 
@@ -115,6 +117,8 @@ options:
   -f, --log-file LOGFILE
                         log file name
   -t, --timestamps      timestamps in logs
+  --deep                regenerate origdatablocks of scans with unchanged
+                        directories
 
  examples:
       scicat_dataset_ingest -c ~/.scingestor.yaml
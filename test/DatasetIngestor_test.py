@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import shutil
+import time
+import json
+import threading
+import subprocess
+import logging
+
+from scingestor.datasetIngestor import DatasetIngestor
+from scingestor.logger import init_logger
+
+
+# test fixture
+class DatasetIngestorTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__meta = {
+            "beamtimeId": "99001234",
+            "proposalId": "99991173",
+            "beamline": "p00",
+        }
+        self.__path = os.path.abspath(os.path.dirname(__file__))
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatDatasetIngestor", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+
+    def tearDown(self):
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def ingestor(self, config):
+        return DatasetIngestor(
+            config, self.__path,
+            os.path.join(self.__path, "scicat-datasets-99001234.lst"),
+            os.path.join(self.__path,
+                         "scicat-ingested-datasets-99001234.lst"),
+            dict(self.__meta),
+            os.path.join(self.__path, "beamtime-metadata-99001234.json"))
+
+    def test_upload_metadata_serial(self):
+        ingestor = self.ingestor({})
+        calls = []
+
+        def ingest(metafile, pid, token):
+            calls.append((metafile, pid, token))
+            return "%s:%s" % (pid, metafile)
+
+        files = ["file1", "file2", "file3"]
+        res = ingestor._upload_metadata(ingest, files, "99001234/1", "tk")
+        self.assertEqual(calls, [])
+        self.assertEqual(next(res), ("file1", "99001234/1:file1"))
+        self.assertEqual(calls, [("file1", "99001234/1", "tk")])
+        self.assertEqual(
+            list(res),
+            [("file2", "99001234/1:file2"), ("file3", "99001234/1:file3")])
+
+    def test_upload_metadata_concurrent(self):
+        ingestor = self.ingestor({"upload_workers_number": 4})
+        threads = set()
+        lock = threading.Lock()
+
+        def ingest(metafile, pid, token):
+            with lock:
+                threads.add(threading.get_ident())
+            time.sleep(0.2)
+            return "" if metafile == "file2" else pid
+
+        files = ["file1", "file2", "file3", "file4"]
+        start = time.time()
+        res = list(
+            ingestor._upload_metadata(ingest, files, "99001234/1", "tk"))
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertTrue(len(threads) > 1)
+        self.assertEqual(
+            res,
+            [("file1", "99001234/1"), ("file2", ""),
+             ("file3", "99001234/1"), ("file4", "99001234/1")])
+
+    def test_generate_metadata(self):
+        calls = []
+        lock = threading.Lock()
+
+        class Ingestor(DatasetIngestor):
+
+            def generate(self, name, scan):
+                with lock:
+                    calls.append((name, scan, threading.get_ident()))
+                time.sleep(0.3)
+                return "%s.%s.json" % (scan, name)
+
+            def _generate_rawdataset_metadata(self, scan, dctfmt=None):
+                return self.generate("scan", scan)
+
+            def _generate_origdatablock_metadata(self, scan, dctfmt=None):
+                return self.generate("origdatablock", scan)
+
+            def _generate_attachment_metadata(self, scan, dctfmt=None):
+                return self.generate("attachment", scan)
+
+        ingestor = Ingestor(
+            {"parallel_metadata_generation": True}, self.__path,
+            os.path.join(self.__path, "scicat-datasets-99001234.lst"),
+            os.path.join(self.__path,
+                         "scicat-ingested-datasets-99001234.lst"),
+            dict(self.__meta),
+            os.path.join(self.__path, "beamtime-metadata-99001234.json"))
+        # set by ingest()
+        ingestor._DatasetIngestor__dctfmt["scanname"] = "scan_00001"
+        start = time.time()
+        res = ingestor._generate_metadata("scan_00001 e1")
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(
+            res,
+            ("scan_00001.scan.json", "scan_00001 e1.origdatablock.json",
+             "scan_00001.attachment.json"))
+        self.assertEqual(len(set(th for _, _, th in calls)), 3)
+        ingestor._DatasetIngestor__dctfmt["scanname"] = "scan_00002"
+        self.assertEqual(
+            ingestor._generate_metadata("scan_00002", False),
+            ("scan_00002.scan.json", "scan_00002.origdatablock.json", None))
+
+    def test_generate_metadata_templates(self):
+        dirname = os.path.abspath("test_ingestor_current")
+        os.mkdir(dirname)
+        self.addCleanup(shutil.rmtree, dirname)
+        for name in ["scan_00001.nxs", "scan_00001.png"]:
+            with open(os.path.join(dirname, name), "w") as fl:
+                fl.write("\n")
+        commands = []
+        lock = threading.Lock()
+
+        class Ingestor(DatasetIngestor):
+
+            def _run_generator(self, command, capture=False):
+                time.sleep(0.1)
+                with lock:
+                    commands.append(command)
+                return ""
+
+        # each template refers to the files of the other generators
+        ingestor = Ingestor(
+            {"parallel_metadata_generation": True,
+             "file_dataset_metadata_generator":
+             "scan {masterfile} {ext} {plotfile}",
+             "datablock_metadata_generator":
+             "datablock {masterfile} {ext} {plotfile} {plotext}",
+             "datablock_metadata_generator_scanpath_postfix": "",
+             "attachment_metadata_generator":
+             "attachment {plotfile} {plotext} {masterfile}"},
+            dirname, os.path.join(dirname, "scicat-datasets-99001234.lst"),
+            os.path.join(dirname, "scicat-ingested-datasets-99001234.lst"),
+            dict(self.__meta),
+            os.path.join(dirname, "beamtime-metadata-99001234.json"))
+        dctfmt = ingestor._DatasetIngestor__dctfmt
+        # set by ingest()
+        dctfmt["scanname"] = "scan_00001"
+        dctfmt["masterscanname"] = "scan_00001"
+        ingestor._generate_metadata("scan_00001")
+        nxs = os.path.join(dirname, "scan_00001.nxs")
+        png = os.path.join(dirname, "scan_00001.png")
+        self.assertEqual(
+            sorted(commands),
+            ["attachment %s png %s" % (png, nxs),
+             "datablock %s nxs %s png" % (nxs, png),
+             "scan %s nxs %s" % (nxs, png)])
+        self.assertEqual(dctfmt["masterfile"], nxs)
+        self.assertEqual(dctfmt["plotfile"], png)
+
+    def test_stream_generated_metadata(self):
+        dirname = os.path.abspath("test_ingestor_current")
+        os.mkdir(dirname)
+        self.addCleanup(shutil.rmtree, dirname)
+        fiofile = os.path.join(dirname, "mymeta2_00011.fio")
+        shutil.copy(
+            os.path.join(self.__path, "config", "mymeta2_00011.fio"),
+            fiofile)
+        command = "nxsfileinfo metadata -k4 -x 0o640 " \
+            " -p 99001234/mymeta2_00011 -o %s %s"
+        shfile = os.path.join(dirname, "sh.scan.json")
+        subprocess.run(command % (shfile, fiofile), shell=True, check=True)
+        with open(shfile) as fl:
+            shmeta = fl.read()
+
+        ingestor = self.ingestor({"stream_generated_metadata": True})
+        metafile = os.path.join(dirname, "mymeta2_00011.scan.json")
+        self.assertEqual(
+            ingestor._stream_generator(command % (metafile, fiofile)),
+            metafile)
+        self.assertEqual(ingestor._read_metadata(metafile), shmeta)
+        mtime = ingestor._metadata_mtime(metafile)
+        ingestor.flush_metadata()
+        with open(metafile) as fl:
+            self.assertEqual(fl.read(), shmeta)
+        self.assertEqual(os.path.getmtime(metafile), mtime)
+        self.assertEqual(os.stat(metafile).st_mode & 0o777, 0o640)
+        self.assertEqual(
+            ingestor._get_pid(metafile), "99001234/mymeta2_00011")
+
+        meta = json.loads(shmeta)
+        meta["pid"] = "99001234/mymeta2_00012"
+        ingestor._write_metadata(metafile, json.dumps(meta))
+        self.assertEqual(
+            ingestor._get_pid(metafile), "99001234/mymeta2_00012")
+        ingestor.flush_metadata()
+        with open(metafile) as fl:
+            self.assertEqual(json.loads(fl.read()), meta)
+        self.assertEqual(os.stat(metafile).st_mode & 0o777, 0o640)
+
+        # commands writing their output files themselves
+        self.assertEqual(
+            ingestor._stream_generator(
+                "nxsfileinfo metadata -o %s %s | cat" % (metafile, fiofile)),
+            None)
+        self.assertEqual(
+            self.ingestor({})._stream_generator(
+                command % (metafile, fiofile)),
+            None)
+
+    def test_generator_cache(self):
+        dirname = os.path.abspath("test_ingestor_current")
+        os.mkdir(dirname)
+        self.addCleanup(shutil.rmtree, dirname)
+        fiofile = os.path.join(dirname, "mymeta2_00011.fio")
+        shutil.copy(
+            os.path.join(self.__path, "config", "mymeta2_00011.fio"),
+            fiofile)
+        template = "nxsfileinfo metadata -k4 -x 0o640 " \
+            " -p 99001234/mymeta2_00011 -o {metapath}/mymeta2_00011.json " \
+            " {masterfile}"
+        vardir = os.path.join(dirname, "var")
+        ingestor = DatasetIngestor(
+            {"generator_cache_size": 1, "ingestor_var_dir": vardir},
+            dirname, os.path.join(dirname, "scicat-datasets-99001234.lst"),
+            os.path.join(dirname, "scicat-ingested-datasets-99001234.lst"),
+            dict(self.__meta),
+            os.path.join(dirname, "beamtime-metadata-99001234.json"))
+        dctfmt = ingestor._DatasetIngestor__dctfmt
+        dctfmt["masterfile"] = fiofile
+        command = template.format(**dctfmt)
+        metafile = "%s/mymeta2_00011.json" % dctfmt["metapath"]
+
+        key = ingestor._generator_key(template, command)
+        self.assertEqual(ingestor._cached_generator(key, command), None)
+        subprocess.run(command, shell=True, check=True)
+        with open(metafile) as fl:
+            meta = fl.read()
+        ingestor._cache_generator_result(key, command)
+        self.assertTrue(os.path.isfile(
+            "%s%s/scicat-ingested-datasets-99001234.lst.generatorcache"
+            % (vardir, dirname)))
+
+        # a deleted metadata file is restored from the cache
+        os.remove(metafile)
+        self.assertEqual(ingestor._cached_generator(key, command), metafile)
+        with open(metafile) as fl:
+            self.assertEqual(fl.read(), meta)
+        self.assertEqual(os.stat(metafile).st_mode & 0o777, 0o640)
+
+        # a modified master file changes the key
+        with open(fiofile, "a") as fl:
+            fl.write("\n")
+        self.assertEqual(
+            ingestor._cached_generator(
+                ingestor._generator_key(template, command), command),
+            None)
+        self.assertEqual(
+            self.ingestor({})._generator_key(template, command), None)
+        # the cache is closed with the ingestor
+        ingestor.close()
+        self.assertEqual(ingestor._generator_key(template, command), None)
+
+    def test_master_file_candidates(self):
+        ingestor = self.ingestor({"master_file_extension_list": ["nxs", "h5"]})
+        self.assertEqual(
+            ingestor.master_file_candidates("scan_00001"),
+            [os.path.join(self.__path, "scan_00001.nxs"),
+             os.path.join(self.__path, "scan_00001.h5"),
+             os.path.join(self.__path, "scan_00001", "scan_00001.nxs"),
+             os.path.join(self.__path, "scan_00001", "scan_00001.h5")])
+        self.assertEqual(
+            ingestor.master_file_candidates("scan_00001 e1 e2"),
+            ingestor.master_file_candidates("scan_00001"))
+        self.assertEqual(
+            ingestor.master_file_candidates("scan_00001:1700000000.0"), [])
+        self.assertEqual(
+            ingestor.master_file_candidates("__command__ stop"), [])
+
+    def test_incremental_check_list(self):
+        dirname = os.path.abspath("test_ingestor_current")
+        os.mkdir(dirname)
+        dsfile = os.path.join(dirname, "scicat-datasets-99001234.lst")
+        idsfile = os.path.join(
+            dirname, "scicat-ingested-datasets-99001234.lst")
+        try:
+            with open(dsfile, "w") as fl:
+                fl.write("scan_00001\nscan_00002\n")
+            with open(idsfile, "w") as fl:
+                fl.write("scan_00001 1700000001.0 1700000001.5 0\n")
+            ing = DatasetIngestor(
+                {"incremental_list_reading": True},
+                dirname, dsfile, idsfile, dict(self.__meta),
+                os.path.join(dirname, "beamtime-metadata-99001234.json"))
+            ing.check_list()
+            self.assertEqual(ing.waiting_datasets(), ["scan_00002"])
+
+            with open(dsfile, "a") as fl:
+                fl.write("scan_00003\n")
+            with open(idsfile, "a") as fl:
+                fl.write("scan_00002 1700000002.0 1700000002.5 0\n")
+            ing.check_list()
+            # only the appended lines are parsed
+            self.assertEqual(ing._DatasetIngestor__ds_reader.appended, 1)
+            self.assertEqual(ing._DatasetIngestor__ids_reader.appended, 1)
+            self.assertEqual(ing.waiting_datasets(), ["scan_00003"])
+
+            with open(dsfile, "a") as fl:
+                fl.write("scan_00004\n")
+            ing.check_list()
+            self.assertEqual(ing._DatasetIngestor__ds_reader.appended, 1)
+            self.assertEqual(ing._DatasetIngestor__ids_reader.appended, 0)
+            self.assertEqual(
+                ing.waiting_datasets(), ["scan_00003", "scan_00004"])
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_compaction(self):
+        dirname = os.path.abspath("test_ingestor_current")
+        os.mkdir(dirname)
+        dsfile = os.path.join(dirname, "scicat-datasets-99001234.lst")
+        idsfile = os.path.join(
+            dirname, "scicat-ingested-datasets-99001234.lst")
+
+        def ingestor(config):
+            return DatasetIngestor(
+                config, dirname, dsfile, idsfile, dict(self.__meta),
+                os.path.join(dirname, "beamtime-metadata-99001234.json"))
+
+        ingested = \
+            "scan_00001 1700000000.0 -1 0\n" \
+            "scan_00001 1700000001.0 1700000001.5 0\n" \
+            "scan_00002 1700000002.0 1700000002.5 0\n" \
+            "scan_00002 1700000003.0 -1 0\n" \
+            "scan_00001 1700000004.0 1700000004.5 0\n" \
+            "scan_00003 1700000005.0 -1 0\n" \
+            "scan_00003 1700000006.0 -1 0\n"
+        try:
+            with open(dsfile, "w") as fl:
+                fl.write("scan_00001\nscan_00002\nscan_00003\nscan_00004\n")
+            with open(idsfile, "w") as fl:
+                fl.write(ingested)
+
+            ing = ingestor({"ingested_list_compaction_ratio": 2})
+            ing.check_list()
+            with open(idsfile) as fl:
+                self.assertEqual(fl.read(), ingested)
+
+            ing = ingestor({"ingested_list_compaction_ratio": 1})
+            ing.check_list()
+            waiting = ing.waiting_datasets()
+            self.assertEqual(waiting, ["scan_00003", "scan_00004"])
+            with open(idsfile) as fl:
+                self.assertEqual(
+                    fl.read(),
+                    "scan_00002 1700000002.0 1700000002.5 0\n"
+                    "scan_00002 1700000003.0 -1 0\n"
+                    "scan_00001 1700000004.0 1700000004.5 0\n"
+                    "scan_00003 1700000006.0 -1 0\n")
+
+            for config in [{}, {"incremental_list_reading": True}]:
+                ing = ingestor(config)
+                ing.check_list()
+                self.assertEqual(ing.waiting_datasets(), waiting)
+
+            # kept records above the ratio do not trigger compaction again
+            with open(idsfile, "w") as fl:
+                fl.write(ingested)
+            ing = ingestor({"ingested_list_compaction_ratio": 0.1,
+                            "incremental_list_reading": True})
+            calls = []
+            compact = ing._compact_ingested_list
+            ing._compact_ingested_list = \
+                lambda: calls.append(1) or compact()
+            ing.check_list()
+            ing.check_list()
+            ing.check_list()
+            self.assertEqual(len(calls), 1)
+            with open(idsfile, "a") as fl:
+                fl.write("scan_00003 1700000007.0 -1 0\n")
+            ing.check_list()
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(ing.waiting_datasets(), waiting)
+            with open(idsfile) as fl:
+                self.assertEqual(
+                    fl.read(),
+                    "scan_00002 1700000002.0 1700000002.5 0\n"
+                    "scan_00002 1700000003.0 -1 0\n"
+                    "scan_00001 1700000004.0 1700000004.5 0\n"
+                    "scan_00003 1700000007.0 -1 0\n")
+            ing.check_list()
+            self.assertEqual(len(calls), 2)
+        finally:
+            shutil.rmtree(dirname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,10 +29,16 @@ import time
 import json
 import uuid
 import re
+import queue
+import logging
+import inotifyx
 
 from scingestor import beamtimeWatcher
+from scingestor import datasetWatcher
+from scingestor.ingestScheduler import IngestScheduler
 from scingestor import safeINotifier
 from scingestor import pathConverter
+from scingestor.logger import init_logger
 
 from nxstools.nxsfileparser import isoDate
 
@@ -1163,6 +1169,369 @@ class DatasetWatcherTest(unittest.TestCase):
             if os.path.isdir(fdirname):
                 shutil.rmtree(fdirname)
 
+    def runchanges(self, fun, cfg, changes, runtime):
+        """ runs the ingestor on an empty dataset list changed by a thread
+
+        :param fun: test function name
+        :type fun: :obj:`str`
+        :param cfg: additional configuration lines
+        :type cfg: :obj:`str`
+        :param changes: function of the scan directory and the dataset
+                        list file, which is called in the test thread
+        :type changes: :obj:`instancemethod`
+        :param runtime: ingestor runtime in s
+        :type runtime: :obj:`int`
+        :returns: output and error of the ingestor
+        :rtype: (:obj:`str`, :obj:`str`)
+        """
+        dirname = "test_current"
+        while os.path.exists(dirname):
+            dirname = dirname + '_1'
+        fdirname = os.path.abspath(dirname)
+        fsubdirname = os.path.abspath(os.path.join(dirname, "raw"))
+        fsubdirname2 = os.path.abspath(os.path.join(fsubdirname, "special"))
+        btmeta = "beamtime-metadata-99001234.json"
+        dslist = "sc-ds-99001234.lst"
+        source = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                              "config",
+                              btmeta)
+        fdslist = os.path.join(fsubdirname2, dslist)
+        credfile = os.path.join(fdirname, 'pwd')
+        cfgfname = "%s_%s.yaml" % (self.__class__.__name__, fun)
+        os.mkdir(fdirname)
+        os.mkdir(fsubdirname)
+        os.mkdir(fsubdirname2)
+        shutil.copy(source, fdirname)
+        with open(credfile, "w") as cf:
+            cf.write("12342345")
+        with open(fdslist, "w"):
+            pass
+
+        cfg = 'beamtime_dirs:\n' \
+            '  - "{basedir}"\n' \
+            'scicat_url: "http://localhost:8881"\n' \
+            'inotify_timeout: 0.2\n' \
+            'get_event_timeout: 0.02\n' \
+            'scicat_proposal_id_pattern: "{{beamtimeid}}"\n' \
+            'max_request_tries_number: 10\n' \
+            'request_headers:\n' \
+            '  "Content-Type": "application/json"\n' \
+            '  "Accept": "application/json"\n' \
+            'datasets_filename_pattern: "sc-ds-{{beamtimeid}}.lst"\n' \
+            'ingested_datasets_filename_pattern: ' \
+            '"sc-ids-{{beamtimeid}}.lst"\n' \
+            'ingestor_var_dir: "/"\n' \
+            'ingestor_username: "myingestor"\n' \
+            'ingestor_credential_file: "{credfile}"\n'.format(
+                basedir=fdirname, credfile=credfile) + cfg
+        with open(cfgfname, "w+") as cf:
+            cf.write(cfg)
+
+        try:
+            self.notifier = safeINotifier.SafeINotifier()
+            self.__server.reset()
+            th = threading.Thread(
+                target=changes, args=(fsubdirname2, fdslist))
+            th.start()
+            vl, er = self.runtest(
+                ('scicat_dataset_ingestor -c %s -r%s -l debug'
+                 % (cfgfname, runtime)).split())
+            th.join()
+            return vl, er
+        finally:
+            if os.path.exists(cfgfname):
+                os.remove(cfgfname)
+            if os.path.isdir(fdirname):
+                shutil.rmtree(fdirname)
+
+    def test_datasetfile_add_debounce(self):
+        fun = sys._getframe().f_code.co_name
+        # print("Run: %s.%s() " % (self.__class__.__name__, fun))
+        lsource = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                               "config",
+                               "sc-ds-99001234.lst")
+
+        def changes(scandir, dslist):
+            """ appends scans to the dataset list within the delay time """
+            time.sleep(3)
+            for i in range(1, 4):
+                shutil.copy(
+                    lsource, os.path.join(scandir, "myscan_%05i.txt" % i))
+                with open(dslist, "a+") as fds:
+                    fds.write("myscan_%05i\n" % i)
+                time.sleep(1.5)
+
+        # without debouncing the first change is ingested
+        # before the last one
+        vl, er = self.runchanges(
+            fun,
+            'debounce_dataset_list_changes: true\n'
+            'ingestion_delay_time: 2\n',
+            changes, 16)
+        try:
+            self.assertEqual(
+                'Login: myingestor\n'
+                "Datasets: 99001234/myscan_00001\n"
+                "OrigDatablocks: 99001234/myscan_00001\n"
+                "Datasets: 99001234/myscan_00002\n"
+                "OrigDatablocks: 99001234/myscan_00002\n"
+                "Datasets: 99001234/myscan_00003\n"
+                "OrigDatablocks: 99001234/myscan_00003\n", vl)
+        except Exception:
+            print(er)
+            raise
+        self.assertEqual(len(self.__server.userslogin), 1)
+        self.assertEqual(
+            [json.loads(ds)["pid"] for ds in self.__server.datasets],
+            ["99001234/myscan_%05i" % i for i in range(1, 4)])
+
+    def test_datasetfile_add_quiet_time(self):
+        fun = sys._getframe().f_code.co_name
+        # print("Run: %s.%s() " % (self.__class__.__name__, fun))
+        fiosource = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                 "config",
+                                 "mymeta2_00011.fio")
+
+        def changes(scandir, dslist):
+            """ writes master files and appends their scans """
+            time.sleep(3)
+            for i in range(1, 3):
+                shutil.copy(
+                    fiosource, os.path.join(scandir, "myscan_%05i.fio" % i))
+                with open(dslist, "a+") as fds:
+                    fds.write("myscan_%05i\n" % i)
+                time.sleep(1.5)
+
+        # completed master files are ingested before the delay time
+        vl, er = self.runchanges(
+            fun,
+            'ingestion_quiet_time: 0.5\n'
+            'ingestion_delay_time: 60\n',
+            changes, 12)
+        try:
+            self.assertEqual(
+                [json.loads(ds)["pid"] for ds in self.__server.datasets],
+                ["99001234/myscan_00001", "99001234/myscan_00002"])
+        except Exception:
+            print(er)
+            raise
+        self.assertEqual(len(self.__server.origdatablocks), 2)
+        self.assertTrue("Master files completed" in er)
+
+    def test_quiescent(self):
+        dirname = "test_current"
+        while os.path.exists(dirname):
+            dirname = dirname + '_1'
+        fdirname = os.path.abspath(dirname)
+        btmeta = "beamtime-metadata-99001234.json"
+        source = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                              "config",
+                              btmeta)
+        fdslist = os.path.join(fdirname, "sc-ds-99001234.lst")
+        fidslist = os.path.join(fdirname, "sc-ids-99001234.lst")
+        master = os.path.join(fdirname, "myscan_00001.fio")
+        os.mkdir(fdirname)
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatDatasetWatcher", "error")
+        try:
+            with open(source) as fl:
+                meta = json.load(fl)
+            with open(fdslist, "w") as fl:
+                fl.write("myscan_00001\n")
+            with open(master, "w") as fl:
+                fl.write("scan")
+            dw = datasetWatcher.DatasetWatcher(
+                {"ingestion_quiet_time": 1.0,
+                 "master_file_extension_list": ["fio"]},
+                fdirname, fdslist, fidslist, meta,
+                os.path.join(fdirname, btmeta))
+            dw._DatasetWatcher__ingestor.check_list()
+            events = queue.Queue()
+            dw._DatasetWatcher__scandir_queue = events
+
+            # a file modified within the quiet time
+            self.assertFalse(dw._quiescent())
+
+            # a file closed after writing
+            events.put(safeINotifier.EventData(
+                "myscan_00001.fio", inotifyx.IN_CLOSE_WRITE))
+            self.assertTrue(dw._quiescent())
+
+            # the scan written again after the old event
+            now = time.time()
+            os.utime(master, (now + 0.5, now + 0.5))
+            self.assertFalse(dw._quiescent())
+            events.put(safeINotifier.EventData(
+                "myscan_00001.fio", inotifyx.IN_CLOSE_WRITE))
+            time.sleep(0.6)
+            self.assertTrue(dw._quiescent())
+
+            # events older than the quiet time are removed
+            time.sleep(1.0)
+            os.utime(master, (time.time(), time.time()))
+            self.assertFalse(dw._quiescent())
+            self.assertEqual(dw._DatasetWatcher__closed_files, {})
+
+            # a file not modified within the quiet time
+            os.utime(master, (now - 2, now - 2))
+            self.assertTrue(dw._quiescent())
+            dw._DatasetWatcher__ingestor.close()
+        finally:
+            for hd in logging.getLogger().handlers:
+                if hd not in handlers:
+                    logging.getLogger().removeHandler(hd)
+            if os.path.isdir(fdirname):
+                shutil.rmtree(fdirname)
+
+    def test_datasetfile_add_scheduler(self):
+        fun = sys._getframe().f_code.co_name
+        # print("Run: %s.%s() " % (self.__class__.__name__, fun))
+        lsource = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                               "config",
+                               "sc-ds-99001234.lst")
+
+        def changes(scandir, dslist):
+            """ appends scans to the dataset list """
+            time.sleep(3)
+            for i in range(1, 3):
+                shutil.copy(
+                    lsource, os.path.join(scandir, "myscan_%05i.txt" % i))
+                with open(dslist, "a+") as fds:
+                    fds.write("myscan_%05i\n" % i)
+                time.sleep(1.5)
+
+        vl, er = self.runchanges(
+            fun,
+            'ingestion_workers_number: 2\n'
+            'ingestion_delay_time: 1\n',
+            changes, 10)
+        try:
+            self.assertEqual(
+                [json.loads(ds)["pid"] for ds in self.__server.datasets],
+                ["99001234/myscan_00001", "99001234/myscan_00002"])
+        except Exception:
+            print(er)
+            raise
+        self.assertEqual(len(self.__server.origdatablocks), 2)
+        # scans are ingested by the scheduler workers
+        self.assertTrue("IngestScheduler: job of" in er)
+        self.assertFalse(IngestScheduler._scheduler.running)
+
+    def test_schedule_datasets(self):
+        dirname = "test_current"
+        while os.path.exists(dirname):
+            dirname = dirname + '_1'
+        fdirname = os.path.abspath(dirname)
+        btmeta = "beamtime-metadata-99001234.json"
+        source = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                              "config",
+                              btmeta)
+        fdslist = os.path.join(fdirname, "sc-ds-99001234.lst")
+        fidslist = os.path.join(fdirname, "sc-ids-99001234.lst")
+        os.mkdir(fdirname)
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatDatasetWatcher", "error")
+        if IngestScheduler._scheduler is not None:
+            IngestScheduler._scheduler.stop()
+        try:
+            with open(source) as fl:
+                meta = json.load(fl)
+            with open(fdslist, "w") as fl:
+                fl.write("myscan_00001\n")
+            dw = datasetWatcher.DatasetWatcher(
+                {"ingestion_workers_number": 1,
+                 "ingestion_delay_time": 0.5,
+                 "ingestion_stop_timeout": 0.3},
+                fdirname, fdslist, fidslist, meta,
+                os.path.join(fdirname, btmeta))
+            scheduler = IngestScheduler()
+            ingestor = dw._DatasetWatcher__ingestor
+            ingestor.check_list()
+            ingested = []
+            release = threading.Event()
+
+            def ingest(scan, token):
+                release.wait(10)
+                ingested.append(scan)
+
+            ingestor.get_token = lambda: "token"
+            ingestor.ingest = ingest
+
+            # the datasets are submitted after the delay time
+            dw._schedule_datasets()
+            self.assertEqual(scheduler.pending(dw), 0)
+            time.sleep(0.6)
+            dw._schedule_datasets()
+            self.assertEqual(scheduler.pending(dw), 1)
+            # one ingestion of the watcher at a time
+            dw._schedule_datasets()
+            self.assertEqual(scheduler.pending(dw), 1)
+
+            # the watcher waits for its ingestion until the stop timeout
+            start = time.time()
+            dw.stop()
+            self.assertTrue(time.time() - start < 5)
+            self.assertEqual(ingested, [])
+            # the last watcher stops the scheduler
+            self.assertFalse(scheduler.running)
+            release.set()
+            self.assertTrue(scheduler.wait(dw, 10))
+            self.assertEqual(ingested, ["myscan_00001"])
+            self.assertEqual(ingestor.waiting_datasets(), [])
+            ingestor.close()
+        finally:
+            release.set()
+            for hd in logging.getLogger().handlers:
+                if hd not in handlers:
+                    logging.getLogger().removeHandler(hd)
+            if os.path.isdir(fdirname):
+                shutil.rmtree(fdirname)
+
+    def test_ingest_failed(self):
+        dirname = "test_current"
+        while os.path.exists(dirname):
+            dirname = dirname + '_1'
+        fdirname = os.path.abspath(dirname)
+        btmeta = "beamtime-metadata-99001234.json"
+        source = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                              "config",
+                              btmeta)
+        fdslist = os.path.join(fdirname, "sc-ds-99001234.lst")
+        fidslist = os.path.join(fdirname, "sc-ids-99001234.lst")
+        os.mkdir(fdirname)
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatDatasetWatcher", "error")
+        try:
+            with open(source) as fl:
+                meta = json.load(fl)
+            with open(fdslist, "w") as fl:
+                fl.write("myscan_00001\nmyscan_00002\nmyscan_00003\n")
+            dw = datasetWatcher.DatasetWatcher(
+                {}, fdirname, fdslist, fidslist, meta,
+                os.path.join(fdirname, btmeta))
+            ingestor = dw._DatasetWatcher__ingestor
+            ingestor.check_list()
+            ingested = []
+
+            def ingest(scan, token):
+                if scan == "myscan_00002":
+                    raise Exception("Server error")
+                ingested.append(scan)
+
+            ingestor.get_token = lambda: "token"
+            ingestor.ingest = ingest
+            dw._ingest_datasets(ingestor.waiting_datasets())
+            self.assertEqual(ingested, ["myscan_00001", "myscan_00003"])
+            # the failed scan is retried in the next pass
+            self.assertEqual(ingestor.waiting_datasets(), ["myscan_00002"])
+            ingestor.close()
+        finally:
+            for hd in logging.getLogger().handlers:
+                if hd not in handlers:
+                    logging.getLogger().removeHandler(hd)
+            if os.path.isdir(fdirname):
+                shutil.rmtree(fdirname)
+
     def test_datasetfile_add_noserver(self):
         fun = sys._getframe().f_code.co_name
         # print("Run: %s.%s() " % (self.__class__.__name__, fun))
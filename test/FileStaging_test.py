@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import shutil
+import logging
+
+from scingestor.fileStaging import stage_file
+from scingestor.logger import init_logger
+
+
+# test fixture
+class FileStagingTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatFileStaging", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_staging_current")
+        os.mkdir(self.__dirname)
+        self.__source = os.path.join(self.__dirname, "myscan_00001.nxs")
+        with open(self.__source, "wb") as fl:
+            fl.write(b"\x89HDF\r\n\x1a\n" * 1000)
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def target(self, nr):
+        return os.path.join(
+            self.__dirname, "_tmp_scingestor_%s_myscan_00001.nxs" % nr)
+
+    def content(self, filename):
+        with open(filename, "rb") as fl:
+            return fl.read()
+
+    def test_hardlink(self):
+        self.assertEqual(stage_file(self.__source, self.target(1)),
+                         "hardlink")
+        self.assertTrue(os.path.samefile(self.__source, self.target(1)))
+        self.assertEqual(os.stat(self.__source).st_nlink, 2)
+        os.remove(self.target(1))
+        self.assertEqual(os.stat(self.__source).st_nlink, 1)
+
+    def test_fallbacks(self):
+        expected = self.content(self.__source)
+        method = stage_file(self.__source, self.target(1),
+                            ["reflink", "copy"])
+        self.assertTrue(method in ["reflink", "copy"])
+        self.assertFalse(os.path.samefile(self.__source, self.target(1)))
+        self.assertEqual(self.content(self.target(1)), expected)
+
+        self.assertEqual(
+            stage_file(self.__source, self.target(2), ["symlink"]),
+            "symlink")
+        self.assertTrue(os.path.islink(self.target(2)))
+        self.assertEqual(self.content(self.target(2)), expected)
+
+        self.assertEqual(
+            stage_file(self.__source, self.target(3), ["copy"]), "copy")
+        self.assertEqual(self.content(self.target(3)), expected)
+        self.assertEqual(os.stat(self.target(3)).st_mode,
+                         os.stat(self.__source).st_mode)
+
+        # an existing target is not overwritten
+        with self.assertRaises(OSError):
+            stage_file(self.__source, self.target(3))
+        self.assertEqual(
+            stage_file(self.__source, self.target(4),
+                       ["wrong", "hardlink"]),
+            "hardlink")
+
+
+if __name__ == '__main__':
+    unittest.main()
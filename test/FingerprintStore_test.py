@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import shutil
+import logging
+
+from scingestor.fingerprintStore import FingerprintStore
+from scingestor.logger import init_logger
+
+
+# test fixture
+class FingerprintStoreTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatFingerprintStore", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_fingerprint_current")
+        os.makedirs(os.path.join(self.__dirname, "scan_00001", "det", "a"))
+        for name in ["scan_00001.fio", "scan_00002.fio",
+                     "scan_00001/det/a/f_00001.cbf"]:
+            self.write(name, name)
+        self.__filename = os.path.join(
+            self.__dirname, "scicat-ingested-datasets-99001234.lst"
+            ".fingerprints")
+        self.__paths = [os.path.join(self.__dirname, "scan_00001")]
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def write(self, name, content):
+        with open(os.path.join(self.__dirname, name), "w") as fl:
+            fl.write(content)
+
+    def test_fingerprint(self):
+        store = FingerprintStore(self.__filename)
+        fingerprint = store.fingerprint(self.__paths)
+        self.assertEqual(fingerprint["count"], 1)
+        self.assertEqual(fingerprint["size"], len("scan_00001.fio"))
+        self.assertEqual(
+            [path for path, _ in fingerprint["dirs"]], self.__paths)
+        self.assertEqual(
+            [path for path, _ in fingerprint["subdirs"]],
+            [os.path.join(self.__paths[0], "det"),
+             os.path.join(self.__paths[0], "det", "a")])
+
+        self.assertFalse(store.unchanged("scan_00001", self.__paths))
+        store.update("scan_00001", fingerprint)
+        self.assertTrue(store.unchanged("scan_00001", self.__paths))
+        # other scans do not change the fingerprint
+        self.write("scan_00002.fio", "scan_00002 changed")
+        self.write("scan_00003.fio", "scan_00003")
+        self.assertTrue(store.unchanged("scan_00001", self.__paths))
+        # fingerprints are read from the file
+        store = FingerprintStore(self.__filename)
+        self.assertEqual(store.get("scan_00001"), fingerprint)
+        self.assertTrue(store.unchanged("scan_00001", self.__paths))
+        self.assertFalse(
+            store.unchanged("scan_00001", self.__paths + [
+                os.path.join(self.__dirname, "scan_00002")]))
+
+    def test_changes(self):
+        store = FingerprintStore(self.__filename, 100)
+
+        def changed(name):
+            store.update("scan_00001", store.fingerprint(self.__paths))
+            self.assertTrue(store.unchanged("scan_00001", self.__paths))
+            if name.endswith("/"):
+                os.mkdir(os.path.join(self.__dirname, name))
+            else:
+                self.write(name, name + " changed")
+            return not store.unchanged("scan_00001", self.__paths)
+
+        self.assertTrue(changed("scan_00001/det/a/f_00002.cbf"))
+        self.assertTrue(changed("scan_00001/det/b/"))
+        self.assertTrue(changed("scan_00001/det/b/f_00001.cbf"))
+        self.assertTrue(changed("scan_00001.fio"))
+        self.assertTrue(changed("scan_00001.nxs"))
+        self.assertTrue(changed("scan_00001_extra/"))
+        # files rewritten in place are not seen in subdirectories
+        self.assertFalse(changed("scan_00001/det/a/f_00001.cbf"))
+        with open(self.__filename) as fl:
+            self.assertEqual(len(fl.read().splitlines()), 7)
+
+    def test_compaction(self):
+        store = FingerprintStore(self.__filename)
+        paths = [os.path.join(self.__dirname, "scan_00002")]
+        store.update("scan_00002", store.fingerprint(paths))
+        for nr in range(4):
+            store.update("scan_00001", {"count": nr})
+            with open(self.__filename) as fl:
+                lines = fl.read().splitlines()
+            # superseded lines do not exceed the number of scans
+            self.assertTrue(len(lines) <= 4)
+        self.assertEqual(len(lines), 2)
+        store = FingerprintStore(self.__filename)
+        self.assertEqual(store.get("scan_00001"), {"count": 3})
+        self.assertEqual(
+            store.get("scan_00002"), store.fingerprint(paths))
+
+        # the line count is taken from the file
+        with open(self.__filename, "a") as fl:
+            fl.write('{"scan": "scan_00001", "fingerprint": {}}\n')
+            fl.write("wrong line\n")
+        store = FingerprintStore(self.__filename)
+        store.update("scan_00001", {"count": 5})
+        with open(self.__filename) as fl:
+            self.assertEqual(len(fl.read().splitlines()), 2)
+        self.assertFalse(os.path.exists(
+            "%s.compact.tmp" % self.__filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import shutil
+import logging
+
+from scingestor.generatorCache import GeneratorCache
+from scingestor.logger import init_logger
+
+
+# test fixture
+class GeneratorCacheTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatGeneratorCache", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_generatorcache_current")
+        os.mkdir(self.__dirname)
+        self.__filename = os.path.join(
+            self.__dirname, "var", "scicat-ingested-datasets-99001234.lst"
+            ".generatorcache")
+        self.__master = os.path.join(self.__dirname, "scan_00001.nxs")
+        with open(self.__master, "w") as fl:
+            fl.write("scan_00001")
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_key(self):
+        template = "nxsfileinfo metadata -p {pid} {masterfile}"
+        command = "nxsfileinfo metadata -p 99001234/scan_00001 %s" \
+            % self.__master
+        key = GeneratorCache.key(template, command, [self.__master])
+        self.assertEqual(
+            GeneratorCache.key(template, command, [self.__master]), key)
+        self.assertNotEqual(
+            GeneratorCache.key(template + " ", command, [self.__master]),
+            key)
+        self.assertNotEqual(
+            GeneratorCache.key(template, command + " -k4", [self.__master]),
+            key)
+        self.assertNotEqual(
+            GeneratorCache.key(template, command, []), key)
+        with open(self.__master, "a") as fl:
+            fl.write(" changed")
+        self.assertNotEqual(
+            GeneratorCache.key(template, command, [self.__master]), key)
+        # a replaced file with the same size and mtime gets a new inode
+        status = os.stat(self.__master)
+        key = GeneratorCache.key(template, command, [self.__master])
+        os.rename(self.__master, self.__master + ".old")
+        shutil.copy(self.__master + ".old", self.__master)
+        os.utime(self.__master, ns=(status.st_atime_ns, status.st_mtime_ns))
+        self.assertNotEqual(
+            GeneratorCache.key(template, command, [self.__master]), key)
+
+    def test_lru(self):
+        cache = GeneratorCache(self.__filename, 30)
+        cache.put("k1", "0123456789")
+        cache.put("k2", "0123456789")
+        cache.put("k3", "0123456789")
+        self.assertEqual(cache.get("k1"), "0123456789")
+        # k2 is the least recently used document
+        cache.put("k4", "01234")
+        self.assertEqual(cache.get("k2"), None)
+        self.assertEqual(cache.get("k1"), "0123456789")
+        self.assertEqual(cache.get("k3"), "0123456789")
+        self.assertEqual(cache.get("k4"), "01234")
+        # documents larger than the cache are not stored
+        cache.put("k5", "0123456789" * 4)
+        self.assertEqual(cache.get("k5"), None)
+        self.assertEqual(cache.get("k4"), "01234")
+        cache.close()
+
+        cache = GeneratorCache(self.__filename, 30)
+        self.assertEqual(cache.get("k1"), "0123456789")
+        cache.put("k6", "0123456789" * 3)
+        self.assertEqual(cache.get("k6"), "0123456789" * 3)
+        for key in ["k1", "k3", "k4"]:
+            self.assertEqual(cache.get(key), None)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
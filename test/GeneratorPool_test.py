@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import shutil
+import subprocess
+import logging
+
+from scingestor.generatorPool import GeneratorPool
+from scingestor.logger import init_logger
+
+
+# test fixture
+class GeneratorPoolTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+        self.__path = os.path.abspath(os.path.dirname(__file__))
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatGeneratorPool", "critical")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_pool_current")
+        os.mkdir(self.__dirname)
+        shutil.copy(
+            os.path.join(self.__path, "config", "mymeta2_00011.fio"),
+            self.__dirname)
+
+    def tearDown(self):
+        GeneratorPool().stop()
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_run(self):
+        pool = GeneratorPool()
+        pool.configure({"generator_pool_size": 2})
+        command = "nxsfileinfo origdatablock -s *.pyc,*~ " \
+            " -p 99001234/mymeta2_00011 -c group1 %s" % self.__dirname
+        result = subprocess.run(
+            command, shell=True, text=True, capture_output=True, check=True)
+        self.assertEqual(pool.run(command), result.stdout)
+
+        fiofile = os.path.join(self.__dirname, "mymeta2_00011.fio")
+        jsonfile = os.path.join(self.__dirname, "mymeta2_00011.scan.json")
+        self.assertEqual(
+            pool.run("nxsfileinfo metadata -k4 -o %s %s"
+                     % (jsonfile, fiofile)), "")
+        self.assertTrue(os.path.isfile(jsonfile))
+        self.assertEqual(pool.run("echo 'my generator'"), "my generator\n")
+
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            pool.run("nxsfileinfo metadata --wrong-option %s" % fiofile)
+        self.assertEqual(cm.exception.returncode, 255)
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            pool.run("exit 3")
+        self.assertEqual(cm.exception.returncode, 3)
+
+    def test_recycle(self):
+        pool = GeneratorPool()
+        pool.configure({"generator_pool_size": 1,
+                        "generator_worker_max_jobs": 2})
+        pid1 = pool.run("echo $PPID")
+        self.assertEqual(pool.run("echo $PPID"), pid1)
+        pid2 = pool.run("echo $PPID")
+        self.assertNotEqual(pid2, pid1)
+        self.assertEqual(pool.run("echo $PPID"), pid2)
+
+    def test_timeout_and_crash(self):
+        pool = GeneratorPool()
+        pool.configure({"generator_pool_size": 1,
+                        "generator_job_timeout": 1})
+        pid = pool.run("echo $PPID")
+        with self.assertRaises(subprocess.TimeoutExpired):
+            pool.run("sleep 10")
+        pid2 = pool.run("echo $PPID")
+        self.assertNotEqual(pid2, pid)
+
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            pool.run("kill -9 $PPID")
+        self.assertEqual(cm.exception.returncode, -9)
+        self.assertNotEqual(pool.run("echo $PPID"), pid2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import time
+import threading
+import logging
+
+from scingestor.ingestScheduler import IngestScheduler
+from scingestor.logger import init_logger
+
+
+# test fixture
+class IngestSchedulerTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        if IngestScheduler._scheduler is not None:
+            IngestScheduler._scheduler.stop()
+        IngestScheduler._scheduler = None
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatIngestScheduler", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+
+    def tearDown(self):
+        IngestScheduler().stop()
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_key_order(self):
+        scheduler = IngestScheduler()
+        scheduler.configure({"ingestion_workers_number": 4})
+        self.assertEqual(scheduler.workers_number, 4)
+        done = []
+        lock = threading.Lock()
+
+        def job(key, nr):
+            time.sleep(0.01)
+            with lock:
+                done.append((key, nr))
+
+        for nr in range(5):
+            for key in ["a", "b", "c"]:
+                self.assertTrue(
+                    scheduler.submit(
+                        key, lambda k=key, n=nr: job(k, n)))
+        for key in ["a", "b", "c"]:
+            self.assertTrue(scheduler.wait(key, 10))
+            self.assertEqual(scheduler.pending(key), 0)
+            self.assertEqual(
+                [nr for ky, nr in done if ky == key], list(range(5)))
+
+    def test_lanes(self):
+        scheduler = IngestScheduler()
+        started = threading.Event()
+        release = threading.Event()
+        done = []
+
+        def block():
+            started.set()
+            release.wait(10)
+
+        self.assertTrue(scheduler.submit("block", block))
+        for key in ["r1", "r2"]:
+            self.assertTrue(scheduler.submit(
+                key, lambda k=key: done.append(k),
+                IngestScheduler.REINGEST))
+        for key in ["f1", "f2"]:
+            self.assertTrue(scheduler.submit(
+                key, lambda k=key: done.append(k),
+                IngestScheduler.FRESH))
+        scheduler.configure({"ingestion_workers_number": 1})
+        self.assertTrue(started.wait(10))
+        release.set()
+        for key in ["r1", "r2", "f1", "f2"]:
+            self.assertTrue(scheduler.wait(key, 10))
+        self.assertEqual(done, ["f1", "f2", "r1", "r2"])
+
+    def test_backpressure_cancel(self):
+        scheduler = IngestScheduler()
+        scheduler.configure({"ingestion_queue_size": 2})
+        self.assertEqual(scheduler.queue_size, 2)
+        done = []
+        self.assertTrue(scheduler.submit("a", lambda: done.append(1)))
+        self.assertTrue(scheduler.submit("b", lambda: done.append(2)))
+        start = time.time()
+        self.assertFalse(
+            scheduler.submit("c", lambda: done.append(3), timeout=0.2))
+        self.assertTrue(time.time() - start >= 0.2)
+        self.assertEqual(scheduler.pending("a"), 1)
+        self.assertEqual(scheduler.cancel("a"), 1)
+        self.assertEqual(scheduler.pending("a"), 0)
+        self.assertTrue(
+            scheduler.submit("c", lambda: done.append(3), timeout=0.2))
+        scheduler.configure({"ingestion_workers_number": 2})
+        self.assertTrue(scheduler.wait("b", 10))
+        self.assertTrue(scheduler.wait("c", 10))
+        self.assertEqual(sorted(done), [2, 3])
+
+    def test_one_job_per_key(self):
+        scheduler = IngestScheduler()
+        scheduler.configure({"ingestion_workers_number": 4})
+        lock = threading.Lock()
+        running = {}
+        maxrunning = {}
+
+        def job(key):
+            with lock:
+                running[key] = running.get(key, 0) + 1
+                maxrunning[key] = max(maxrunning.get(key, 0), running[key])
+                maxrunning["all"] = max(
+                    maxrunning.get("all", 0), sum(running.values()))
+            time.sleep(0.05)
+            with lock:
+                running[key] -= 1
+
+        for nr in range(4):
+            for key in ["a", "b"]:
+                self.assertTrue(
+                    scheduler.submit(key, lambda k=key: job(k)))
+        for key in ["a", "b"]:
+            self.assertTrue(scheduler.wait(key, 10))
+        # jobs of one key never overlap, jobs of other keys do
+        self.assertEqual(maxrunning["a"], 1)
+        self.assertEqual(maxrunning["b"], 1)
+        self.assertEqual(maxrunning["all"], 2)
+
+    def test_submit_blocks(self):
+        scheduler = IngestScheduler()
+        scheduler.configure({"ingestion_queue_size": 1})
+        done = []
+        results = []
+        self.assertTrue(scheduler.submit("a", lambda: done.append("a")))
+
+        def submit():
+            results.append(scheduler.submit("b", lambda: done.append("b")))
+
+        th = threading.Thread(target=submit)
+        th.start()
+        th.join(0.3)
+        # the full queue blocks the submission
+        self.assertTrue(th.is_alive())
+        self.assertEqual(results, [])
+        scheduler.configure({"ingestion_workers_number": 1})
+        th.join(10)
+        self.assertEqual(results, [True])
+        self.assertTrue(scheduler.wait("b", 10))
+        self.assertEqual(done, ["a", "b"])
+
+        # a stopped scheduler rejects jobs of blocked submissions
+        scheduler.configure({"ingestion_workers_number": 0})
+        time.sleep(0.1)
+        self.assertTrue(scheduler.submit("c", lambda: None))
+        th = threading.Thread(target=submit)
+        th.start()
+        th.join(0.2)
+        self.assertTrue(th.is_alive())
+        scheduler.stop()
+        th.join(10)
+        self.assertEqual(results, [True, False])
+
+    def test_unregister_stop(self):
+        scheduler = IngestScheduler()
+        scheduler.register("w1")
+        scheduler.register("w2")
+        scheduler.configure({"ingestion_workers_number": 1})
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(10)
+
+        self.assertTrue(scheduler.submit("a", block))
+        self.assertTrue(started.wait(10))
+        self.assertTrue(scheduler.submit("a", lambda: None))
+        self.assertFalse(scheduler.wait("a", 0.1))
+        scheduler.unregister("w1")
+        self.assertTrue(scheduler.running)
+        self.assertTrue(IngestScheduler() is scheduler)
+        scheduler.unregister("w2")
+        self.assertFalse(scheduler.running)
+        self.assertEqual(scheduler.pending("a"), 1)
+        release.set()
+        self.assertTrue(scheduler.wait("a", 10))
+        self.assertEqual(scheduler.pending("a"), 0)
+        self.assertFalse(scheduler.submit("b", lambda: None))
+        self.assertTrue(IngestScheduler() is not scheduler)
+
+
+if __name__ == '__main__':
+    unittest.main()
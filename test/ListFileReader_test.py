@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import sys
+
+from scingestor.listFileReader import ListFileReader
+
+
+# test fixture
+class ListFileReaderTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+
+    def write(self, fname, text, mode="a"):
+        with open(fname, mode) as fl:
+            fl.write(text)
+
+    def test_append(self):
+        fun = sys._getframe().f_code.co_name
+        fname = "%s_%s.lst" % (self.__class__.__name__, fun)
+        try:
+            self.write(fname, "scan_00001\n\nscan_00002\n", "w")
+            reader = ListFileReader(fname)
+            self.assertTrue(reader.read())
+            self.assertEqual(reader.lines, ["scan_00001", "scan_00002"])
+            self.assertEqual(reader.appended, 2)
+            self.assertEqual(reader._ListFileReader__offset, 23)
+            self.assertFalse(reader.read())
+            self.assertEqual(reader.appended, 0)
+
+            self.write(fname, "scan_00003\nscan_0")
+            self.assertFalse(reader.read())
+            self.assertEqual(reader.appended, 1)
+            # the unfinished line is read again
+            self.assertEqual(reader._ListFileReader__offset, 34)
+            self.assertEqual(
+                reader.all_lines(),
+                ["scan_00001", "scan_00002", "scan_00003", "scan_0"])
+
+            self.write(fname, "0004 \n")
+            self.assertFalse(reader.read())
+            self.assertEqual(reader.appended, 1)
+            self.assertEqual(reader.tail, "")
+            self.assertEqual(reader._ListFileReader__offset, 46)
+            self.assertEqual(
+                reader.all_lines(),
+                ["scan_00001", "scan_00002", "scan_00003", "scan_00004"])
+        finally:
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def test_guard(self):
+        fun = sys._getframe().f_code.co_name
+        fname = "%s_%s.lst" % (self.__class__.__name__, fun)
+        scans = ["scan_%05d" % nr for nr in range(1, 11)]
+        try:
+            self.write(fname, "".join(sc + "\n" for sc in scans), "w")
+            reader = ListFileReader(fname)
+            self.assertTrue(reader.read())
+            self.assertEqual(
+                len(reader._ListFileReader__guard), ListFileReader.guard_size)
+
+            # a change before the last 64 bytes is not detected
+            with open(fname, "r+") as fl:
+                fl.write("scan_00000")
+            self.write(fname, "scan_00011\n")
+            self.assertFalse(reader.read())
+            self.assertEqual(reader.lines, scans + ["scan_00011"])
+
+            # a change within the last 64 bytes forces a full read
+            with open(fname, "r+") as fl:
+                fl.seek(110)
+                fl.write("scan_00012")
+            self.write(fname, "scan_00013\n")
+            self.assertTrue(reader.read())
+            self.assertEqual(
+                reader.lines,
+                ["scan_00000"] + scans[1:] + ["scan_00012", "scan_00013"])
+            self.assertFalse(reader.read())
+        finally:
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def test_truncate(self):
+        fun = sys._getframe().f_code.co_name
+        fname = "%s_%s.lst" % (self.__class__.__name__, fun)
+        try:
+            self.write(fname, "scan_00001\nscan_00002\n", "w")
+            reader = ListFileReader(fname)
+            self.assertTrue(reader.read())
+
+            # truncated
+            self.write(fname, "scan_00005\n", "w")
+            self.assertTrue(reader.read())
+            self.assertEqual(reader.lines, ["scan_00005"])
+            self.assertEqual(reader._ListFileReader__offset, 11)
+
+            # rewritten in place with a longer content
+            self.write(fname, "scan_00007\nscan_00008\n", "w")
+            self.assertTrue(reader.read())
+            self.assertEqual(reader.lines, ["scan_00007", "scan_00008"])
+            self.assertFalse(reader.read())
+        finally:
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def test_rotate(self):
+        fun = sys._getframe().f_code.co_name
+        fname = "%s_%s.lst" % (self.__class__.__name__, fun)
+        tmpname = fname + ".tmp"
+        try:
+            self.write(fname, "scan_00007\nscan_00008\n", "w")
+            reader = ListFileReader(fname)
+            self.assertTrue(reader.read())
+            inode = reader._ListFileReader__inode
+
+            # replaced by another file with the same content
+            self.write(tmpname, "scan_00007\nscan_00008\n", "w")
+            os.rename(tmpname, fname)
+            self.assertTrue(reader.read())
+            self.assertNotEqual(reader._ListFileReader__inode, inode)
+            self.assertEqual(reader.lines, ["scan_00007", "scan_00008"])
+            self.assertFalse(reader.read())
+
+            # replaced by another file with an appended line
+            self.write(tmpname, "scan_00007\nscan_00008\nscan_00009\n", "w")
+            os.rename(tmpname, fname)
+            self.assertTrue(reader.read())
+            self.assertEqual(reader.appended, 3)
+            self.assertEqual(
+                reader.lines, ["scan_00007", "scan_00008", "scan_00009"])
+        finally:
+            for fn in [fname, tmpname]:
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+
+if __name__ == '__main__':
+    unittest.main()
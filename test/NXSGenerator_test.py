@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import sys
+import shutil
+import threading
+import subprocess
+import logging
+
+from nxstools.nxsargparser import Runner
+
+from scingestor.nxsGenerator import NXSGenerator
+from scingestor.logger import init_logger
+
+
+# test fixture
+class NXSGeneratorTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+        self.__path = os.path.abspath(os.path.dirname(__file__))
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatNXSGenerator", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_generator_current")
+        os.mkdir(self.__dirname)
+        shutil.copy(
+            os.path.join(self.__path, "config", "mymeta2_00011.fio"),
+            self.__dirname)
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_arguments(self):
+        gen = NXSGenerator()
+        self.assertEqual(
+            gen.arguments(
+                "nxsfileinfo metadata -k4  -o /tmp/scan.scan.json "
+                " -z 'my measurement' -p 99001234/scan"),
+            ["metadata", "-k4", "-o", "/tmp/scan.scan.json",
+             "-z", "my measurement", "-p", "99001234/scan"])
+        self.assertEqual(
+            gen.arguments("/usr/bin/nxsfileinfo attachment -o a.json"),
+            ["attachment", "-o", "a.json"])
+        self.assertEqual(
+            gen.arguments("nxsfileinfo origdatablock /scan | tee a"), None)
+        self.assertEqual(
+            gen.arguments("nxsfileinfo origdatablock /scan > a"), None)
+        self.assertEqual(
+            gen.arguments("nxsfileinfo metadata -o $HOME/a"), None)
+        self.assertEqual(gen.arguments("nxsfileinfo general a.nxs"), None)
+        self.assertEqual(gen.arguments("mygenerator metadata a.nxs"), None)
+        self.assertEqual(gen.arguments("nxsfileinfo metadata 'a"), None)
+
+    def test_stream_command(self):
+        gen = NXSGenerator()
+        self.assertEqual(
+            gen.stream_command(
+                "nxsfileinfo metadata -k4  -o /tmp/scan.scan.json "
+                " -x 0o662 -z 'my measurement' -p 99001234/scan"),
+            ("nxsfileinfo metadata -k4 -x 0o662 -z 'my measurement' "
+             "-p 99001234/scan", "/tmp/scan.scan.json", 0o662))
+        self.assertEqual(
+            gen.stream_command(
+                "/usr/bin/nxsfileinfo attachment --output=a.json b.fio"),
+            ("/usr/bin/nxsfileinfo attachment b.fio", "a.json", None))
+        self.assertEqual(
+            gen.stream_command("nxsfileinfo origdatablock /scan"), None)
+        self.assertEqual(
+            gen.stream_command("nxsfileinfo metadata -o a.json | tee b"),
+            None)
+
+    def test_metadata(self):
+        gen = NXSGenerator()
+        fiofile = os.path.join(self.__dirname, "mymeta2_00011.fio")
+        command = "nxsfileinfo metadata -k4 -p 99001234/mymeta2_00011 " \
+            " -o %s %s"
+        subprocess.run(
+            command % (os.path.join(self.__dirname, "sh.json"), fiofile),
+            shell=True, check=True)
+        self.assertEqual(
+            gen.run(command % (
+                os.path.join(self.__dirname, "ip.json"), fiofile)), "")
+        with open(os.path.join(self.__dirname, "sh.json")) as fl:
+            shmeta = fl.read()
+        with open(os.path.join(self.__dirname, "ip.json")) as fl:
+            self.assertEqual(fl.read(), shmeta)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            gen.run("nxsfileinfo metadata --wrong-option %s" % fiofile)
+
+    def test_captured_output(self):
+        gen = NXSGenerator()
+        command = "nxsfileinfo origdatablock -s *.pyc,*~ " \
+            " -p 99001234/mymeta2_00011 -c group1,group2 %s" % self.__dirname
+        result = subprocess.run(
+            command, shell=True, text=True, capture_output=True, check=True)
+        stdout = sys.stdout
+        outputs = [None] * 4
+
+        def generate(nr):
+            outputs[nr] = gen.run(command)
+
+        threads = [threading.Thread(target=generate, args=(nr,))
+                   for nr in range(4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual(outputs, [result.stdout] * 4)
+        # the original output is restored
+        self.assertTrue(sys.stdout is stdout)
+
+    def test_chmod(self):
+        chmods = []
+
+        class UmaskRunner(Runner):
+
+            def create(self):
+                self._parser.add_argument("-o", "--output", dest="output")
+                self._parser.add_argument("-x", "--chmod", dest="chmod")
+
+            def run(self, options):
+                # the output permissions are not passed to nxsfileinfo
+                chmods.append(options.chmod)
+                with open(options.output, "w") as fl:
+                    fl.write("{}")
+
+        gen = NXSGenerator({"metadata": UmaskRunner})
+        output = os.path.join(self.__dirname, "ip.json")
+        umask = os.umask(0o022)
+        try:
+            gen.run("nxsfileinfo metadata -x 0o640 -o %s" % output)
+            self.assertEqual(os.stat(output).st_mode & 0o777, 0o640)
+            gen.run("nxsfileinfo metadata -x 0o604 -o %s" % output)
+            self.assertEqual(os.stat(output).st_mode & 0o777, 0o604)
+            # the process umask is not changed
+            self.assertEqual(os.umask(0o022), 0o022)
+        finally:
+            os.umask(umask)
+        self.assertEqual(chmods, [None, None])
+
+    def test_errors(self):
+
+        class FailingRunner(Runner):
+
+            def run(self, options):
+                raise ValueError("wrong value")
+
+        gen = NXSGenerator({"metadata": FailingRunner})
+        stdout = sys.stdout
+        with self.assertRaises(subprocess.CalledProcessError):
+            gen.run("nxsfileinfo metadata")
+        self.assertTrue(sys.stdout is stdout)
+
+    def test_parallel(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        class WaitingRunner(Runner):
+
+            def run(self, options):
+                barrier.wait()
+                print("done")
+
+        gen = NXSGenerator({"metadata": WaitingRunner})
+        outputs = [None] * 2
+
+        def generate(nr):
+            outputs[nr] = gen.run("nxsfileinfo metadata")
+
+        threads = [threading.Thread(target=generate, args=(nr,))
+                   for nr in range(2)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        # both commands wait for each other without a generation lock
+        self.assertFalse(barrier.broken)
+        self.assertEqual(outputs, ["done\n"] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import queue
+import shutil
+import time
+import logging
+
+import inotifyx
+
+from scingestor.pollingNotifier import PollingNotifier, get_notifier
+from scingestor.safeINotifier import SafeINotifier
+from scingestor.logger import init_logger
+
+
+# test fixture
+class PollingNotifierTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+        self.__config = {
+            "notifier_backend": "polling",
+            "polling_min_interval": 0.1,
+            "polling_max_interval": 0.4,
+            "polling_max_stat_rate": 1000,
+        }
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatPollingNotifier", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_polling_current")
+        os.mkdir(self.__dirname)
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def events(self, wqueue, timeout=1.0):
+        res = []
+        try:
+            while True:
+                event = wqueue.get(timeout=timeout)
+                res.append((event.name, event.mask))
+        except queue.Empty:
+            pass
+        return res
+
+    def test_get_notifier(self):
+        self.assertTrue(isinstance(get_notifier({}), SafeINotifier))
+        notifier = get_notifier(self.__config)
+        self.assertTrue(isinstance(notifier, PollingNotifier))
+        self.assertTrue(notifier is PollingNotifier())
+        self.assertEqual(notifier.min_interval, 0.1)
+        self.assertEqual(notifier.max_interval, 0.4)
+        self.assertEqual(notifier.max_stat_rate, 1000)
+
+    def test_directory_events(self):
+        notifier = get_notifier(self.__config)
+        wqueue, qid = notifier.add_watch(
+            self.__dirname,
+            inotifyx.IN_CREATE | inotifyx.IN_CLOSE_WRITE |
+            inotifyx.IN_DELETE)
+        try:
+            fname = os.path.join(self.__dirname, "file1.nxs")
+            with open(fname, "w") as fl:
+                fl.write("data")
+            self.assertEqual(
+                self.events(wqueue),
+                [("file1.nxs", inotifyx.IN_CREATE),
+                 ("file1.nxs", inotifyx.IN_CLOSE_WRITE)])
+
+            os.mkdir(os.path.join(self.__dirname, "scan1"))
+            event = wqueue.get(timeout=5)
+            self.assertEqual(event.name, "scan1")
+            self.assertEqual(event.qid, qid)
+            self.assertEqual(
+                event.mask, inotifyx.IN_CREATE | inotifyx.IN_ISDIR)
+
+            os.remove(fname)
+            self.assertEqual(
+                self.events(wqueue), [("file1.nxs", inotifyx.IN_DELETE)])
+        finally:
+            notifier.rm_watch(qid)
+
+    def test_file_events(self):
+        notifier = get_notifier(self.__config)
+        fname = os.path.join(self.__dirname, "file1.lst")
+        with open(fname, "w") as fl:
+            fl.write("scan_00001\n")
+        wqueue, qid = notifier.add_watch(fname, inotifyx.IN_CLOSE_WRITE)
+        with open(fname, "a") as fl:
+            fl.write("scan_00002\n")
+        self.assertEqual(
+            self.events(wqueue), [("", inotifyx.IN_CLOSE_WRITE)])
+
+        os.remove(fname)
+        self.assertEqual(
+            self.events(wqueue), [("", inotifyx.IN_IGNORED)])
+        notifier.rm_watch(qid)
+
+    def test_adaptive_interval(self):
+        notifier = get_notifier(self.__config)
+        hdir = os.path.join(self.__dirname, "hot")
+        os.mkdir(hdir)
+        hqueue, hqid = notifier.add_watch(hdir, inotifyx.IN_CREATE)
+        iqueue, iqid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE)
+        watches = notifier._PollingNotifier__path_watch
+        try:
+            for nr in range(10):
+                with open(os.path.join(hdir, "file%s.nxs" % nr), "w"):
+                    pass
+                time.sleep(0.05)
+            self.assertEqual(watches[hdir].interval, 0.1)
+            self.assertEqual(watches[self.__dirname].interval, 0.4)
+            self.assertEqual(len(self.events(hqueue)), 10)
+            self.assertEqual(self.events(iqueue, 0.1), [])
+        finally:
+            notifier.rm_watch(hqid)
+            notifier.rm_watch(iqid)
+
+    def test_stat_rate(self):
+        config = dict(self.__config)
+        config["polling_max_stat_rate"] = 100
+        notifier = get_notifier(config)
+        for nr in range(49):
+            with open(os.path.join(self.__dirname, "file%s.nxs" % nr), "w"):
+                pass
+        wqueue, qid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE | inotifyx.IN_CLOSE_WRITE)
+        try:
+            with open(os.path.join(self.__dirname, "file.nxs"), "w"):
+                pass
+            self.assertEqual(
+                self.events(wqueue),
+                [("file.nxs", inotifyx.IN_CREATE),
+                 ("file.nxs", inotifyx.IN_CLOSE_WRITE)])
+            # each poll takes 51 stat calls, i.e. 2 polls per second
+            watch = notifier._PollingNotifier__path_watch[self.__dirname]
+            polls = []
+            start = time.time()
+            while len(polls) < 4 and time.time() - start < 10:
+                due = watch.due
+                time.sleep(0.01)
+                if watch.due != due:
+                    polls.append(time.monotonic())
+            self.assertEqual(len(polls), 4)
+            self.assertTrue(polls[-1] - polls[0] > 1.4)
+        finally:
+            notifier.rm_watch(qid)
+
+    def polls(self, watch, number):
+        polls = []
+        start = time.time()
+        while len(polls) < number and time.time() - start < 20:
+            due = watch.due
+            time.sleep(0.01)
+            if watch.due != due:
+                polls.append(time.monotonic())
+        return polls
+
+    def test_stat_rate_large(self):
+        config = dict(self.__config)
+        config["polling_max_stat_rate"] = 50
+        notifier = get_notifier(config)
+        for nr in range(99):
+            with open(os.path.join(self.__dirname, "file%s.nxs" % nr), "w"):
+                pass
+        wqueue, qid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CLOSE_WRITE)
+        try:
+            # each poll takes 100 stat calls, i.e. 1 poll in 2 seconds
+            watch = notifier._PollingNotifier__path_watch[self.__dirname]
+            polls = self.polls(watch, 3)
+            self.assertEqual(len(polls), 3)
+            self.assertTrue(polls[-1] - polls[0] > 3.5)
+        finally:
+            notifier.rm_watch(qid)
+
+    def test_names_only(self):
+        config = dict(self.__config)
+        config["polling_max_interval"] = 0.1
+        config["polling_max_stat_rate"] = 100
+        notifier = get_notifier(config)
+        for nr in range(49):
+            with open(os.path.join(self.__dirname, "file%s.nxs" % nr), "w"):
+                pass
+        wqueue, qid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE | inotifyx.IN_DELETE)
+        try:
+            watch = notifier._PollingNotifier__path_watch[self.__dirname]
+            self.assertEqual(
+                set(en[:2] for en in watch.entries.values()),
+                set([(None, None)]))
+            # a poll of the directory takes one stat call
+            # instead of 50, i.e. 10 polls per second instead of 2
+            polls = self.polls(watch, 6)
+            self.assertEqual(len(polls), 6)
+            self.assertTrue(polls[-1] - polls[0] < 1.5)
+
+            fname = os.path.join(self.__dirname, "file.nxs")
+            with open(fname, "w") as fl:
+                fl.write("data")
+            os.mkdir(os.path.join(self.__dirname, "scan1"))
+            with open(os.path.join(self.__dirname, "file1.nxs"), "a") as fl:
+                fl.write("data")
+            self.assertEqual(
+                sorted(self.events(wqueue)),
+                [("file.nxs", inotifyx.IN_CREATE),
+                 ("scan1", inotifyx.IN_CREATE | inotifyx.IN_ISDIR)])
+            os.remove(fname)
+            self.assertEqual(
+                self.events(wqueue), [("file.nxs", inotifyx.IN_DELETE)])
+
+            # a subscriber of modifications reads the entry status
+            mqueue, mqid = notifier.add_watch(
+                self.__dirname, inotifyx.IN_CLOSE_WRITE)
+            self.assertEqual(self.events(mqueue, 0.5), [])
+            with open(os.path.join(self.__dirname, "file2.nxs"), "a") as fl:
+                fl.write("data")
+            self.assertEqual(
+                self.events(mqueue),
+                [("file2.nxs", inotifyx.IN_CLOSE_WRITE)])
+            self.assertEqual(self.events(wqueue, 0.1), [])
+            notifier.rm_watch(mqid)
+        finally:
+            notifier.rm_watch(qid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import queue
+import shutil
+import time
+import logging
+
+import inotifyx
+
+from scingestor.safeINotifier import SafeINotifier
+from scingestor.logger import init_logger
+
+
+# test fixture
+class SafeINotifierTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+        self.__notifier = None
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatSafeINotifier", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_notifier_current")
+        os.mkdir(self.__dirname)
+        # a fresh notifier thread for every test
+        if SafeINotifier._notifier is not None:
+            SafeINotifier._notifier.stop()
+            SafeINotifier._notifier.join()
+        self.__notifier = SafeINotifier()
+
+    def tearDown(self):
+        if self.__notifier is not None:
+            self.__notifier.stop()
+            self.__notifier.join()
+            self.__notifier = None
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def events(self, wqueue, timeout=1.5):
+        res = []
+        try:
+            while True:
+                event = wqueue.get(timeout=timeout)
+                res.append((event.name, event.mask))
+        except queue.Empty:
+            pass
+        return res
+
+    def test_merged_masks(self):
+        notifier = self.__notifier
+        cqueue, cqid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE)
+        wqueue, wqid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CLOSE_WRITE)
+        time.sleep(1.5)
+        fname = os.path.join(self.__dirname, "file1.nxs")
+        with open(fname, "w") as fl:
+            fl.write("data")
+        self.assertEqual(
+            self.events(cqueue), [("file1.nxs", inotifyx.IN_CREATE)])
+        self.assertEqual(
+            self.events(wqueue), [("file1.nxs", inotifyx.IN_CLOSE_WRITE)])
+
+        notifier.rm_watch(cqid)
+        time.sleep(1.5)
+        with open(os.path.join(self.__dirname, "file2.nxs"), "w") as fl:
+            fl.write("data")
+        self.assertEqual(
+            self.events(wqueue), [("file2.nxs", inotifyx.IN_CLOSE_WRITE)])
+        notifier.rm_watch(wqid)
+
+    def test_event_data(self):
+        notifier = self.__notifier
+        wqueue, qid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE)
+        time.sleep(1.5)
+        os.mkdir(os.path.join(self.__dirname, "scan1"))
+        event = wqueue.get(timeout=5)
+        notifier.rm_watch(qid)
+        self.assertEqual(event.name, "scan1")
+        self.assertEqual(event.qid, qid)
+        self.assertEqual(event.mask, inotifyx.IN_CREATE | inotifyx.IN_ISDIR)
+        self.assertTrue(event.mask & inotifyx.IN_ISDIR)
+        self.assertTrue("IN_CREATE" in event.masks.split("|"))
+        self.assertTrue("IN_ISDIR" in event.masks.split("|"))
+        self.assertEqual(str(event), event.masks)
+
+    def test_queue_overflow(self):
+        notifier = self.__notifier
+        subdir = os.path.join(self.__dirname, "scan1")
+        os.mkdir(subdir)
+        fnames = [os.path.join(self.__dirname, "file1.nxs"),
+                  os.path.join(self.__dirname, "file2.nxs")]
+        for fname in fnames:
+            with open(fname, "w") as fl:
+                fl.write("data")
+        wqueue, wqid = notifier.add_watch(
+            self.__dirname, inotifyx.IN_ATTRIB)
+        squeue, sqid = notifier.add_watch(subdir, inotifyx.IN_CREATE)
+        time.sleep(1.5)
+        # the notifier thread does not read events
+        with notifier._SafeINotifier__id_queue_lock:
+            # consecutive identical events are merged
+            for nr in range(20000):
+                os.utime(fnames[nr % 2])
+        try:
+            for qid, wq in [(wqid, wqueue), (sqid, squeue)]:
+                overflow = []
+                start = time.time()
+                while not overflow and time.time() - start < 10:
+                    event = wq.get(timeout=5)
+                    if event.mask & inotifyx.IN_Q_OVERFLOW:
+                        overflow.append(event)
+                self.assertEqual(len(overflow), 1)
+                self.assertEqual(overflow[0].name, "")
+                self.assertEqual(overflow[0].qid, qid)
+        finally:
+            notifier.rm_watch(wqid)
+            notifier.rm_watch(sqid)
+
+    def test_restart(self):
+        notifier = self.__notifier
+        self.assertTrue(SafeINotifier() is notifier)
+        # a notifier thread which died without being stopped
+        notifier.stop()
+        notifier.join()
+        notifier.running = True
+        self.__notifier = SafeINotifier()
+        self.assertTrue(self.__notifier is not notifier)
+        self.assertTrue(self.__notifier.is_alive())
+        wqueue, qid = self.__notifier.add_watch(
+            self.__dirname, inotifyx.IN_CREATE)
+        time.sleep(1.5)
+        os.mkdir(os.path.join(self.__dirname, "scan1"))
+        event = wqueue.get(timeout=5)
+        self.__notifier.rm_watch(qid)
+        self.assertEqual(event.name, "scan1")
+
+
+if __name__ == '__main__':
+    unittest.main()
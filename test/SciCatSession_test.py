@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import threading
+import json
+
+from scingestor.sciCatSession import SciCatSession
+
+try:
+    from .SciCatTestServer import SciCatTestServer, SciCatMockHandler
+except Exception:
+    from SciCatTestServer import SciCatTestServer, SciCatMockHandler
+
+
+# test fixture
+class SciCatSessionTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__server = None
+        self.__thread = None
+
+    def setUp(self):
+        self.__server = SciCatTestServer(('', 8881), SciCatMockHandler)
+        self.__thread = threading.Thread(None, self.__server.run)
+        self.__thread.start()
+
+    def tearDown(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.__thread = None
+        SciCatSession().configure({})
+
+    def test_singleton(self):
+        session = SciCatSession()
+        self.assertTrue(session is SciCatSession())
+
+    def test_configure(self):
+        session = SciCatSession()
+        session.configure({
+            "request_pool_connections": 3,
+            "request_pool_maxsize": 7,
+            "request_pool_block": True,
+        })
+        self.assertEqual(session.pool_connections, 3)
+        self.assertEqual(session.pool_maxsize, 7)
+        self.assertEqual(session.pool_block, True)
+        adapter = session.session().get_adapter("http://localhost:8881")
+        self.assertEqual(adapter._pool_connections, 3)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter._pool_block, True)
+
+    def test_thread_sessions(self):
+        session = SciCatSession()
+        sessions = []
+
+        def getsession():
+            sessions.append(session.session())
+
+        thread = threading.Thread(target=getsession)
+        thread.start()
+        thread.join()
+        getsession()
+        self.assertEqual(len(sessions), 2)
+        self.assertTrue(sessions[0] is not sessions[1])
+        self.assertTrue(
+            sessions[0].get_adapter("http://localhost:8881") is
+            sessions[1].get_adapter("http://localhost:8881"))
+        self.assertTrue(sessions[1] is session.session())
+
+    def test_requests(self):
+        session = SciCatSession()
+        headers = {'Content-Type': 'application/json',
+                   'Accept': 'application/json'}
+        for _ in range(3):
+            response = session.post(
+                "http://localhost:8881/Users/login",
+                headers=headers,
+                json={"username": "myingestor", "password": "12342345"})
+            self.assertTrue(response.ok)
+            self.assertTrue(json.loads(response.content)["id"])
+        self.assertEqual(len(self.__server.userslogin), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+
+import unittest
+import os
+import shutil
+import sqlite3
+import logging
+
+from scingestor.stateStore import StateStore
+from scingestor.datasetIngestor import DatasetIngestor
+from scingestor.logger import init_logger
+
+
+# test fixture
+class StateStoreTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatStateStore", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+        self.__dirname = os.path.abspath("test_statestore_current")
+        os.mkdir(self.__dirname)
+        self.__dbfile = os.path.join(self.__dirname, "state.db")
+        self.__idsfile = os.path.join(
+            self.__dirname, "scicat-ingested-datasets-99001234.lst")
+
+    def tearDown(self):
+        if os.path.isdir(self.__dirname):
+            shutil.rmtree(self.__dirname)
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_update(self):
+        store = StateStore(self.__dbfile, batch_size=2)
+        store.update("99001234", self.__idsfile, "scan_00001",
+                     1700000000.5, 1700000001.0, 0, "99001234/scan_00001")
+        self.assertEqual(
+            store.get("99001234", self.__idsfile, "scan_00001"),
+            (1700000000.5, 1700000001.0, 0, "99001234/scan_00001", None))
+        store.update("99001234", self.__idsfile, "scan_00001",
+                     1700000000.5, -1, 0, None,
+                     "origdatablock ingestion failed")
+        self.assertEqual(
+            store.get("99001234", self.__idsfile, "scan_00001"),
+            (1700000000.5, -1, 0, "99001234/scan_00001",
+             "origdatablock ingestion failed"))
+        self.assertEqual(store.get("99001234", self.__idsfile, "scan_2"),
+                         None)
+        self.assertEqual(store.size("99001234", self.__idsfile), 1)
+        self.assertEqual(store.size("99001235", self.__idsfile), 0)
+
+        # the second update finished a batch
+        db = sqlite3.connect(self.__dbfile)
+        try:
+            self.assertEqual(
+                db.execute("SELECT scan, pid FROM ingested").fetchall(),
+                [("scan_00001", "99001234/scan_00001")])
+            store.update("99001234", self.__idsfile, "scan_00002",
+                         1.0, 2.0, 3.0)
+            self.assertEqual(
+                db.execute("SELECT COUNT(*) FROM ingested").fetchone(),
+                (1,))
+            store.flush()
+            self.assertEqual(
+                db.execute("SELECT COUNT(*) FROM ingested").fetchone(),
+                (2,))
+            self.assertEqual(
+                db.execute("PRAGMA journal_mode").fetchone(), ("wal",))
+        finally:
+            db.close()
+            store.close()
+
+    def test_import_export(self):
+        with open(self.__idsfile, "w") as fl:
+            fl.write("scan_00001 1700000000.5 1700000001.0 0\n"
+                     "scan_00002\n"
+                     "scan_00003:1 e1 1700000002.0 -1 0.0\n"
+                     "scan_00001 1700000003.0 1700000004.0 0.0\n")
+        store = StateStore(self.__dbfile)
+        try:
+            self.assertEqual(
+                store.import_list("99001234", self.__idsfile), 4)
+            self.assertEqual(store.size("99001234", self.__idsfile), 3)
+            self.assertEqual(
+                store.records("99001234", self.__idsfile),
+                [["scan_00001", "1700000003.0", "1700000004.0", "0.0"],
+                 ["scan_00002"],
+                 ["scan_00003:1", "e1", "1700000002.0", "-1.0", "0.0"]])
+            exported = os.path.join(self.__dirname, "exported.lst")
+            self.assertEqual(
+                store.export_list("99001234", self.__idsfile, exported), 3)
+            with open(exported) as fl:
+                self.assertEqual(
+                    fl.read(),
+                    "scan_00001 1700000003.0 1700000004.0 0.0\n"
+                    "scan_00002\n"
+                    "scan_00003:1 e1 1700000002.0 -1.0 0.0\n")
+        finally:
+            store.close()
+
+    def test_ingestor_check_list(self):
+        dsfile = os.path.join(
+            self.__dirname, "scicat-datasets-99001234.lst")
+        with open(dsfile, "w") as fl:
+            fl.write("scan_00001\nscan_00002\nscan_00003\n")
+        with open(self.__idsfile, "w") as fl:
+            fl.write("scan_00001 1700000000.5 1700000001.0 0\n"
+                     "scan_00002 1700000000.5 -1 0\n")
+        ingestor = DatasetIngestor(
+            {"ingestion_state_database": self.__dbfile},
+            self.__dirname, dsfile, self.__idsfile,
+            {"beamtimeId": "99001234", "proposalId": "99991173",
+             "beamline": "p00"},
+            os.path.join(self.__dirname, "beamtime-metadata-99001234.json"))
+        try:
+            ingestor.check_list()
+            self.assertEqual(ingestor.waiting_datasets(),
+                             ["scan_00002", "scan_00003"])
+            os.remove(self.__idsfile)
+            ingestor.check_list()
+            self.assertEqual(ingestor.waiting_datasets(),
+                             ["scan_00002", "scan_00003"])
+        finally:
+            ingestor.close()
+
+    def test_shared_release(self):
+        store = StateStore.open(self.__dbfile)
+        self.assertTrue(StateStore.open(self.__dbfile) is store)
+        store.update("99001234", self.__idsfile, "scan_00001", 1.0, 2.0, 3.0)
+        store.release()
+        self.assertEqual(store.size("99001234", self.__idsfile), 1)
+        store.release()
+        self.assertRaises(sqlite3.ProgrammingError,
+                          store.size, "99001234", self.__idsfile)
+        store2 = StateStore.open(self.__dbfile)
+        try:
+            self.assertTrue(store2 is not store)
+            self.assertEqual(store2.size("99001234", self.__idsfile), 1)
+        finally:
+            store2.release()
+
+    def test_import_any_ingested(self):
+        with open(self.__idsfile, "w") as fl:
+            fl.write("scan_00001 1700000000.5 1700000001.0 1700000001.5\n"
+                     "scan_00001 1700000002.0 -1 0.0\n"
+                     "scan_00002 1700000000.5 x 0\n"
+                     "scan_00003 1700000000.5 x 0\n"
+                     "scan_00003 1700000000.5 1700000001.0 0\n")
+        store = StateStore(self.__dbfile)
+        try:
+            self.assertEqual(
+                store.import_list("99001234", self.__idsfile), 5)
+            self.assertEqual(
+                store.records("99001234", self.__idsfile),
+                [["scan_00001", "1700000000.5", "1700000001.0",
+                  "1700000001.5"],
+                 ["scan_00001", "1700000002.0", "-1.0", "0.0"],
+                 ["scan_00002", "-1.0", "-1.0", "-1.0"],
+                 ["scan_00003", "1700000000.5", "1700000001.0", "0.0"]])
+            # a failed reingestion does not hide the ingested record
+            store.update("99001234", self.__idsfile, "scan_00003",
+                         1700000003.0, -1, 0)
+            self.assertEqual(
+                store.records("99001234", self.__idsfile)[3:],
+                [["scan_00003", "1700000000.5", "1700000001.0", "0.0"],
+                 ["scan_00003", "1700000003.0", "-1.0", "0.0"]])
+            store.update("99001234", self.__idsfile, "scan_00003",
+                         1700000004.0, 1700000005.0, 0)
+            self.assertEqual(
+                store.records("99001234", self.__idsfile)[3:],
+                [["scan_00003", "1700000004.0", "1700000005.0", "0.0"]])
+        finally:
+            store.close()
+
+    def test_ingestor_any_ingested(self):
+        dsfile = os.path.join(
+            self.__dirname, "scicat-datasets-99001234.lst")
+        with open(dsfile, "w") as fl:
+            fl.write("scan_00001\nscan_00002\nscan_00003\n")
+        with open(self.__idsfile, "w") as fl:
+            fl.write("scan_00001 1700000000.5 1700000001.0 0\n"
+                     "scan_00001 1700000002.5 -1 0\n"
+                     "scan_00002 1700000000.5 -1 0\n"
+                     "scan_00003 1700000000.5 x 0\n")
+        ids = []
+        for retry in [True, False]:
+            ingestor = DatasetIngestor(
+                {"ingestion_state_database": self.__dbfile,
+                 "retry_failed_dataset_ingestion": retry},
+                self.__dirname, dsfile, self.__idsfile,
+                {"beamtimeId": "99001234", "proposalId": "99991173",
+                 "beamline": "p00"},
+                os.path.join(
+                    self.__dirname, "beamtime-metadata-99001234.json"))
+            try:
+                ingestor.check_list()
+                ids.append(ingestor.waiting_datasets())
+            finally:
+                ingestor.close()
+        self.assertEqual(ids, [["scan_00002", "scan_00003"], []])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import time
+import threading
+import logging
+
+from scingestor.timerWheel import TimerWheel
+from scingestor.logger import init_logger
+
+
+# test fixture
+class TimerWheelTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__handlers = []
+
+    def setUp(self):
+        handlers = list(logging.getLogger().handlers)
+        init_logger("SciCatTimerWheel", "error")
+        self.__handlers = [hd for hd in logging.getLogger().handlers
+                           if hd not in handlers]
+
+    def tearDown(self):
+        for hd in self.__handlers:
+            logging.getLogger().removeHandler(hd)
+
+    def test_configure(self):
+        wheel = TimerWheel()
+        self.assertTrue(wheel is TimerWheel())
+        wheel.configure({"recheck_jitter": 0.3})
+        self.assertEqual(wheel.jitter, 0.3)
+        wheel.configure({"recheck_jitter": 5})
+        self.assertEqual(wheel.jitter, 1.)
+        wheel.configure({"recheck_jitter": 0.1})
+        self.assertEqual(wheel.jitter, 0.1)
+
+    def test_periodic(self):
+        wheel = TimerWheel()
+        wheel.configure({"recheck_jitter": 0})
+        calls = []
+        lock = threading.Lock()
+
+        def callback():
+            with lock:
+                calls.append(time.monotonic())
+
+        tid = wheel.add(0.5, callback)
+        try:
+            time.sleep(3.2)
+        finally:
+            self.assertTrue(wheel.cancel(tid))
+        self.assertFalse(wheel.cancel(tid))
+        ncalls = len(calls)
+        time.sleep(1.)
+        # the period does not depend on the event traffic
+        self.assertEqual(len(calls), ncalls)
+        self.assertTrue(ncalls in [6, 7])
+        for t1, t2 in zip(calls, calls[1:]):
+            self.assertTrue(abs(t2 - t1 - 0.5) < 0.15)
+        wheel.configure({"recheck_jitter": 0.1})
+
+    def test_jitter(self):
+        wheel = TimerWheel()
+        wheel.configure({"recheck_jitter": 0.5})
+        calls = {}
+        lock = threading.Lock()
+
+        def callback(nr):
+            def call():
+                with lock:
+                    calls.setdefault(nr, []).append(time.monotonic())
+            return call
+
+        tids = [wheel.add(1.0, callback(nr)) for nr in range(20)]
+        try:
+            time.sleep(3.5)
+        finally:
+            for tid in tids:
+                wheel.cancel(tid)
+            wheel.configure({"recheck_jitter": 0.1})
+        first = sorted(calls[nr][0] for nr in calls)
+        # the timers are not called at the same time
+        self.assertTrue(len(calls) > 15)
+        self.assertTrue(first[-1] - first[0] > 0.3)
+        for nr, times in calls.items():
+            for t1, t2 in zip(times, times[1:]):
+                self.assertTrue(0.4 < t2 - t1 < 1.6)
+
+    def test_idle_stop(self):
+        wheel = TimerWheel()
+        calls = []
+        tid = wheel.add(0.2, lambda: calls.append(1))
+        time.sleep(0.5)
+        wheel.cancel(tid)
+        expired = []
+        wheel._expired = lambda now: expired.append(now) or []
+        time.sleep(0.5)
+        # the wheel thread does not tick without timers
+        self.assertTrue(len(expired) <= 1)
+        thread = wheel._TimerWheel__thread
+        self.assertTrue(thread.is_alive())
+        wheel.stop()
+        thread.join(1.)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(TimerWheel() is not wheel)
+
+
+if __name__ == '__main__':
+    unittest.main()
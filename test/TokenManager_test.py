@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#   This file is part of scingestor - Scientific Catalog Dataset Ingestor
+#
+#    Copyright (C) 2021-2021 DESY, Jan Kotanski <jkotan@mail.desy.de>
+#
+#    nexdatas is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    nexdatas is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with scingestor.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#     Jan Kotanski <jan.kotanski@desy.de>
+#
+
+import unittest
+import os
+import sys
+import threading
+
+from scingestor.tokenManager import TokenManager
+
+try:
+    from .SciCatTestServer import SciCatTestServer, SciCatMockHandler
+except Exception:
+    from SciCatTestServer import SciCatTestServer, SciCatMockHandler
+
+
+# test fixture
+class TokenManagerTest(unittest.TestCase):
+
+    # constructor
+    # \param methodName name of the test method
+    def __init__(self, methodName):
+        unittest.TestCase.__init__(self, methodName)
+        self.__server = None
+        self.__thread = None
+        self.__url = "http://localhost:8881/Users/login"
+        self.__headers = {'Content-Type': 'application/json',
+                          'Accept': 'application/json'}
+        self.__token = "H3BxDGwgvnGbp5ZlhdksDKdIpljtEm8" \
+            "yilq1B7s7CygIaxbQRAMmZBgJ6JW2GjnX"
+
+    def setUp(self):
+        self.__server = SciCatTestServer(('', 8881), SciCatMockHandler)
+        self.__thread = threading.Thread(None, self.__server.run)
+        self.__thread.start()
+        TokenManager().clear()
+
+    def tearDown(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.__thread = None
+        TokenManager().clear()
+
+    def credfile(self, fun, content):
+        fname = "%s_%s.cred" % (self.__class__.__name__, fun)
+        with open(fname, "w") as fl:
+            fl.write(content)
+        return fname
+
+    def test_without_ttl(self):
+        fun = sys._getframe().f_code.co_name
+        credfile = self.credfile(fun, "12342345")
+        try:
+            manager = TokenManager()
+            cred = manager.credential(self.__url, credfile, "myingestor")
+            self.assertTrue(
+                cred is manager.credential(
+                    self.__url, credfile, "myingestor"))
+            for _ in range(3):
+                self.assertEqual(
+                    manager.get_token(cred, self.__headers), self.__token)
+            self.assertEqual(len(self.__server.userslogin), 3)
+            self.assertEqual(
+                self.__server.userslogin[0],
+                b'{"username": "myingestor", "password": "12342345"}')
+        finally:
+            os.remove(credfile)
+
+    def test_ttl(self):
+        fun = sys._getframe().f_code.co_name
+        credfile = self.credfile(fun, "12342345")
+        try:
+            manager = TokenManager()
+            cred = manager.credential(self.__url, credfile, "myingestor")
+            for _ in range(3):
+                self.assertEqual(
+                    manager.get_token(cred, self.__headers, 3600),
+                    self.__token)
+            self.assertEqual(len(self.__server.userslogin), 1)
+
+            # token expired
+            cred.expires -= 3600
+            self.assertEqual(
+                manager.get_token(cred, self.__headers, 3600),
+                self.__token)
+            self.assertEqual(len(self.__server.userslogin), 2)
+
+            # credential file changed
+            os.utime(credfile, (0, 0))
+            self.assertEqual(
+                manager.get_token(cred, self.__headers, 3600),
+                self.__token)
+            self.assertEqual(len(self.__server.userslogin), 3)
+            self.assertEqual(
+                manager.get_token(cred, self.__headers, 3600),
+                self.__token)
+            self.assertEqual(len(self.__server.userslogin), 3)
+        finally:
+            os.remove(credfile)
+
+    def test_refresh(self):
+        fun = sys._getframe().f_code.co_name
+        credfile = self.credfile(fun, "12342345")
+        try:
+            manager = TokenManager()
+            cred = manager.credential(self.__url, credfile, "myingestor")
+            self.assertEqual(
+                manager.refresh_token(
+                    cred, "staletoken", self.__headers, 3600),
+                self.__token)
+            self.assertEqual(len(self.__server.userslogin), 1)
+            self.assertEqual(
+                manager.refresh_token(
+                    cred, "staletoken", self.__headers, 3600),
+                self.__token)
+            self.assertEqual(len(self.__server.userslogin), 1)
+            self.assertEqual(
+                manager.current_token(cred, "staletoken"), self.__token)
+            self.assertEqual(
+                manager.current_token(cred, "othertoken"), "othertoken")
+
+            # replacements of former tokens are removed
+            cred.renewed = {"oldtoken": "formertoken",
+                            "formertoken": "staletoken"}
+            cred.renewed["staletoken"] = self.__token
+            self.assertEqual(
+                manager.refresh_token(
+                    cred, "staletoken2", self.__headers, 3600),
+                self.__token)
+            self.assertEqual(
+                cred.renewed,
+                {"staletoken": self.__token, "staletoken2": self.__token})
+        finally:
+            os.remove(credfile)
+
+    def test_jwt(self):
+        fun = sys._getframe().f_code.co_name
+        credfile = self.credfile(fun, '{"jwt": "myjwttoken"}')
+        try:
+            manager = TokenManager()
+            cred = manager.credential(self.__url, credfile, "myingestor")
+            self.assertEqual(
+                manager.get_token(cred, self.__headers), "myjwttoken")
+            self.assertEqual(
+                manager.refresh_token(
+                    cred, "myjwttoken", self.__headers), "myjwttoken")
+            self.assertEqual(len(self.__server.userslogin), 0)
+        finally:
+            os.remove(credfile)
+
+
+if __name__ == '__main__':
+    unittest.main()
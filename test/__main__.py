@@ -29,6 +29,21 @@ import DatasetWatcher_test
 import DatasetIngest_test
 import ModelIngest_test
 import DatasetWatcherFIO_test
+import SciCatSession_test
+import TokenManager_test
+import SafeINotifier_test
+import PollingNotifier_test
+import ListFileReader_test
+import StateStore_test
+import DatasetIngestor_test
+import IngestScheduler_test
+import TimerWheel_test
+import NXSGenerator_test
+import GeneratorPool_test
+import FileStaging_test
+import DatablockBuilder_test
+import FingerprintStore_test
+import GeneratorCache_test
 
 try:
     __import__("h5py")
@@ -82,6 +97,51 @@ def main():
     basicsuite.addTests(
         unittest.defaultTestLoader.loadTestsFromModule(
             DatasetWatcherFIO_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            SciCatSession_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            TokenManager_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            SafeINotifier_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            PollingNotifier_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            ListFileReader_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            StateStore_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            DatasetIngestor_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            IngestScheduler_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            TimerWheel_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            NXSGenerator_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            GeneratorPool_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            FileStaging_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            DatablockBuilder_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            FingerprintStore_test))
+    basicsuite.addTests(
+        unittest.defaultTestLoader.loadTestsFromModule(
+            GeneratorCache_test))
 
     # test runner
     runner = unittest.TextTestRunner()